@@ -41,17 +41,41 @@ export interface AnalyticsResult {
         valueAtRisk95?: number;
         conditionalVaR95?: number;
         maxDrawdown?: number;
+        // tailRisk[method]["1d" | "10d"]["95" | "99"]
+        tailRisk?: {
+            [method: string]: {
+                [horizon: string]: { [confidence: string]: { valueAtRisk: number | null; conditionalVaR: number | null } };
+            };
+        };
         diversificationScore?: number;
         betas?: { [key: string]: number | null };
-        correlationMatrix?: { [key: string]: { [key: string]: number } };
+        // Row-major: values[i * symbols.length + j] is corr(symbols[i], symbols[j])
+        correlationMatrix?: { symbols: string[]; values: number[] };
+        // Sent instead of correlationMatrix for large portfolios ("topk" mode)
+        correlationTopK?: {
+            [symbol: string]: { mostCorrelated: [string, number][]; mostAntiCorrelated: [string, number][] };
+        };
+        correlationClusters?: {
+            clusters: { id: number; members: string[]; size: number; avgIntraCorrelation: number | null }[];
+            betweenClusters: { symbols: number[]; values: number[] };
+        };
     };
     forecasts?: {
         [symbol: string]: {
             currentPrice?: number;
             expectedReturn?: number;
+            model?: 'drift' | 'ewmaMean' | 'ar1' | 'arima' | null;
             trend?: string;
             volatility?: number;
             priceRange?: any;
+            simulation?: {
+                expected: number;
+                p05: number;
+                p95: number;
+                probabilityOfGain: number;
+                standardError: { expected: number; p05: number; p95: number; probabilityOfGain: number };
+                paths: number;
+            };
         };
     };
     optimization?: {
@@ -2,6 +2,7 @@ import os
 import json
 from dotenv import load_dotenv
 from google import genai
+from serialization import json_default
 
 load_dotenv()
 
@@ -49,7 +50,7 @@ def generate_response(attachment):
     with open(AI_PROMPT_FILE, "r", encoding="utf-8") as f:
         PROMPT = f.read().strip()
 
-    PROMPT += "\n\n" + json.dumps(attachment, indent=2)
+    PROMPT += "\n\n" + json.dumps(attachment, indent=2, default=json_default)
     response = generate_response_helper(PROMPT)
     response = clean_response(response)
     return response
@@ -0,0 +1,194 @@
+# admission.py
+"""
+Admission control for the analytics service.
+
+Every expensive stage (the report pipeline, market-data fetches, AI summaries) has a fixed
+number of concurrent slots and a bounded wait queue per priority lane:
+
+- interactive requests are always started before queued batch / nightly work, and batch
+  work never takes the last slot of a stage;
+- a request whose lane queue is already full is rejected at once (429);
+- a request that waits longer than its lane's max wait, or past its deadline
+  (see deadlines), is rejected (503).
+
+Both rejections carry a Retry-After estimate from the stage's recent service times.
+"""
+import os
+import math
+import time
+import threading
+import contextvars
+from collections import deque
+from contextlib import contextmanager
+
+from deadlines import expires_at
+
+INTERACTIVE, BATCH = "interactive", "batch"
+LANES = (INTERACTIVE, BATCH)
+
+ENABLED = os.getenv("ADMISSION_ENABLED", "true").lower() != "false"
+MAX_WAIT_SECONDS = {
+    INTERACTIVE: float(os.getenv("ADMISSION_INTERACTIVE_MAX_WAIT_SECONDS", 5)),
+    BATCH: float(os.getenv("ADMISSION_BATCH_MAX_WAIT_SECONDS", 120)),
+}
+
+_lane = contextvars.ContextVar("admission_lane", default=INTERACTIVE)
+
+
+class AdmissionRejected(Exception):
+    """Raised when a stage cannot take the request; maps to a 429 / 503 response."""
+
+    def __init__(self, stage, status, retry_after, reason):
+        super().__init__(f"{stage} is overloaded ({reason}), retry after {retry_after}s")
+        self.stage = stage
+        self.status = status
+        self.retry_after = retry_after
+        self.reason = reason
+
+
+# ---------------------------
+# One stage: slots + per-lane FIFO queues
+# ---------------------------
+class Stage:
+    def __init__(self, name, concurrency, queue_limits, max_wait=MAX_WAIT_SECONDS):
+        self.name = name
+        self.concurrency = max(1, int(concurrency))
+        self.queue_limits = dict(queue_limits)
+        self.max_wait = dict(max_wait)
+        self._cond = threading.Condition()
+        self._active = {lane: 0 for lane in LANES}
+        self._queues = {lane: deque() for lane in LANES}
+        self._service_seconds = None  # EWMA of slot hold times
+        self._stats = {"admitted": 0, "queueFull": 0, "timedOut": 0}
+
+    def _can_start(self, lane, ticket):
+        if sum(self._active.values()) >= self.concurrency:
+            return False
+        if lane == BATCH:
+            if self._queues[INTERACTIVE]:
+                return False
+            if self.concurrency > 1 and self._active[BATCH] >= self.concurrency - 1:
+                return False
+        return self._queues[lane][0] is ticket
+
+    def _retry_after(self):
+        queued = sum(len(q) for q in self._queues.values())
+        per_request = self._service_seconds or 1.0
+        return max(1, math.ceil(per_request * (queued + 1) / self.concurrency))
+
+    def acquire(self, lane=INTERACTIVE):
+        """Block until a slot is free (in lane order); returns the start time for release()."""
+        ticket = object()
+        deadline = time.monotonic() + self.max_wait[lane]
+        request_deadline = expires_at()
+        if request_deadline is not None:
+            deadline = min(deadline, request_deadline)
+        with self._cond:
+            queue = self._queues[lane]
+            queue.append(ticket)
+            if not self._can_start(lane, ticket) and len(queue) > self.queue_limits[lane]:
+                queue.pop()
+                self._stats["queueFull"] += 1
+                raise AdmissionRejected(self.name, 429, self._retry_after(), "queueFull")
+
+            while not self._can_start(lane, ticket):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    queue.remove(ticket)
+                    self._stats["timedOut"] += 1
+                    self._cond.notify_all()
+                    raise AdmissionRejected(self.name, 503, self._retry_after(), "timedOut")
+                self._cond.wait(remaining)
+
+            queue.popleft()
+            self._active[lane] += 1
+            self._stats["admitted"] += 1
+            self._cond.notify_all()  # the next ticket in line may be able to start too
+        return time.monotonic()
+
+    def release(self, lane, started):
+        elapsed = time.monotonic() - started
+        with self._cond:
+            self._active[lane] -= 1
+            self._service_seconds = (elapsed if self._service_seconds is None
+                                     else 0.8 * self._service_seconds + 0.2 * elapsed)
+            self._cond.notify_all()
+
+    def metrics(self):
+        with self._cond:
+            return {
+                "concurrency": self.concurrency,
+                "active": dict(self._active),
+                "queued": {lane: len(q) for lane, q in self._queues.items()},
+                "queueLimits": dict(self.queue_limits),
+                "avgServiceSeconds": round(self._service_seconds, 4) if self._service_seconds else None,
+                **self._stats,
+            }
+
+
+def _stage(name, env, concurrency, interactive_queue, batch_queue):
+    return Stage(
+        name,
+        int(os.getenv(f"ADMISSION_{env}_CONCURRENCY", concurrency)),
+        {INTERACTIVE: int(os.getenv(f"ADMISSION_{env}_QUEUE", interactive_queue)),
+         BATCH: int(os.getenv(f"ADMISSION_{env}_BATCH_QUEUE", batch_queue))},
+    )
+
+
+STAGES = {
+    "analytics": _stage("analytics", "ANALYTICS", max(2, os.cpu_count() or 1), 16, 4),
+    "marketData": _stage("marketData", "MARKET_DATA", 8, 64, 256),
+    "ai": _stage("ai", "AI", 4, 16, 16),
+}
+
+
+# ---------------------------
+# Public API
+# ---------------------------
+@contextmanager
+def admit(stage, lane=None):
+    """Hold one slot of `stage` for the duration of the block (lane: current priority by default)."""
+    if not ENABLED:
+        yield
+        return
+    lane = lane or _lane.get()
+    started = STAGES[stage].acquire(lane)
+    try:
+        yield
+    finally:
+        STAGES[stage].release(lane, started)
+
+
+def hold(stage, lane=None):
+    """Acquire a slot now and return a release() callable (for slots held across a streamed response)."""
+    if not ENABLED:
+        return lambda: None
+    lane = lane or _lane.get()
+    started = STAGES[stage].acquire(lane)
+    released = threading.Event()
+
+    def release():
+        if not released.is_set():
+            released.set()
+            STAGES[stage].release(lane, started)
+    return release
+
+
+@contextmanager
+def priority(lane):
+    """Run the block (and the stages it enters) in the given lane."""
+    if lane not in LANES:
+        raise ValueError(f"Unknown priority lane '{lane}'. Use one of {LANES}.")
+    token = _lane.set(lane)
+    try:
+        yield
+    finally:
+        _lane.reset(token)
+
+
+def current_lane():
+    return _lane.get()
+
+
+def metrics():
+    return {name: stage.metrics() for name, stage in STAGES.items()}
@@ -0,0 +1,165 @@
+# allocation_engine.py
+import numpy as np
+import pandas as pd
+from scipy.cluster.hierarchy import linkage, leaves_list
+from scipy.spatial.distance import squareform
+
+from correlation_summary import correlation_distance, cluster_labels
+from risk_engine import covariance_to_correlation
+
+
+# -----------------------------
+# Helpers
+# -----------------------------
+def quasi_diagonal_order(corr: np.ndarray) -> np.ndarray:
+    """Leaf order of a single-linkage tree on correlation distance (similar assets adjacent)."""
+    if corr.shape[0] < 2:
+        return np.arange(corr.shape[0])
+    tree = linkage(squareform(correlation_distance(corr), checks=False), method="single")
+    return leaves_list(tree)
+
+
+def allocation_stats(weights: np.ndarray, cov: np.ndarray):
+    """Volatility, diversification ratio (w'sigma / sigma_p), effective number of holdings and risk shares."""
+    sigma_w = cov @ weights
+    port_vol = float(np.sqrt(max(weights @ sigma_w, 0.0)))
+    std = np.sqrt(np.clip(np.diag(cov), 0, None))
+    risk_share = weights * sigma_w / port_vol ** 2 if port_vol > 0 else np.zeros_like(weights)
+    return {
+        "volatility": port_vol,
+        "diversificationRatio": float(weights @ std / port_vol) if port_vol > 0 else None,
+        "effectiveHoldings": float(1.0 / np.sum(weights ** 2)) if weights.any() else None,
+        "riskShare": risk_share,
+    }
+
+
+# -----------------------------
+# Hierarchical Risk Parity (Lopez de Prado, 2016)
+# -----------------------------
+def hrp_weights(cov: np.ndarray, corr: np.ndarray = None) -> np.ndarray:
+    """
+    Tree clustering -> quasi-diagonal ordering -> recursive bisection, splitting weight
+    between the two halves of every cluster in inverse proportion to their variance.
+    Clusters are bisected level by level; each level loops over its clusters.
+    """
+    n = cov.shape[0]
+    if n == 1:
+        return np.ones(1)
+    corr = covariance_to_correlation(cov) if corr is None else corr
+    order = quasi_diagonal_order(corr)
+    inv_var = 1.0 / np.clip(np.diag(cov), 1e-18, None)
+
+    def cluster_variance(items):
+        sub_cov = cov[np.ix_(items, items)]
+        w = inv_var[items] / inv_var[items].sum()
+        return float(w @ sub_cov @ w)
+
+    weights = np.ones(n)
+    clusters = [order]
+    while clusters:
+        next_level = []
+        for items in clusters:
+            if len(items) < 2:
+                continue
+            half = len(items) // 2
+            left, right = items[:half], items[half:]
+            var_left, var_right = cluster_variance(left), cluster_variance(right)
+            alpha = 1 - var_left / (var_left + var_right) if (var_left + var_right) > 0 else 0.5
+            weights[left] *= alpha
+            weights[right] *= 1 - alpha
+            next_level.extend([left, right])
+        clusters = next_level
+    return weights / weights.sum()
+
+
+# -----------------------------
+# Equal Risk Contribution
+# -----------------------------
+def erc_weights(cov: np.ndarray, tol: float = 1e-6, max_sweeps: int = 5000) -> np.ndarray:
+    """
+    Equal risk contribution weights by solving min 0.5 y'Sy - (1/n) sum log y with cyclical
+    coordinate descent: one y_i at a time in closed form,
+    y_i = (-c_i + sqrt(c_i^2 + 4 S_ii / n)) / (2 S_ii), c_i = (S y)_i - S_ii y_i,
+    keeping S y current with one column update (O(N^2) per sweep). The objective is strictly
+    convex, so the sweeps converge; inverse-volatility weights are the fallback if they do not.
+    """
+    n = cov.shape[0]
+    diag = np.clip(np.diag(cov), 1e-18, None)
+    budget = 1.0 / n
+    y = 1.0 / np.sqrt(diag)
+    y /= np.sqrt(y @ cov @ y) * np.sqrt(n)
+    sy = cov @ y
+
+    converged = False
+    for _ in range(max_sweeps):
+        largest_step = 0.0
+        for i in range(n):
+            c = sy[i] - diag[i] * y[i]
+            y_i = (-c + np.sqrt(c * c + 4 * diag[i] * budget)) / (2 * diag[i])
+            step = y_i - y[i]
+            if step:
+                sy += cov[:, i] * step
+                y[i] = y_i
+                largest_step = max(largest_step, abs(step))
+        if largest_step < tol * np.max(y):
+            converged = True
+            break
+
+    if not converged or not np.all(np.isfinite(y)) or np.any(y <= 0):
+        print(f"[Allocation Warning] ERC did not converge for {n} assets; using inverse-volatility weights.")
+        y = 1.0 / np.sqrt(diag)
+    return y / y.sum()
+
+
+# -----------------------------
+# Entry point
+# -----------------------------
+def allocate_portfolio(cov_matrix: pd.DataFrame, symbols=None, decimals: int = 4):
+    """
+    Risk-based allocations without sampling: HRP and ERC weights, plus cluster-level
+    diversification (weight and risk share of each correlation cluster under each allocation).
+    """
+    if symbols is not None:
+        cov_matrix = cov_matrix.reindex(index=symbols, columns=symbols)
+    symbols = list(cov_matrix.columns)
+    cov = cov_matrix.to_numpy(dtype=float)
+    corr = covariance_to_correlation(cov)
+
+    allocations = {
+        "hierarchicalRiskParity": hrp_weights(cov, corr),
+        "equalRiskContribution": erc_weights(cov),
+    }
+
+    labels = cluster_labels(pd.DataFrame(corr, index=symbols, columns=symbols))
+    n_clusters = int(labels.max()) + 1 if labels.size else 0
+    membership = np.zeros((len(symbols), n_clusters))
+    membership[np.arange(len(symbols)), labels] = 1.0
+
+    result = {}
+    cluster_shares = {}
+    for name, w in allocations.items():
+        stats = allocation_stats(w, cov)
+        result[name] = {
+            "weights": dict(zip(symbols, np.round(w, decimals).tolist())),
+            "volatility": round(stats["volatility"], 6),
+            "diversificationRatio": round(stats["diversificationRatio"], 4) if stats["diversificationRatio"] else None,
+            "effectiveHoldings": round(stats["effectiveHoldings"], 2) if stats["effectiveHoldings"] else None,
+        }
+        cluster_shares[name] = (w @ membership, stats["riskShare"] @ membership)
+
+    symbols_arr = np.asarray(symbols)
+    result["clusters"] = [
+        {
+            "id": c,
+            "members": symbols_arr[labels == c].tolist(),
+            **{
+                name: {
+                    "weightShare": round(float(shares[0][c]), 4),
+                    "riskShare": round(float(shares[1][c]), 4),
+                }
+                for name, shares in cluster_shares.items()
+            },
+        }
+        for c in range(n_clusters)
+    ]
+    return result
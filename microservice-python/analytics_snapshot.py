@@ -0,0 +1,207 @@
+# analytics_snapshot.py
+import os
+import json
+import pickle
+import threading
+from collections import Counter
+from datetime import datetime
+
+from data_fetcher import get_historical_data
+import garch_engine
+from forecasting_models import summarize_forecast, dated_returns
+from risk_diagnostics import BENCHMARK_SYMBOL
+from trading_calendar import session_window, covers_last_session
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+SNAPSHOT_DIR = os.getenv("ANALYTICS_SNAPSHOT_DIR", os.path.join(BASE_DIR, "analytics_store"))
+SNAPSHOT_TOP_N = int(os.getenv("ANALYTICS_SNAPSHOT_TOP_N", 200))
+SNAPSHOT_HISTORY_DAYS = 365
+SNAPSHOT_STEPS = 30
+SNAPSHOT_SIMS = 500
+POPULARITY_DECAY = 0.5  # halve request counts at every refresh so "liveliest" tracks recent demand
+
+_lock = threading.Lock()
+_popularity = Counter()
+_loaded = {}  # symbol -> (mtime, snapshot)
+
+
+# ---------------------------
+# Request popularity (which symbols to precompute)
+# ---------------------------
+def _popularity_path():
+    return os.path.join(SNAPSHOT_DIR, "popularity.json")
+
+
+def load_popularity():
+    """Load persisted request counts (called once at startup)."""
+    path = _popularity_path()
+    if not os.path.exists(path):
+        return
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            counts = json.load(f)
+        with _lock:
+            _popularity.update(counts)
+    except Exception as e:
+        print(f"[Snapshot Warning] Could not load popularity counts: {e}")
+
+
+def record_symbol_requests(symbols):
+    """Count symbols seen in analysis requests."""
+    with _lock:
+        _popularity.update(symbols)
+
+
+def liveliest_symbols(top_n=SNAPSHOT_TOP_N):
+    with _lock:
+        return [sym for sym, _ in _popularity.most_common(top_n)]
+
+
+def _decay_and_save_popularity():
+    with _lock:
+        for sym in list(_popularity):
+            _popularity[sym] *= POPULARITY_DECAY
+            if _popularity[sym] < 0.01:
+                del _popularity[sym]
+        counts = dict(_popularity)
+    _atomic_write(_popularity_path(), json.dumps(counts).encode("utf-8"))
+
+
+# ---------------------------
+# Store I/O
+# ---------------------------
+def _snapshot_path(symbol):
+    return os.path.join(SNAPSHOT_DIR, f"{symbol}.pkl")
+
+
+def _atomic_write(path, payload: bytes):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(payload)
+    os.replace(tmp, path)
+
+
+def save_snapshot(snapshot):
+    _atomic_write(_snapshot_path(snapshot["symbol"]), pickle.dumps(snapshot, protocol=pickle.HIGHEST_PROTOCOL))
+
+
+def load_snapshot(symbol):
+    """
+    Return the stored snapshot for symbol if it is fresh, else None.
+    Parsed snapshots are kept in memory until the file changes.
+    """
+    path = _snapshot_path(symbol)
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        return None
+
+    with _lock:
+        cached = _loaded.get(symbol)
+    if cached and cached[0] == mtime:
+        snapshot = cached[1]
+    else:
+        try:
+            with open(path, "rb") as f:
+                snapshot = pickle.load(f)
+        except Exception as e:
+            print(f"[Snapshot Warning] Could not read snapshot for {symbol}: {e}")
+            return None
+        with _lock:
+            _loaded[symbol] = (mtime, snapshot)
+
+    # Fresh only when built after the last session's close (weekends / holidays bring no new bar);
+    # an older snapshot's history lacks the latest bar
+    if not covers_last_session(snapshot["createdAt"]):
+        return None
+    return snapshot
+
+
+# ---------------------------
+# Build
+# ---------------------------
+def build_symbol_snapshot(symbol, hist, steps=SNAPSHOT_STEPS, sims=SNAPSHOT_SIMS):
+    """
+    The per-symbol inputs a report reuses (see get_snapshot_inputs): the history window
+    and, except for the benchmark, the forecast summary. Metrics and exposures are derived
+    from that history by the memoised report nodes (see report_pipeline).
+    """
+    snapshot = {
+        "symbol": symbol,
+        "createdAt": datetime.now(),
+        "lastBar": hist["Date"].iloc[-1],
+        "steps": steps,
+        "sims": sims,
+        "history": hist,
+        "forecast": None,
+    }
+
+    if symbol != BENCHMARK_SYMBOL:
+        forecast = summarize_forecast(symbol, hist, steps, sims)
+        snapshot["forecast"] = forecast if "forecast" in forecast else None
+    return snapshot
+
+
+def refresh_snapshots(symbols=None, top_n=SNAPSHOT_TOP_N):
+    """
+    Materialise snapshots for `symbols` (default: the top_n most requested symbols)
+    plus the benchmark, and refit any due GARCH parameters (requests only advance them).
+    Intended to run after market close. Returns the symbols written.
+    """
+    symbols = list(symbols) if symbols is not None else liveliest_symbols(top_n)
+    start_date, end_date = session_window(SNAPSHOT_HISTORY_DAYS)
+
+    written = []
+    for sym in [BENCHMARK_SYMBOL] + [s for s in symbols if s != BENCHMARK_SYMBOL]:
+        try:
+            hist = get_historical_data(sym, start_date, end_date)
+            if hist.empty:
+                continue
+            garch_engine.refit_if_due(sym, dated_returns(hist))
+            snapshot = build_symbol_snapshot(sym, hist)
+            save_snapshot(snapshot)
+            written.append(sym)
+        except Exception as e:
+            print(f"[Snapshot Error] {sym}: {e}")
+
+    # GARCH parameters of symbols outside the snapshot set
+    refitted = 0
+    for sym in garch_engine.due_for_refit():
+        try:
+            hist = get_historical_data(sym, start_date, end_date)
+            if not hist.empty and garch_engine.refit_if_due(sym, dated_returns(hist)):
+                refitted += 1
+        except Exception as e:
+            print(f"[Snapshot Error] GARCH refit {sym}: {e}")
+    if refitted:
+        print(f"[{datetime.now().isoformat()}] GARCH parameters refitted for {refitted} other symbols.")
+
+    _decay_and_save_popularity()
+    print(f"[{datetime.now().isoformat()}] Analytics snapshots refreshed for {len(written)} symbols.")
+    return written
+
+
+# ---------------------------
+# Request-time lookup
+# ---------------------------
+def get_snapshot_inputs(symbols, steps=SNAPSHOT_STEPS, sims=SNAPSHOT_SIMS, seed=None):
+    """
+    Fresh precomputed inputs for the given symbols.
+    Returns (historical_data, forecast_summary, benchmark_df); symbols without a fresh
+    snapshot are simply absent, and forecasts are only reused for matching steps/sims
+    and the default (unseeded) simulation.
+    """
+    historical_data, forecast_summary = {}, {}
+    for sym in symbols:
+        snapshot = load_snapshot(sym)
+        if snapshot is None:
+            continue
+        historical_data[sym] = snapshot["history"]
+        if (snapshot["forecast"] is not None and snapshot["steps"] == steps and snapshot["sims"] == sims
+                and seed is None):
+            forecast_summary[sym] = snapshot["forecast"]
+
+    benchmark = load_snapshot(BENCHMARK_SYMBOL)
+    benchmark_df = benchmark["history"] if benchmark else None
+    return historical_data, forecast_summary, benchmark_df
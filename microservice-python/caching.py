@@ -0,0 +1,167 @@
+# caching.py
+import time
+import threading
+from collections import OrderedDict
+
+
+# ---------------------------
+# Single-flight: coalesce concurrent calls for one key
+# ---------------------------
+class _Call:
+    __slots__ = ("event", "result", "error")
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Concurrent do(key, fn) calls for the same key share one execution of fn:
+    the first caller runs it, the rest block and receive the same result (or exception).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, fn):
+        """Returns (result, shared) — shared is True when this caller piggy-backed on another."""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = _Call()
+                self._calls[key] = call
+
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = fn()
+            return call.result, False
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.event.set()
+
+    def in_flight(self, key):
+        with self._lock:
+            return key in self._calls
+
+
+# ---------------------------
+# TTL cache with stale-while-revalidate
+# ---------------------------
+class TTLCache:
+    """
+    Thread-safe in-process cache.
+
+    - Entries younger than `ttl` seconds are served directly.
+    - Entries younger than `ttl + stale_ttl` are served immediately while a single
+      background refresh runs (stale-while-revalidate).
+    - Misses are loaded through SingleFlight, so concurrent misses share one upstream call.
+    - At most `max_entries` are kept (least recently used evicted first).
+    - None results are not cached unless `cache_none` is set.
+    """
+
+    def __init__(self, ttl=15.0, stale_ttl=60.0, max_entries=5000, cache_none=False, clock=time.monotonic):
+        self.ttl = float(ttl)
+        self.stale_ttl = float(stale_ttl)
+        self.max_entries = int(max_entries)
+        self.cache_none = cache_none
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> (value, stored_at)
+        self._flight = SingleFlight()
+        self._stats = {"hits": 0, "staleHits": 0, "misses": 0, "coalesced": 0, "refreshErrors": 0}
+
+    # --- internals ---
+    def _store(self, key, value):
+        if value is None and not self.cache_none:
+            return
+        with self._lock:
+            self._entries[key] = (value, self._clock())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _load(self, key, loader):
+        def run():
+            value = loader()
+            self._store(key, value)
+            return value
+        return self._flight.do(key, run)
+
+    def _refresh_in_background(self, key, loader):
+        if self._flight.in_flight(key):
+            return
+
+        def refresh():
+            try:
+                self._load(key, loader)
+            except Exception as e:
+                with self._lock:
+                    self._stats["refreshErrors"] += 1
+                print(f"[Cache Warning] Background refresh failed for {key}: {e}")
+
+        threading.Thread(target=refresh, daemon=True).start()
+
+    # --- public API ---
+    def get(self, key, loader):
+        """Return the cached value for key, calling loader() on a miss."""
+        now = self._clock()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                age = now - entry[1]
+                if age < self.ttl:
+                    self._stats["hits"] += 1
+                    return entry[0]
+                if age < self.ttl + self.stale_ttl:
+                    self._stats["staleHits"] += 1
+                    stale_value = entry[0]
+                else:
+                    stale_value = None
+                    entry = None
+            if entry is None:
+                self._stats["misses"] += 1
+
+        if entry is not None:
+            self._refresh_in_background(key, loader)
+            return stale_value
+
+        value, shared = self._load(key, loader)
+        if shared:
+            with self._lock:
+                self._stats["coalesced"] += 1
+        return value
+
+    def put(self, key, value):
+        """Store a value computed outside get() (e.g. one of a batch of results)."""
+        self._store(key, value)
+
+    def peek(self, key):
+        """Return the cached value regardless of age (None if absent)."""
+        with self._lock:
+            entry = self._entries.get(key)
+            return entry[0] if entry else None
+
+    def invalidate(self, key=None):
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+
+    def stats(self):
+        with self._lock:
+            return {**self._stats, "size": len(self._entries)}
@@ -0,0 +1,182 @@
+# circuit_breaker.py
+import time
+import threading
+from collections import deque
+from contextlib import contextmanager
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "halfOpen"
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling an upstream whose circuit is open."""
+
+    def __init__(self, name, retry_in):
+        super().__init__(f"{name} circuit is open (next probe in {retry_in:.0f}s)")
+        self.name = name
+        self.retry_in = retry_in
+
+
+# ---------------------------
+# Circuit breaker: failure rate over a sliding window, half-open probing
+# ---------------------------
+class CircuitBreaker:
+    """
+    Thread-safe circuit breaker.
+
+    - closed: calls go through; the circuit opens when at least `min_calls` outcomes were
+      recorded in the last `window_seconds` and `failure_rate` of them failed.
+    - open: calls fail fast with CircuitOpenError for `open_seconds`.
+    - half-open: up to `probes` calls go through; a success closes the circuit,
+      a failure opens it again.
+
+    Exceptions for which `is_failure(e)` is False (e.g. local admission rejections)
+    pass through without counting against the upstream.
+    """
+
+    def __init__(self, name, failure_rate=0.5, min_calls=10, window_seconds=60.0, open_seconds=30.0, probes=1,
+                 is_failure=None, clock=time.monotonic):
+        self.name = name
+        self.failure_rate = float(failure_rate)
+        self.min_calls = int(min_calls)
+        self.window_seconds = float(window_seconds)
+        self.open_seconds = float(open_seconds)
+        self.probes = max(1, int(probes))
+        self.is_failure = is_failure or (lambda e: True)
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._state = CLOSED
+        self._opened_at = 0.0
+        self._probes_in_flight = 0
+        self._outcomes = deque()  # (time, ok)
+        self._stats = {"calls": 0, "failures": 0, "rejected": 0, "opened": 0}
+
+    # --- internals (lock held) ---
+    def _trim(self, now):
+        while self._outcomes and now - self._outcomes[0][0] > self.window_seconds:
+            self._outcomes.popleft()
+
+    def _open(self, now):
+        self._state = OPEN
+        self._opened_at = now
+        self._outcomes.clear()
+        self._stats["opened"] += 1
+        print(f"[Breaker Warning] {self.name} circuit opened; failing fast for {self.open_seconds:.0f}s")
+
+    def _before(self):
+        """Admit one call or raise CircuitOpenError; returns True for a half-open probe."""
+        now = self._clock()
+        with self._lock:
+            if self._state == OPEN and now - self._opened_at >= self.open_seconds:
+                self._state = HALF_OPEN
+            if self._state == CLOSED:
+                return False
+            if self._state == HALF_OPEN and self._probes_in_flight < self.probes:
+                self._probes_in_flight += 1
+                return True
+            self._stats["rejected"] += 1
+            raise CircuitOpenError(self.name, max(0.0, self.open_seconds - (now - self._opened_at)))
+
+    def _after(self, probe, ok):
+        now = self._clock()
+        with self._lock:
+            if probe:
+                self._probes_in_flight -= 1
+            if ok is None:  # neither success nor upstream failure
+                return
+            self._stats["calls"] += 1
+            if not ok:
+                self._stats["failures"] += 1
+            if probe:
+                if ok:
+                    self._state = CLOSED
+                    self._outcomes.clear()
+                    print(f"[Breaker] {self.name} circuit closed after a successful probe")
+                else:
+                    self._open(now)
+                return
+            if self._state != CLOSED:
+                return
+            self._outcomes.append((now, ok))
+            self._trim(now)
+            failures = sum(1 for _, good in self._outcomes if not good)
+            if len(self._outcomes) >= self.min_calls and failures >= self.failure_rate * len(self._outcomes):
+                self._open(now)
+
+    # --- public API ---
+    @contextmanager
+    def guard(self):
+        """Run the block as one upstream call (raises CircuitOpenError while the circuit is open)."""
+        probe = self._before()
+        try:
+            yield
+        except Exception as e:
+            self._after(probe, False if self.is_failure(e) else None)
+            raise
+        self._after(probe, True)
+
+    def call(self, fn, *args, **kwargs):
+        with self.guard():
+            return fn(*args, **kwargs)
+
+    def state(self):
+        with self._lock:
+            if self._state == OPEN and self._clock() - self._opened_at >= self.open_seconds:
+                return HALF_OPEN
+            return self._state
+
+    def reset(self):
+        with self._lock:
+            self._state = CLOSED
+            self._outcomes.clear()
+            self._probes_in_flight = 0
+
+    def metrics(self):
+        state = self.state()
+        with self._lock:
+            self._trim(self._clock())
+            return {"state": state, "windowCalls": len(self._outcomes),
+                    "windowFailures": sum(1 for _, ok in self._outcomes if not ok), **self._stats}
+
+
+# ---------------------------
+# Negative cache: remember recent per-key failures / empty answers
+# ---------------------------
+class NegativeCache:
+    """key -> (reason, expires_at). blocked(key) returns the reason while the entry is live."""
+
+    def __init__(self, max_entries=10000, clock=time.monotonic):
+        self.max_entries = int(max_entries)
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._entries = {}
+
+    def mark(self, key, reason, ttl):
+        if ttl <= 0:
+            return
+        with self._lock:
+            if len(self._entries) >= self.max_entries:
+                now = self._clock()
+                self._entries = {k: v for k, v in self._entries.items() if v[1] > now}
+            self._entries[key] = (reason, self._clock() + ttl)
+
+    def blocked(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[1] <= self._clock():
+                del self._entries[key]
+                return None
+            return entry[0]
+
+    def clear(self, key=None):
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+
+    def stats(self):
+        now = self._clock()
+        with self._lock:
+            return {"size": sum(1 for _, expires in self._entries.values() if expires > now)}
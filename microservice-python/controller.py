@@ -1,19 +1,34 @@
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, Response, stream_with_context
 from datetime import datetime
+import os
 import json
 import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
 import atexit
 from apscheduler.schedulers.background import BackgroundScheduler
 
 from NLP_layer.gemini import generate_response
-from report_generator import generate_portfolio_report
+from report_generator import generate_portfolio_report, generate_portfolio_reports
 from top_picks.top_picks import execute_picks
+from analytics_snapshot import refresh_snapshots, load_popularity
+from serialization import build_response, dumps_json
+from correlation_summary import CORRELATION_MODES
+from report_cache import report_cache, report_key, BYPASS, ENABLED as REPORT_CACHE_ENABLED
+from admission import admit, hold, priority, AdmissionRejected, LANES, INTERACTIVE, BATCH
+from data_fetcher import upstream_metrics
+from trading_calendar import last_completed_session, is_trading_day, market_now
+import admission
+import deadlines
 
 app = Flask(__name__)
 
 # Global scheduler instance
 scheduler = None
 
+# Gemini calls under a deadline run here so the request can stop waiting for them
+ai_pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix="ai-summary")
+
 @app.route("/")
 def home():
     return jsonify({
@@ -23,6 +38,96 @@ def home():
     })
 
 
+def with_ns_suffix(holdings):
+    """Append ".NS" suffix for NSE-listed symbols."""
+    return [{**h, "symbol": h["symbol"].upper() + ".NS"} for h in holdings]
+
+
+def correlation_options(data):
+    """
+    Optional payload fields selecting the correlation output:
+    "correlationMode": "auto" | "dense" | "topk", "correlationTopK": 5
+    """
+    mode = str(data.get("correlationMode", "auto")).lower()
+    if mode not in CORRELATION_MODES:
+        raise ValueError(f"Invalid correlationMode '{mode}'. Use one of {list(CORRELATION_MODES)}.")
+    try:
+        top_k = int(data.get("correlationTopK", 5))
+    except (TypeError, ValueError):
+        raise ValueError("correlationTopK must be an integer")
+    return {"correlation_mode": mode, "top_k": top_k}
+
+
+def simulation_options(data):
+    """Optional "seed" payload field: reproducible Monte Carlo price ranges."""
+    seed = data.get("seed")
+    if seed is None:
+        return {}
+    try:
+        seed = int(seed)
+    except (TypeError, ValueError):
+        raise ValueError("seed must be an integer")
+    if seed < 0:
+        raise ValueError("seed must be non-negative")
+    return {"seed": seed}
+
+
+def request_lane(default=INTERACTIVE):
+    """Priority lane from the X-Priority header ("interactive" | "batch")."""
+    lane = request.headers.get("X-Priority", default).lower()
+    return lane if lane in LANES else default
+
+
+def rejection_response(e: AdmissionRejected):
+    """Fast 429 / 503 for requests the admission controller turned away."""
+    response = jsonify({"error": str(e), "stage": e.stage, "reason": e.reason})
+    response.status_code = e.status
+    response.headers["Retry-After"] = str(e.retry_after)
+    return response
+
+
+def _generate_ai_response(result):
+    with admit("ai"):
+        return generate_response(result)
+
+
+def build_ai_summary(result):
+    """
+    Generate the Gemini summary for a report and return its 'ai_summary' section.
+    Returns None (degraded "aiSummary") when the "ai" stage turns the call away — the
+    finished report is still served — or, under a request deadline, when too little budget
+    is left to start the call or Gemini does not answer before the deadline.
+    """
+    left = deadlines.remaining()
+    try:
+        if left is None:
+            get_ai_summary = _generate_ai_response(result)
+        elif left < deadlines.AI_MIN_SECONDS:
+            deadlines.degrade("aiSummary", "skipped")
+            return None
+        else:
+            future = ai_pool.submit(contextvars.copy_context().run, _generate_ai_response, result)
+            try:
+                get_ai_summary = future.result(timeout=deadlines.remaining())
+            except FutureTimeoutError:
+                deadlines.degrade("aiSummary", "timedOut")
+                return None
+    except AdmissionRejected as e:
+        print(f"[Warning] AI summary omitted: {e}")
+        deadlines.degrade("aiSummary", "rejected")
+        return None
+
+    # If generate_response returns a JSON string, convert to dict
+    if isinstance(get_ai_summary, str):
+        try:
+            get_ai_summary = json.loads(get_ai_summary)
+        except json.JSONDecodeError:
+            print("Warning: AI summary was not valid JSON. Returning raw text.")
+            get_ai_summary = {"ai_summary": {"raw_text": get_ai_summary}}
+
+    return get_ai_summary.get("ai_summary", {})
+
+
 @app.route("/analyze-portfolio", methods=["POST"])
 def analyze_portfolio_route():
     """
@@ -33,59 +138,212 @@ def analyze_portfolio_route():
          {"symbol": "RVNL", "quantity": 32, "avgCost": 357.06},
          {"symbol": "BEL",  "quantity": 20, "avgCost": 271.66},
          {"symbol": "ITC",  "quantity": 10, "avgCost": 380.36}
-     ]
+     ],
+        "correlationMode": "auto",   // optional: "dense" | "topk" | "auto"
+        "correlationTopK": 5         // optional: pairs per holding in "topk" mode
     }
+    The X-Deadline-Ms header sets the time budget (default REQUEST_DEADLINE_MS); sections
+    cut short to meet it are listed under "degraded" and in the X-Report-Degraded header.
     """
     try:
         data = request.get_json()
         if not data or "holdings" not in data:
             return jsonify({"error": "Missing or invalid payload"}), 400
 
-        # Append ".NS" suffix for NSE-listed symbols
-        holdings_with_ns = [
-            {**h, "symbol": h["symbol"].upper() + ".NS"} for h in data["holdings"]
-        ]
+        try:
+            options = {**correlation_options(data), **simulation_options(data)}
+            deadline_ms = deadlines.parse_deadline_ms(request.headers.get("X-Deadline-Ms"))
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
 
-        # Generate portfolio analytics
-        result = generate_portfolio_report(holdings=holdings_with_ns)
+        holdings = with_ns_suffix(data["holdings"])
 
-        # Generate AI summary using Gemini
-        get_ai_summary = generate_response(result)
+        def compute():
+            # Generate portfolio analytics (one analytics slot; cache hits never queue)
+            with admit("analytics"):
+                result = generate_portfolio_report(holdings=holdings, **options)
 
-        # If generate_response returns a JSON string, convert to dict
-        if isinstance(get_ai_summary, str):
-            try:
-                get_ai_summary = json.loads(get_ai_summary)
-            except json.JSONDecodeError:
-                print("Warning: AI summary was not valid JSON. Returning raw text.")
-                get_ai_summary = {"ai_summary": {"raw_text": get_ai_summary}}
+            # Append AI summary to the result (omitted when the deadline leaves no room for it)
+            ai_summary = build_ai_summary(result)
+            if ai_summary is not None:
+                result["ai_summary"] = ai_summary
+            degraded = deadlines.degraded_report()
+            if degraded:
+                result["degraded"] = degraded
+            return result
 
-        # Append AI summary to the result
-        result["ai_summary"] = get_ai_summary.get("ai_summary", {})
+        # Identical holdings on the same market date share one report (Cache-Control: no-cache recomputes)
+        with priority(request_lane()), deadlines.deadline(deadline_ms):
+            if REPORT_CACHE_ENABLED:
+                refresh = "no-cache" in request.headers.get("Cache-Control", "").lower()
+                result, cache_status = report_cache.get_or_compute(report_key(holdings, options), compute, refresh)
+            else:
+                result, cache_status = compute(), BYPASS
 
-        return jsonify(result), 200
+        headers = {"X-Report-Cache": cache_status}
+        if result.get("degraded"):
+            headers["X-Report-Degraded"] = ",".join(dict.fromkeys(d["section"] for d in result["degraded"]))
+        return build_response(result, 200, request, headers=headers)
 
+    except AdmissionRejected as e:
+        return rejection_response(e)
     except Exception as e:
         print(f"Error in /analyze-portfolio: {e}")
         return jsonify({"error": str(e)}), 500
 
 
+@app.route("/analyze-portfolios", methods=["POST"])
+def analyze_portfolios_route():
+    """
+    Batch analysis. History and forecasts are computed once per unique symbol
+    across all portfolios. Expects:
+    {
+        "portfolios": [
+            {"portfolioId": 2, "holdings": [{"symbol": "RVNL", "quantity": 32, "avgCost": 357.06}, ...]},
+            {"portfolioId": 5, "holdings": [...]}
+        ],
+        "includeAiSummary": false
+    }
+    Streams one JSON object per line (application/x-ndjson) as each portfolio completes:
+    {"portfolioId": 2, "report": {...}}  or  {"portfolioId": 5, "error": "..."}
+    """
+    data = request.get_json(silent=True)
+    if not data or not isinstance(data.get("portfolios"), list):
+        return jsonify({"error": "Missing or invalid payload"}), 400
+
+    portfolios = []
+    for p in data["portfolios"]:
+        if not isinstance(p, dict) or "holdings" not in p:
+            return jsonify({"error": "Each portfolio needs 'holdings'"}), 400
+        portfolios.append({**p, "holdings": with_ns_suffix(p["holdings"])})
+    include_ai = bool(data.get("includeAiSummary", False))
+    try:
+        options = {**correlation_options(data), **simulation_options(data)}
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    # Batch work runs in the batch lane by default and holds one analytics slot for the whole stream;
+    # the slot is taken before responding so overload is a fast 429 / 503, not a stalled stream
+    lane = request_lane(default=BATCH)
+    try:
+        release = hold("analytics", lane)
+    except AdmissionRejected as e:
+        return rejection_response(e)
+
+    def stream():
+        try:
+            with priority(lane):
+                for portfolio_id, report, error in generate_portfolio_reports(portfolios, **options):
+                    if error is not None:
+                        yield dumps_json({"portfolioId": portfolio_id, "error": error}) + b"\n"
+                        continue
+                    if include_ai:
+                        with deadlines.degradations():
+                            ai_summary = build_ai_summary(report)
+                            degraded = deadlines.degraded_report()
+                        if ai_summary is not None:
+                            report["ai_summary"] = ai_summary
+                        if degraded:
+                            report["degraded"] = report.get("degraded", []) + degraded
+                    yield dumps_json({"portfolioId": portfolio_id, "report": report}) + b"\n"
+        except Exception as e:
+            print(f"Error in /analyze-portfolios: {e}")
+            yield dumps_json({"error": str(e)}) + b"\n"
+        finally:
+            release()
+
+    response = Response(stream_with_context(stream()), mimetype="application/x-ndjson")
+    response.call_on_close(release)  # also frees the slot if the stream is never iterated
+    return response
+
+
+@app.route("/metrics")
+def metrics_route():
+    """Admission queue depths / rejections per stage, market-data circuit state and report cache counters."""
+    return jsonify({
+        "admission": admission.metrics(),
+        "marketData": upstream_metrics(),
+        "reportCache": report_cache.stats(),
+        "timestamp": datetime.now().isoformat()
+    })
+
+
 # ==== Scheduler Setup ====
 
+# Last NSE session each job has processed, so restarts and holidays do not repeat a refresh
+SCHEDULER_STATE_PATH = os.getenv(
+    "SCHEDULER_STATE_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "analytics_store", "scheduler_state.json"))
+_scheduler_state_lock = threading.Lock()
+
+
+def _load_scheduler_state():
+    try:
+        with open(SCHEDULER_STATE_PATH, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+    except Exception as e:
+        print(f"[Warning] Could not read scheduler state: {e}")
+        return {}
+
+
+def run_for_session(job, label, fn):
+    """
+    Run fn() once per completed NSE session: skipped when `job` already ran for the
+    last completed session (nothing new since, e.g. on a holiday or after a restart).
+    Returns True when fn() ran.
+    """
+    session = last_completed_session().isoformat()
+    if _load_scheduler_state().get(job) == session:
+        today = market_now().date()
+        reason = "" if is_trading_day(today) else f" ({today} is not a trading day)"
+        print(f"[{datetime.now().isoformat()}] {label} already up to date for session {session}{reason}; skipping.")
+        return False
+
+    print(f"[{datetime.now().isoformat()}] {label} starting for session {session}...")
+    fn()
+    with _scheduler_state_lock:
+        state = _load_scheduler_state()
+        state[job] = session
+        try:
+            os.makedirs(os.path.dirname(SCHEDULER_STATE_PATH), exist_ok=True)
+            tmp = f"{SCHEDULER_STATE_PATH}.tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(state, f)
+            os.replace(tmp, SCHEDULER_STATE_PATH)
+        except Exception as e:
+            print(f"[Warning] Could not write scheduler state: {e}")
+    print(f"[{datetime.now().isoformat()}] {label} completed successfully.")
+    return True
+
+
 def scheduled_job_wrapper():
     """Wrapper for scheduled job with error handling and logging."""
-    print(f"[{datetime.now().isoformat()}] Scheduled Top Picks update starting...")
     try:
-        execute_picks()
-        print(f"[{datetime.now().isoformat()}] Scheduled Top Picks update completed successfully.")
+        with priority(BATCH):
+            run_for_session("topPicks", "Top Picks update", execute_picks)
     except Exception as e:
         print(f"[{datetime.now().isoformat()}] ERROR in scheduled Top Picks update: {e}")
         import traceback
         traceback.print_exc()
 
 
+def snapshot_job_wrapper():
+    """Wrapper for the analytics snapshot refresh with error handling and logging."""
+    try:
+        with priority(BATCH):
+            refreshed = run_for_session("analyticsSnapshots", "Analytics snapshot refresh", refresh_snapshots)
+        if refreshed:
+            report_cache.invalidate()  # new bars: cached reports from the previous market date are dead weight
+    except Exception as e:
+        print(f"[{datetime.now().isoformat()}] ERROR in analytics snapshot refresh: {e}")
+        import traceback
+        traceback.print_exc()
+
+
 def start_scheduler():
-    """Starts a background scheduler that updates top picks daily."""
+    """Starts a background scheduler that refreshes Top Picks and snapshots after each NSE session."""
     global scheduler
 
     # Prevent duplicate scheduler in debug mode
@@ -95,26 +353,35 @@ def start_scheduler():
 
     scheduler = BackgroundScheduler()
 
-    # Run once at startup
-    print(f"[{datetime.now().isoformat()}] Initial Top Picks update running...")
-    try:
-        execute_picks()
-        print(f"[{datetime.now().isoformat()}] Initial Top Picks update completed.")
-    except Exception as e:
-        print(f"[{datetime.now().isoformat()}] Initial execution failed: {e}")
-        import traceback
-        traceback.print_exc()
+    # Catch up at startup if the last completed session has not been processed yet
+    scheduled_job_wrapper()
 
-    # Schedule daily updates (every 24 hours)
+    # Top Picks (and the shared price panel) after NSE close (15:30 IST); holidays are no-op skips
     scheduler.add_job(
         scheduled_job_wrapper,
-        'interval',
-        hours=24,
+        'cron',
+        day_of_week='mon-fri',
+        hour=16,
+        minute=0,
+        timezone='Asia/Kolkata',
         id='daily_top_picks_job',
         replace_existing=True
     )
+
+    # Per-symbol analytics snapshots for the most requested symbols, after Top Picks has published the panel
+    load_popularity()
+    scheduler.add_job(
+        snapshot_job_wrapper,
+        'cron',
+        day_of_week='mon-fri',
+        hour=16,
+        minute=15,
+        timezone='Asia/Kolkata',
+        id='daily_analytics_snapshot_job',
+        replace_existing=True
+    )
     scheduler.start()
-    print(f"[{datetime.now().isoformat()}] Scheduler started — Top Picks will update every 24 hours.")
+    print(f"[{datetime.now().isoformat()}] Scheduler started — Top Picks and snapshots refresh after each NSE session.")
 
 
 def shutdown_scheduler():
@@ -132,7 +399,6 @@ atexit.register(shutdown_scheduler)
 
 if __name__ == "__main__":
     # Only start scheduler if not in reloader process (fixes debug=True issue)
-    import os
     if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
         start_scheduler()
 
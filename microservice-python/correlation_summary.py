@@ -0,0 +1,139 @@
+# correlation_summary.py
+import numpy as np
+import pandas as pd
+from scipy.cluster.hierarchy import linkage, fcluster
+from scipy.spatial.distance import squareform
+
+from serialization import encode_matrix
+
+CORRELATION_MODES = ("auto", "dense", "topk")
+AUTO_DENSE_MAX_HOLDINGS = 25  # "auto" sends the dense matrix up to this many holdings
+
+
+# -----------------------------
+# Helper: Correlation distance
+# -----------------------------
+def correlation_distance(corr: np.ndarray) -> np.ndarray:
+    """d_ij = sqrt((1 - rho_ij) / 2), a proper metric on correlations."""
+    dist = np.sqrt(np.clip((1 - corr) / 2, 0, None))
+    np.fill_diagonal(dist, 0.0)
+    return dist
+
+
+# -----------------------------
+# Top-K pairs per holding
+# -----------------------------
+def top_k_pairs(corr: pd.DataFrame, k: int = 5, decimals: int = 4):
+    """
+    For every holding, the k most correlated and k most anti-correlated other holdings.
+    One argpartition per direction over the whole matrix, then a sort of only the k picks.
+    """
+    symbols = np.asarray(corr.columns)
+    values = corr.to_numpy(dtype=float).copy()
+    n = len(symbols)
+    k = max(0, min(k, n - 1))
+    if k == 0:
+        return {sym: {"mostCorrelated": [], "mostAntiCorrelated": []} for sym in symbols}
+
+    np.fill_diagonal(values, np.nan)
+    high = np.where(np.isnan(values), -np.inf, values)
+    low = np.where(np.isnan(values), np.inf, values)
+
+    top_idx = np.argpartition(-high, k - 1, axis=1)[:, :k]
+    top_vals = np.take_along_axis(high, top_idx, axis=1)
+    order = np.argsort(-top_vals, axis=1)
+    top_idx = np.take_along_axis(top_idx, order, axis=1)
+    top_vals = np.round(np.take_along_axis(top_vals, order, axis=1), decimals)
+
+    bottom_idx = np.argpartition(low, k - 1, axis=1)[:, :k]
+    bottom_vals = np.take_along_axis(low, bottom_idx, axis=1)
+    order = np.argsort(bottom_vals, axis=1)
+    bottom_idx = np.take_along_axis(bottom_idx, order, axis=1)
+    bottom_vals = np.round(np.take_along_axis(bottom_vals, order, axis=1), decimals)
+
+    top_syms = symbols[top_idx].tolist()
+    bottom_syms = symbols[bottom_idx].tolist()
+    top_vals = top_vals.tolist()
+    bottom_vals = bottom_vals.tolist()
+    return {
+        sym: {
+            "mostCorrelated": [list(p) for p in zip(top_syms[i], top_vals[i])],
+            "mostAntiCorrelated": [list(p) for p in zip(bottom_syms[i], bottom_vals[i])],
+        }
+        for i, sym in enumerate(symbols.tolist())
+    }
+
+
+# -----------------------------
+# Cluster block summaries
+# -----------------------------
+def cluster_labels(corr: pd.DataFrame, n_clusters: int = None) -> np.ndarray:
+    """Average-linkage clustering on correlation distance; returns 0-based labels."""
+    n = corr.shape[0]
+    if n < 2:
+        return np.zeros(n, dtype=int)
+    n_clusters = n_clusters or max(1, int(round(np.sqrt(n))))
+
+    dist = correlation_distance(corr.to_numpy(dtype=float))
+    tree = linkage(squareform(dist, checks=False), method="average")
+    return fcluster(tree, t=min(n_clusters, n), criterion="maxclust") - 1
+
+
+def cluster_blocks(corr: pd.DataFrame, n_clusters: int = None, decimals: int = 4):
+    """
+    Group holdings into correlation clusters and summarise each block:
+    members, average intra-cluster correlation and the cluster x cluster average correlation.
+    """
+    labels = cluster_labels(corr, n_clusters)
+    values = corr.to_numpy(dtype=float)
+    n_found = int(labels.max()) + 1 if labels.size else 0
+
+    membership = np.zeros((len(labels), n_found))
+    membership[np.arange(len(labels)), labels] = 1.0
+    sizes = membership.sum(axis=0)
+
+    block_sums = membership.T @ values @ membership
+    pair_counts = np.outer(sizes, sizes)
+    # Intra-cluster averages exclude the unit diagonal
+    intra_sums = np.diag(block_sums) - sizes
+    intra_pairs = sizes * (sizes - 1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        block_avg = block_sums / pair_counts
+        intra_avg = np.where(intra_pairs > 0, intra_sums / intra_pairs, np.nan)
+    np.fill_diagonal(block_avg, intra_avg)
+
+    symbols = np.asarray(corr.columns)
+    clusters = [
+        {
+            "id": c,
+            "members": symbols[labels == c].tolist(),
+            "size": int(sizes[c]),
+            "avgIntraCorrelation": None if np.isnan(intra_avg[c]) else round(float(intra_avg[c]), decimals),
+        }
+        for c in range(n_found)
+    ]
+    between = pd.DataFrame(block_avg, index=range(n_found), columns=range(n_found))
+    return {"clusters": clusters, "betweenClusters": encode_matrix(between, decimals)}
+
+
+# -----------------------------
+# Entry point
+# -----------------------------
+def summarize_correlation(corr: pd.DataFrame, mode: str = "auto", top_k: int = 5):
+    """
+    Correlation output for the report.
+    dense -> {"correlationMatrix": {...}}
+    topk  -> {"correlationTopK": {...}, "correlationClusters": {...}}
+    auto  -> dense for small portfolios, topk otherwise
+    """
+    if mode not in CORRELATION_MODES:
+        raise ValueError(f"Unknown correlation mode '{mode}'. Use one of {CORRELATION_MODES}.")
+    if mode == "auto":
+        mode = "dense" if corr.shape[0] <= AUTO_DENSE_MAX_HOLDINGS else "topk"
+
+    if mode == "dense":
+        return {"correlationMatrix": encode_matrix(corr, decimals=4)}
+    return {
+        "correlationTopK": top_k_pairs(corr, top_k),
+        "correlationClusters": cluster_blocks(corr),
+    }
@@ -0,0 +1,223 @@
+# covariance_service.py
+import os
+import threading
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+
+DEFAULT_METHOD = os.getenv("COVARIANCE_METHOD", "ledoit_wolf")
+EWMA_LAMBDA = float(os.getenv("COVARIANCE_EWMA_LAMBDA", 0.94))  # RiskMetrics daily decay
+
+
+# -----------------------------
+# Estimators
+# -----------------------------
+def sample_covariance(returns: pd.DataFrame) -> np.ndarray:
+    return np.atleast_2d(np.cov(returns.to_numpy(dtype=float), rowvar=False))
+
+
+def ledoit_wolf_covariance(returns: pd.DataFrame):
+    """
+    Ledoit-Wolf (2004) shrinkage towards a scaled identity, closed form.
+    Returns (covariance, shrinkage intensity). Well-conditioned even when N approaches T.
+    """
+    x = returns.to_numpy(dtype=float)
+    x = x - x.mean(axis=0)
+    x2 = x ** 2
+    return ledoit_wolf_from_moments(x.T @ x, x2.T @ x2, len(x))
+
+
+def ledoit_wolf_from_moments(gram, gram_sq, n_obs):
+    """
+    Ledoit-Wolf from the centered moments X'X and (X*X)'(X*X) of a T x N return window,
+    so the estimate for any symbol subset is a submatrix lookup (see CovarianceService).
+    """
+    n_assets = gram.shape[0]
+    s = gram / n_obs
+    mu = np.trace(s) / n_assets
+    target = mu * np.eye(n_assets)
+
+    d2 = np.sum((s - target) ** 2)
+    b2_bar = (np.sum(gram_sq) / n_obs - np.sum(s ** 2)) / n_obs
+    b2 = min(b2_bar, d2)
+    shrinkage = b2 / d2 if d2 > 0 else 0.0
+
+    return shrinkage * target + (1 - shrinkage) * s, float(shrinkage)
+
+
+def ewma_covariance(returns: pd.DataFrame, lam: float = EWMA_LAMBDA) -> np.ndarray:
+    """
+    Exponentially weighted (zero-mean, RiskMetrics) covariance in one weighted product:
+    S = sum_k w_k r_k r_k' / sum_k w_k with w_k = lam^(T-1-k).
+    """
+    x = returns.to_numpy(dtype=float)
+    weights = lam ** np.arange(len(x) - 1, -1, -1)
+    weights /= weights.sum()
+    return (x * weights[:, None]).T @ x
+
+
+def ewma_update(cov: np.ndarray, new_returns: np.ndarray, lam: float = EWMA_LAMBDA) -> np.ndarray:
+    """
+    Roll an EWMA covariance forward by one or more new bars: S_t = lam S_{t-1} + (1 - lam) r_t r_t'.
+    """
+    for r in np.atleast_2d(new_returns):
+        cov = lam * cov + (1 - lam) * np.outer(r, r)
+    return cov
+
+
+ESTIMATORS = ("sample", "ledoit_wolf", "ewma")
+MOMENT_METHODS = ("sample", "ledoit_wolf")  # estimators computed from window moments
+MAX_MOMENT_SYMBOLS = int(os.getenv("COVARIANCE_MAX_MOMENT_SYMBOLS", 512))
+MAX_MOMENT_WINDOWS = 8
+
+
+# -----------------------------
+# Cached covariance service
+# -----------------------------
+class CovarianceService:
+    """
+    Computes a covariance matrix once per (method, symbol set, return window) and caches it,
+    so risk, optimization and simulation for the same request all use the same matrix.
+
+    EWMA matrices are additionally rolled forward incrementally: when the cached state for a
+    symbol set ends at an earlier bar than the requested window, only the new bars are applied.
+
+    Sample and Ledoit-Wolf matrices come from centered moments kept per return window for
+    every symbol seen in it. A symbol set that adds one holding to a known set only computes
+    that symbol's row and column of X'X; removing a holding is a submatrix lookup.
+    """
+
+    def __init__(self, max_entries=256, ewma_lambda=EWMA_LAMBDA):
+        self.max_entries = max_entries
+        self.ewma_lambda = ewma_lambda
+        self._lock = threading.Lock()
+        self._cache = OrderedDict()   # key -> DataFrame
+        self._ewma_state = {}         # symbols -> (last_date, covariance ndarray)
+        self._moments = OrderedDict() # window -> centered returns + X'X / (X*X)'(X*X) per symbol seen
+        self._stats = {"hits": 0, "misses": 0, "ewmaIncrementalUpdates": 0, "momentColumnsComputed": 0}
+
+    @staticmethod
+    def _key(method, returns):
+        return (
+            method,
+            tuple(returns.columns),
+            returns.index[0],
+            returns.index[-1],
+            len(returns),
+        )
+
+    def _store(self, key, value):
+        with self._lock:
+            self._cache[key] = value
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+
+    def _compute_ewma(self, returns):
+        symbols = tuple(returns.columns)
+        with self._lock:
+            state = self._ewma_state.get(symbols)
+
+        if state is not None:
+            last_date, cov = state
+            if last_date in returns.index and last_date < returns.index[-1]:
+                new_rows = returns.loc[returns.index > last_date].to_numpy(dtype=float)
+                cov = ewma_update(cov, new_rows, self.ewma_lambda)
+                with self._lock:
+                    self._stats["ewmaIncrementalUpdates"] += 1
+            elif last_date != returns.index[-1]:
+                cov = ewma_covariance(returns, self.ewma_lambda)
+        else:
+            cov = ewma_covariance(returns, self.ewma_lambda)
+
+        with self._lock:
+            self._ewma_state[symbols] = (returns.index[-1], cov)
+        return cov
+
+    def _window_moments(self, returns):
+        """
+        (gram, gram_sq) for the columns of `returns`, reusing the window's stored moments and
+        computing cross-products only for symbols that are new (or whose returns changed).
+        """
+        window = (returns.index[0], returns.index[-1], len(returns))
+        x = returns.to_numpy(dtype=float)
+        x = x - x.mean(axis=0)  # each column is centered on its own, so columns stay independent
+        symbols = list(returns.columns)
+
+        with self._lock:
+            state = self._moments.get(window)
+            if state is not None:
+                self._moments.move_to_end(window)
+                state = dict(state)
+
+        if state is None or len(state["symbols"]) + len(symbols) > MAX_MOMENT_SYMBOLS:
+            state = {"symbols": [], "x": np.empty((len(x), 0)), "gram": np.empty((0, 0)),
+                     "gram_sq": np.empty((0, 0))}
+        positions = {sym: i for i, sym in enumerate(state["symbols"])}
+
+        fresh = [j for j, sym in enumerate(symbols)
+                 if sym not in positions or not np.array_equal(state["x"][:, positions[sym]], x[:, j])]
+        if fresh:
+            # Drop stale versions of changed symbols, then append the fresh columns
+            keep = [i for i, sym in enumerate(state["symbols"]) if sym not in {symbols[j] for j in fresh}]
+            old_x = state["x"][:, keep]
+            new_x = x[:, fresh]
+            cross = old_x.T @ new_x
+            cross_sq = (old_x ** 2).T @ (new_x ** 2)
+            state = {
+                "symbols": [state["symbols"][i] for i in keep] + [symbols[j] for j in fresh],
+                "x": np.hstack([old_x, new_x]),
+                "gram": np.block([[state["gram"][np.ix_(keep, keep)], cross], [cross.T, new_x.T @ new_x]]),
+                "gram_sq": np.block([[state["gram_sq"][np.ix_(keep, keep)], cross_sq],
+                                     [cross_sq.T, (new_x ** 2).T @ (new_x ** 2)]]),
+            }
+            positions = {sym: i for i, sym in enumerate(state["symbols"])}
+            with self._lock:
+                self._moments[window] = state
+                self._moments.move_to_end(window)
+                while len(self._moments) > MAX_MOMENT_WINDOWS:
+                    self._moments.popitem(last=False)
+                self._stats["momentColumnsComputed"] += len(fresh)
+
+        idx = [positions[sym] for sym in symbols]
+        return state["gram"][np.ix_(idx, idx)], state["gram_sq"][np.ix_(idx, idx)]
+
+    def get(self, returns: pd.DataFrame, method: str = None) -> pd.DataFrame:
+        """Covariance of a date x symbol return matrix (no NaNs) as a symbol-labelled DataFrame."""
+        method = method or DEFAULT_METHOD
+        if method not in ESTIMATORS:
+            raise ValueError(f"Unknown covariance method '{method}'. Use one of {ESTIMATORS}.")
+
+        key = self._key(method, returns)
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached is not None:
+                self._cache.move_to_end(key)
+                self._stats["hits"] += 1
+                return cached
+            self._stats["misses"] += 1
+
+        if method in MOMENT_METHODS and len(returns) > 1:
+            gram, gram_sq = self._window_moments(returns)
+            if method == "sample":
+                cov = gram / (len(returns) - 1)
+            else:
+                cov, _ = ledoit_wolf_from_moments(gram, gram_sq, len(returns))
+        else:
+            cov = self._compute_ewma(returns)
+
+        result = pd.DataFrame(cov, index=returns.columns, columns=returns.columns)
+        self._store(key, result)
+        return result
+
+    def stats(self):
+        with self._lock:
+            return {**self._stats, "size": len(self._cache)}
+
+
+covariance_service = CovarianceService()
+
+
+def get_covariance(returns: pd.DataFrame, method: str = None) -> pd.DataFrame:
+    """Shared, cached covariance for a return matrix (see CovarianceService)."""
+    return covariance_service.get(returns, method)
@@ -1,45 +1,126 @@
-import yfinance as yf
+import os
 import pandas as pd
 from datetime import datetime, timedelta
+from market_data import get_provider, MarketDataError
+from caching import TTLCache
+from circuit_breaker import CircuitBreaker, CircuitOpenError, NegativeCache
+from price_panel import attach as attach_price_panel
+from admission import admit, AdmissionRejected
+import last_good
 
 # ---------------------------
-# Fetch Current Quote
+# Shared Quote Cache
 # ---------------------------
-def get_current_quote(symbol: str):
+# Popular symbols are requested by many dashboards at once: serve them from a short-TTL
+# cache, coalesce concurrent misses into one upstream call, and serve slightly stale
+# quotes while a background refresh runs.
+QUOTE_CACHE_TTL_SECONDS = float(os.getenv("QUOTE_CACHE_TTL_SECONDS", 15))
+QUOTE_CACHE_STALE_SECONDS = float(os.getenv("QUOTE_CACHE_STALE_SECONDS", 45))
+
+quote_cache = TTLCache(ttl=QUOTE_CACHE_TTL_SECONDS, stale_ttl=QUOTE_CACHE_STALE_SECONDS)
+
+
+# ---------------------------
+# Upstream Protection
+# ---------------------------
+# When the provider throttles or fails, a circuit breaker stops every request from hammering
+# it, and symbols that just failed (or came back empty) are negatively cached. Failed calls
+# are answered from the last-known-good copy (see last_good), flagged stale.
+BREAKER_FAILURE_RATE = float(os.getenv("MARKET_DATA_BREAKER_FAILURE_RATE", 0.5))
+BREAKER_MIN_CALLS = int(os.getenv("MARKET_DATA_BREAKER_MIN_CALLS", 10))
+BREAKER_WINDOW_SECONDS = float(os.getenv("MARKET_DATA_BREAKER_WINDOW_SECONDS", 60))
+BREAKER_OPEN_SECONDS = float(os.getenv("MARKET_DATA_BREAKER_OPEN_SECONDS", 30))
+NEGATIVE_TTL_SECONDS = float(os.getenv("MARKET_DATA_NEGATIVE_TTL_SECONDS", 60))  # after a failed call
+EMPTY_TTL_SECONDS = float(os.getenv("MARKET_DATA_EMPTY_TTL_SECONDS", 3600))  # after an empty answer
+
+upstream_breaker = CircuitBreaker(
+    "marketData", failure_rate=BREAKER_FAILURE_RATE, min_calls=BREAKER_MIN_CALLS,
+    window_seconds=BREAKER_WINDOW_SECONDS, open_seconds=BREAKER_OPEN_SECONDS,
+    is_failure=lambda e: not isinstance(e, AdmissionRejected),  # local overload is not an upstream fault
+)
+negative_cache = NegativeCache()
+
+
+def call_upstream(kind, symbol, fn):
     """
-    Fetch current market data for a stock.
+    fn() as one provider call for `symbol`, through the negative cache and the circuit
+    breaker. Raises MarketDataError (symbol failed recently), CircuitOpenError, or the
+    provider's own error (which negatively caches the symbol).
     """
+    if negative_cache.blocked((kind, symbol)):
+        raise MarketDataError(f"{kind} for {symbol} failed recently; not retrying yet")
     try:
-        ticker = yf.Ticker(symbol)
-        data = ticker.history(period="1d", auto_adjust=True)
-        fast_info = ticker.fast_info  # faster and more stable than .info
+        with upstream_breaker.guard():
+            return fn()
+    except (CircuitOpenError, AdmissionRejected):
+        raise
+    except Exception:
+        negative_cache.mark((kind, symbol), "error", NEGATIVE_TTL_SECONDS)
+        raise
 
-        if data.empty:
-            return None
 
-        current_price = fast_info.get("last_price") or data["Close"].iloc[-1]
-        prev_close = fast_info.get("previous_close")
-        open_price = fast_info.get("open", data["Open"].iloc[-1])
-        high = fast_info.get("day_high", data["High"].iloc[-1])
-        low = fast_info.get("day_low", data["Low"].iloc[-1])
-        volume = fast_info.get("last_volume", data["Volume"].iloc[-1])
+def upstream_metrics():
+    return {"breaker": upstream_breaker.metrics(), "negativeCache": negative_cache.stats()}
 
-        change_percent = None
-        if prev_close and prev_close != 0:
-            change_percent = ((current_price - prev_close) / prev_close) * 100
 
-        return {
-            "symbol": symbol,
-            "currentPrice": round(current_price, 2),
-            "previousClose": round(prev_close, 2) if prev_close else None,
-            "open": round(open_price, 2),
-            "high": round(high, 2),
-            "low": round(low, 2),
-            "volume": int(volume),
-            "changePercent": round(change_percent, 2) if change_percent else None,
-            "timestamp": datetime.now().isoformat()
-        }
+# ---------------------------
+# Fetch Current Quote
+# ---------------------------
+def _format_quote(symbol: str, data: dict, timestamp: str):
+    current_price = data["lastPrice"]
+    prev_close = data["previousClose"]
+    open_price = data["open"]
+    high = data["high"]
+    low = data["low"]
+    volume = data["volume"]
+
+    change_percent = None
+    if prev_close and prev_close != 0:
+        change_percent = ((current_price - prev_close) / prev_close) * 100
+
+    return {
+        "symbol": symbol,
+        "currentPrice": round(current_price, 2),
+        "previousClose": round(prev_close, 2) if prev_close else None,
+        "open": round(open_price, 2),
+        "high": round(high, 2),
+        "low": round(low, 2),
+        "volume": int(volume),
+        "changePercent": round(change_percent, 2) if change_percent else None,
+        "timestamp": timestamp
+    }
+
 
+def _fetch_quote(symbol: str):
+    """
+    Fetch current market data for a stock from the provider (uncached).
+    Falls back to the last-known-good quote ("stale": True) when the upstream call fails.
+    """
+    try:
+        data = call_upstream("quote", symbol, lambda: get_provider().quote(symbol))
+    except Exception as e:
+        print(f"[Error] Fetching current quote for {symbol}: {e}")
+        data = last_good.quote(symbol)
+        if not data:
+            return None
+        return {**_format_quote(symbol, data, data["timestamp"]), "stale": True}
+    if not data:
+        return None
+
+    timestamp = datetime.now().isoformat()
+    last_good.save_quote(symbol, {**data, "timestamp": timestamp})
+    return _format_quote(symbol, data, timestamp)
+
+
+def get_current_quote(symbol: str):
+    """
+    Fetch current market data for a stock (served through the shared quote cache).
+    'timestamp' is the time the quote was fetched upstream; last-known-good fallbacks
+    carry "stale": True.
+    """
+    try:
+        quote = quote_cache.get(symbol, lambda: _fetch_quote(symbol))
+        return dict(quote) if quote else None
     except Exception as e:
         print(f"[Error] Fetching current quote for {symbol}: {e}")
         return None
@@ -48,23 +129,47 @@ def get_current_quote(symbol: str):
 # ---------------------------
 # Historical OHLCV Data
 # ---------------------------
+def _admitted_history(symbol: str, start_date: str, end_date: str):
+    # Upstream fetches share the marketData admission slots (AdmissionRejected propagates)
+    with admit("marketData"):
+        return get_provider().history(symbol, start_date, end_date)
+
+
 def get_historical_data(symbol: str, start_date: str, end_date: str):
     """
     Fetch historical OHLCV data between two dates.
+    Symbols covered by the shared price panel are sliced from it instead
+    (Date + Close only, which is all the analytics use). When the upstream fails
+    or its circuit is open, the last-known-good copy is returned with
+    attrs["stale"] = True (an empty frame if there is none).
     """
+    panel = attach_price_panel()
+    if panel is not None and panel.covers(symbol, start_date):
+        close = panel.series(symbol, start_date, end_date)
+        if not close.empty:
+            return pd.DataFrame({"Date": close.index, "Close": close.to_numpy()})
+
+    window = ("history", symbol, start_date, end_date)
+    if negative_cache.blocked(window):
+        return pd.DataFrame()
     try:
-        df = yf.download(symbol, start=start_date, end=end_date, auto_adjust=True, progress=False)
-        if df.empty:
-            print(f"[Warning] No historical data returned for {symbol}")
-            return pd.DataFrame()
-
-        df.reset_index(inplace=True)
-        df["Date"] = pd.to_datetime(df["Date"])
-        return df
+        df = call_upstream("history", symbol, lambda: _admitted_history(symbol, start_date, end_date))
+    except AdmissionRejected:
+        raise
     except Exception as e:
         print(f"[Error] Fetching historical data for {symbol}: {e}")
+        return last_good.history(symbol, start_date, end_date)
+
+    if df.empty:
+        print(f"[Warning] No historical data returned for {symbol}")
+        negative_cache.mark(window, "empty", EMPTY_TTL_SECONDS)
         return pd.DataFrame()
 
+    df.reset_index(inplace=True)
+    df["Date"] = pd.to_datetime(df["Date"])
+    last_good.save_history(symbol, df)
+    return df
+
 
 # ---------------------------
 # Fundamental Metrics
@@ -75,8 +180,7 @@ def get_fundamentals(symbol: str):
     (Using 'info' — slower but more complete)
     """
     try:
-        ticker = yf.Ticker(symbol)
-        info = ticker.info or {}
+        info = get_provider().fundamentals(symbol) or {}
 
         fundamentals = {
             "symbol": symbol,
@@ -0,0 +1,149 @@
+# deadlines.py
+"""
+Per-request time budgets for portfolio reports.
+
+/analyze-portfolio runs under a deadline (X-Deadline-Ms header, else REQUEST_DEADLINE_MS).
+Each stage checks the remaining budget before starting expensive work and degrades
+instead of overrunning it:
+
+    history       symbols still downloading when the fetch budget is spent are left out
+    forecasts     ARIMA escalations fall back to the cheap mean model; Monte Carlo paths are cut
+    optimization  fewer efficient-frontier / CVaR simulations
+    aiSummary     omitted, or abandoned if Gemini does not answer before the deadline
+
+Degradations are collected per request and reported under the report's "degraded" key
+(stale market data is recorded the same way, see last_good). Work without a deadline
+(batch routes, scheduled jobs) is never cut short.
+"""
+import os
+import time
+import threading
+import contextvars
+from contextlib import contextmanager
+
+DEFAULT_DEADLINE_MS = int(os.getenv("REQUEST_DEADLINE_MS", 20000))  # 0 disables the default deadline
+MAX_DEADLINE_MS = int(os.getenv("REQUEST_MAX_DEADLINE_MS", 120000))
+
+# Budget a stage needs left before it starts its full-quality work
+ANALYTICS_RESERVE_SECONDS = float(os.getenv("DEADLINE_ANALYTICS_RESERVE_SECONDS", 2.0))  # kept back from fetches
+ARIMA_MIN_SECONDS = float(os.getenv("DEADLINE_ARIMA_MIN_SECONDS", 4.0))
+FULL_SIMULATION_MIN_SECONDS = float(os.getenv("DEADLINE_FULL_SIMULATION_MIN_SECONDS", 1.5))
+AI_MIN_SECONDS = float(os.getenv("DEADLINE_AI_MIN_SECONDS", 3.0))
+REDUCED_SIMULATION_FRACTION = float(os.getenv("DEADLINE_REDUCED_SIMULATION_FRACTION", 0.2))
+MIN_SIMULATIONS = 100
+
+_deadline = contextvars.ContextVar("request_deadline", default=None)  # time.monotonic() value
+_degraded = contextvars.ContextVar("degraded_sections", default=None)  # shared by the request's threads
+
+
+class _Degradations:
+    """(section, reason) -> affected symbols, for one request."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = {}
+
+    def add(self, section, reason, symbols=()):
+        with self._lock:
+            self._entries.setdefault((section, reason), set()).update(symbols)
+
+    def sections(self):
+        with self._lock:
+            return list(dict.fromkeys(section for section, _ in self._entries))
+
+    def report(self):
+        with self._lock:
+            return [
+                {"section": section, "reason": reason, **({"symbols": sorted(symbols)} if symbols else {})}
+                for (section, reason), symbols in self._entries.items()
+            ]
+
+
+# ---------------------------
+# Scope
+# ---------------------------
+def parse_deadline_ms(value):
+    """Budget in ms from a header value; falls back to REQUEST_DEADLINE_MS, capped at REQUEST_MAX_DEADLINE_MS."""
+    try:
+        ms = int(value) if value not in (None, "") else DEFAULT_DEADLINE_MS
+    except (TypeError, ValueError):
+        raise ValueError("X-Deadline-Ms must be an integer number of milliseconds")
+    if ms < 0:
+        raise ValueError("X-Deadline-Ms must be non-negative")
+    return min(ms, MAX_DEADLINE_MS) if ms else 0
+
+
+@contextmanager
+def deadline(ms):
+    """Run the block under a budget of `ms` milliseconds (0 / None: no deadline)."""
+    token = _deadline.set(time.monotonic() + ms / 1000.0 if ms else None)
+    degraded_token = _degraded.set(_Degradations())
+    try:
+        yield
+    finally:
+        _degraded.reset(degraded_token)
+        _deadline.reset(token)
+
+
+@contextmanager
+def degradations():
+    """Collect degradations for the block (e.g. one portfolio of a batch) without changing the deadline."""
+    token = _degraded.set(_Degradations())
+    try:
+        yield
+    finally:
+        _degraded.reset(token)
+
+
+# ---------------------------
+# Budget checks
+# ---------------------------
+def expires_at():
+    """time.monotonic() value of the current deadline, or None."""
+    return _deadline.get()
+
+
+def remaining():
+    """Seconds left in the current budget (None when there is no deadline)."""
+    at = _deadline.get()
+    return None if at is None else max(0.0, at - time.monotonic())
+
+
+def has_budget(seconds):
+    """True when there is no deadline or at least `seconds` of it are left."""
+    left = remaining()
+    return left is None or left >= seconds
+
+
+def simulation_count(sims, section):
+    """`sims`, or a reduced count (recorded as a degradation of `section`) when the budget is short."""
+    if has_budget(FULL_SIMULATION_MIN_SECONDS):
+        return sims
+    reduced = max(MIN_SIMULATIONS, int(sims * REDUCED_SIMULATION_FRACTION))
+    if reduced < sims:
+        degrade(section, "reducedSimulations")
+    return min(sims, reduced)
+
+
+# ---------------------------
+# Degradation record
+# ---------------------------
+def degrade(section, reason, symbols=()):
+    """Record that `section` of the current report was cut short."""
+    record = _degraded.get()
+    if record is not None:
+        record.add(section, reason, symbols)
+
+
+def is_degraded(section=None):
+    record = _degraded.get()
+    if record is None:
+        return False
+    sections = record.sections()
+    return bool(sections) if section is None else section in sections
+
+
+def degraded_report():
+    """[{"section", "reason", "symbols"?}, ...] for the current request."""
+    record = _degraded.get()
+    return record.report() if record is not None else []
@@ -1,11 +1,16 @@
 # descriptive_metrics.py
-from datetime import datetime, timedelta
 import numpy as np
+import pandas as pd
 from data_fetcher import (
     get_current_quote,
     get_historical_data,
     compute_metrics,
 )
+from risk_engine import build_value_weights, compute_portfolio_risk
+from covariance_service import get_covariance
+from trading_calendar import session_window
+
+RISK_FREE_RATE = 0.06  # same annual rate compute_metrics uses
 
 # ----------------------------------------------------------
 # Analyze individual holding
@@ -15,16 +20,42 @@ def analyze_holding(symbol: str, quantity: float, avg_cost: float):
     Compute descriptive stats for one holding.
     Combines current quote + derived metrics + P&L.
     """
+    result, _ = _analyze_holding(symbol, quantity, avg_cost)
+    return result
+
+
+def history_stats(symbol: str, hist: pd.DataFrame):
+    """
+    The quantity-independent part of a holding: (compute_metrics() output, daily
+    close-to-close returns indexed by date). Either is None without history.
+    """
+    if hist is None or hist.empty:
+        return None, None
+    close = hist.set_index("Date")["Close"]
+    if isinstance(close, pd.DataFrame):
+        close = close.squeeze(axis=1)
+    return compute_metrics(hist), close.pct_change().dropna().rename(symbol)
+
+
+def _analyze_holding(symbol: str, quantity: float, avg_cost: float, hist=None, stats=None):
+    """
+    analyze_holding() plus the holding's daily close-to-close returns (indexed by date),
+    which analyze_portfolio() needs for weighted portfolio statistics.
+    `hist` is an already-fetched get_historical_data() frame, if the caller has one;
+    `stats` an already-computed history_stats() result.
+    """
     # Current quote
     quote = get_current_quote(symbol)
     if not quote:
-        return None
+        return None, None
 
     # Historical metrics (1 year default)
-    end_date = datetime.today().date()
-    start_date = end_date - timedelta(days=365)
-    hist = get_historical_data(symbol, str(start_date), str(end_date))
-    derived = compute_metrics(hist) if not hist.empty else None
+    if stats is None:
+        if hist is None:
+            start_date, end_date = session_window(365)
+            hist = get_historical_data(symbol, start_date, end_date)
+        stats = history_stats(symbol, hist)
+    derived, daily_returns = stats
 
     # P&L computation
     current_price = quote["currentPrice"]
@@ -47,25 +78,35 @@ def analyze_holding(symbol: str, quantity: float, avg_cost: float):
         "cumulativeReturn": derived["cumulativeReturn"] if derived else None,
         "averageDailyReturn": derived["averageDailyReturn"] if derived else None,
         "timestamp": quote["timestamp"],
-    }
+        **({"stale": True} if quote.get("stale") else {}),
+    }, daily_returns
 
 
 # ----------------------------------------------------------
 # Analyze full portfolio
 # ----------------------------------------------------------
-def analyze_portfolio(holdings: list):
+def analyze_portfolio(holdings: list, historical_data: dict = None, symbol_stats: dict = None):
     """
     holdings = [
         {"symbol": "RVNL", "quantity": 15, "avgCost": 200.10},
         {"symbol": "BEL", "quantity": 5, "avgCost": 100.30},
         ...
     ]
+    historical_data: optional {symbol: get_historical_data() frame} to avoid refetching.
+    symbol_stats: optional {symbol: history_stats() result} to avoid recomputing them.
     """
+    historical_data = historical_data or {}
+    symbol_stats = symbol_stats or {}
     results = []
+    return_series = []
     for h in holdings:
-        res = analyze_holding(h["symbol"], h["quantity"], h["avgCost"])
+        res, daily_returns = _analyze_holding(h["symbol"], h["quantity"], h["avgCost"],
+                                              hist=historical_data.get(h["symbol"]),
+                                              stats=symbol_stats.get(h["symbol"]))
         if res:
             results.append(res)
+            if daily_returns is not None and not daily_returns.empty:
+                return_series.append(daily_returns)
 
     if not results:
         return {"error": "No valid holdings found."}
@@ -80,10 +121,17 @@ def analyze_portfolio(holdings: list):
     for r in results:
         r["currentPercent"] = (r["currentValue"] / total_value * 100) if total_value > 0 else 0
 
-    # Portfolio averages
-    avg_daily_return = np.nanmean([r["averageDailyReturn"] for r in results if r["averageDailyReturn"] is not None])
-    avg_volatility = np.nanmean([r["volatility"] for r in results if r["volatility"] is not None])
-    avg_sharpe = np.nanmean([r["sharpeRatio"] for r in results if r["sharpeRatio"] is not None])
+    # Portfolio statistics of the value-weighted return series (covariance-based volatility)
+    avg_daily_return = avg_volatility = avg_sharpe = np.nan
+    if return_series:
+        returns = pd.concat(return_series, axis=1).dropna()
+        if not returns.empty:
+            weights = build_value_weights(results, returns.columns)
+            risk = compute_portfolio_risk(returns, weights, cov_matrix=get_covariance(returns))
+            avg_daily_return = risk["averageReturn"]
+            avg_volatility = risk["volatility"]
+            if avg_volatility:
+                avg_sharpe = (avg_daily_return - RISK_FREE_RATE / 252) / avg_volatility
 
     return {
         "portfolioValue": round(total_value, 2),
@@ -0,0 +1,97 @@
+# exposure_engine.py
+import numpy as np
+import pandas as pd
+
+
+# -----------------------------
+# Helper: Date alignment
+# -----------------------------
+def align_returns(returns: pd.DataFrame, benchmark_returns: pd.Series):
+    """
+    Inner-join the holding return matrix and the benchmark on the date index.
+    Only dates where every holding and the benchmark traded are kept.
+    """
+    if isinstance(benchmark_returns, pd.DataFrame):
+        benchmark_returns = benchmark_returns.squeeze(axis=1)
+    if isinstance(returns, pd.Series):
+        returns = returns.to_frame()
+
+    joined = returns.join(benchmark_returns.rename("__benchmark__"), how="inner").dropna()
+    return joined.drop(columns="__benchmark__"), joined["__benchmark__"]
+
+
+# -----------------------------
+# Core: Single-factor exposures (one least-squares solve)
+# -----------------------------
+def compute_exposures(returns: pd.DataFrame, benchmark_returns: pd.Series, min_observations: int = 20):
+    """
+    Regress every holding on the benchmark at once: r_i = alpha_i + beta_i * r_m + e_i.
+
+    Returns a DataFrame indexed by symbol with columns
+    beta, alpha (daily), rSquared, residualVolatility (daily), observations.
+    """
+    columns = ["beta", "alpha", "rSquared", "residualVolatility", "observations"]
+    asset, bench = align_returns(returns, benchmark_returns)
+    n_obs = len(bench)
+
+    if n_obs < min_observations or asset.shape[1] == 0:
+        return pd.DataFrame(np.nan, index=list(returns.columns), columns=columns)
+
+    y = asset.to_numpy(dtype=float)                                   # T x N
+    x = np.column_stack([np.ones(n_obs), bench.to_numpy(dtype=float)])  # T x 2
+
+    coef, _, rank, _ = np.linalg.lstsq(x, y, rcond=None)              # 2 x N
+    residuals = y - x @ coef
+    ss_res = np.einsum("ij,ij->j", residuals, residuals)
+    centered = y - y.mean(axis=0)
+    ss_tot = np.einsum("ij,ij->j", centered, centered)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        r_squared = np.where(ss_tot > 0, 1 - ss_res / ss_tot, np.nan)
+    residual_vol = np.sqrt(ss_res / max(n_obs - 2, 1))
+
+    result = pd.DataFrame({
+        "beta": coef[1],
+        "alpha": coef[0],
+        "rSquared": r_squared,
+        "residualVolatility": residual_vol,
+        "observations": n_obs,
+    }, index=asset.columns)
+
+    if rank < 2:  # flat benchmark: betas are undefined
+        result[["beta", "rSquared"]] = np.nan
+    return result.reindex(returns.columns)
+
+
+# -----------------------------
+# Rolling betas via running sums
+# -----------------------------
+def rolling_betas(returns: pd.DataFrame, benchmark_returns: pd.Series, window: int = 60):
+    """
+    Rolling-window betas for all holdings.
+    Each window is updated incrementally from cumulative sums of x, y, x*y and x^2,
+    so the cost is O(T * N) regardless of the window length.
+    """
+    asset, bench = align_returns(returns, benchmark_returns)
+    if len(bench) < window:
+        return pd.DataFrame(columns=returns.columns)
+
+    y = asset.to_numpy(dtype=float)
+    x = bench.to_numpy(dtype=float)[:, None]
+
+    def window_sum(values):
+        csum = np.cumsum(values, axis=0)
+        csum = np.vstack([np.zeros((1, values.shape[1])), csum])
+        return csum[window:] - csum[:-window]
+
+    s_x = window_sum(x)
+    s_y = window_sum(y)
+    s_xy = window_sum(x * y)
+    s_xx = window_sum(x * x)
+
+    cov_xy = s_xy - s_x * s_y / window
+    var_x = s_xx - s_x ** 2 / window
+    with np.errstate(divide="ignore", invalid="ignore"):
+        betas = np.where(var_x > 0, cov_xy / var_x, np.nan)
+
+    return pd.DataFrame(betas, index=asset.index[window - 1:], columns=asset.columns)
@@ -0,0 +1,154 @@
+# fast_forecast.py
+import os
+import numpy as np
+from scipy.signal import lfilter
+
+FORECAST_MODES = ("auto", "fast", "arima")
+FORECAST_MODE = os.getenv("FORECAST_MODE", "auto")
+EWMA_HALFLIFE = 30        # trading days
+ESCALATION_AIC_MARGIN = 2.0  # ARIMA(5,1,0) must beat the best cheap model by this much AIC to be run
+AR_LAGS = 5               # ARIMA(5, 1, 0): AR(5) on differenced returns, no constant
+MIN_OBSERVATIONS = 20
+CHEAP_MODELS = ("drift", "ewmaMean", "ar1")
+MODEL_PARAMS = {"drift": 1, "ewmaMean": 1, "ar1": 2, "ar5": AR_LAGS}
+
+
+# -----------------------------
+# Helper: Returns panel
+# -----------------------------
+def returns_panel(returns_by_symbol: dict):
+    """
+    Right-align each symbol's returns (last bar in the last row) into one T x N matrix.
+    Returns (symbols, values with NaN padding, validity mask).
+    """
+    symbols = list(returns_by_symbol)
+    arrays = [np.asarray(returns_by_symbol[s], dtype=float) for s in symbols]
+    length = max((a.size for a in arrays), default=0)
+    values = np.full((length, len(symbols)), np.nan)
+    for j, a in enumerate(arrays):
+        if a.size:
+            values[length - a.size:, j] = a
+    return symbols, values, np.isfinite(values)
+
+
+def _aic(rss, n, k):
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return n * np.log(rss / n) + 2 * k
+
+
+# -----------------------------
+# Cheap estimators (all symbols at once)
+# -----------------------------
+def ewma_means(values, mask, halflife=EWMA_HALFLIFE):
+    """NaN-aware EWMA mean after every bar (column-wise): weighted sum / weight sum."""
+    lam = 0.5 ** (1 / halflife)
+    num = lfilter([1 - lam], [1, -lam], np.where(mask, values, 0.0), axis=0)
+    den = lfilter([1 - lam], [1, -lam], mask.astype(float), axis=0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return num / den
+
+
+def ar1_fit(values, mask):
+    """Closed-form OLS of r_t on r_{t-1} per column. Returns (intercept, phi)."""
+    x, y = values[:-1], values[1:]
+    m = mask[:-1] & mask[1:]
+    n = m.sum(axis=0)
+    x0, y0 = np.where(m, x, 0.0), np.where(m, y, 0.0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        x_mean, y_mean = x0.sum(axis=0) / n, y0.sum(axis=0) / n
+        sxx = (np.where(m, x - x_mean, 0.0) ** 2).sum(axis=0)
+        sxy = (np.where(m, (x - x_mean) * (y - y_mean), 0.0)).sum(axis=0)
+        phi = np.where(sxx > 0, sxy / sxx, 0.0)
+    phi = np.clip(phi, -0.99, 0.99)
+    return y_mean - phi * x_mean, phi
+
+
+def ar_lags_rss(values, mask, lags=AR_LAGS):
+    """
+    RSS of an AR(lags) OLS fit without constant per column on rows where all lags are observed,
+    solved for every symbol at once through batched normal equations.
+    Returns (rss, rows used, row mask).
+    """
+    t = values.shape[0]
+    y = values[lags:]
+    design = np.stack([values[lags - i:t - i] for i in range(1, lags + 1)], axis=2)
+    rows = mask[lags:] & np.all(np.stack([mask[lags - i:t - i] for i in range(1, lags + 1)]), axis=0)
+
+    w = rows.astype(float)
+    design0 = np.where(rows[:, :, None], design, 0.0)
+    y0 = np.where(rows, y, 0.0)
+    xtx = np.einsum("tn,tni,tnj->nij", w, design0, design0) + 1e-12 * np.eye(lags)
+    xty = np.einsum("tn,tni,tn->ni", w, design0, y0)
+    coef = np.linalg.solve(xtx, xty[:, :, None])[:, :, 0]
+    resid = y0 - np.einsum("tni,ni->tn", design0, coef)
+    return (w * resid ** 2).sum(axis=0), rows.sum(axis=0), rows
+
+
+# -----------------------------
+# Selection + forecast paths
+# -----------------------------
+def select_models(returns_by_symbol: dict, steps: int = 30, mode: str = None):
+    """
+    Mean-return forecasts for every symbol from one pass over the returns panel.
+
+    Cheap models: drift (historical mean), EWMA mean and AR(1). Their one-step-ahead
+    in-sample errors are scored by AIC on a common sample; in "auto" mode a symbol is
+    escalated to full ARIMA(5,1,0) only when the same model, fitted by OLS as an AR(5)
+    on differenced returns, beats the best cheap model by ESCALATION_AIC_MARGIN. Its
+    residuals on the differences are its one-step errors on the returns, so the AICs compare.
+
+    Returns {symbol: {"model": name, "path": array or None (None = run ARIMA)}}.
+    """
+    mode = mode or FORECAST_MODE
+    if mode not in FORECAST_MODES:
+        raise ValueError(f"Unknown forecast mode '{mode}'. Use one of {FORECAST_MODES}.")
+    if not returns_by_symbol:
+        return {}
+    if mode == "arima":
+        return {sym: {"model": "arima", "path": None} for sym in returns_by_symbol}
+
+    symbols, values, mask = returns_panel(returns_by_symbol)
+    counts = mask.sum(axis=0)
+    drift = np.where(mask, values, 0.0).sum(axis=0) / np.maximum(counts, 1)
+    ewma = ewma_means(values, mask)
+    intercept, phi = ar1_fit(values, mask)
+    last = values[-1]
+
+    # One-step-ahead errors on the common sample (rows usable by the ARIMA(5,1,0) check)
+    ar5_rss, n, rows = ar_lags_rss(np.diff(values, axis=0), mask[1:] & mask[:-1])
+    y = values[AR_LAGS + 1:]
+    prev = values[AR_LAGS:-1]
+    predictions = {
+        "drift": np.broadcast_to(drift, y.shape),
+        "ewmaMean": ewma[AR_LAGS:-1],
+        "ar1": intercept + phi * prev,
+    }
+    aic = {
+        name: _aic(np.where(rows, (y - pred) ** 2, 0.0).sum(axis=0), n, MODEL_PARAMS[name])
+        for name, pred in predictions.items()
+    }
+    aic_matrix = np.vstack([aic[name] for name in CHEAP_MODELS])
+    best = np.argmin(np.where(np.isfinite(aic_matrix), aic_matrix, np.inf), axis=0)
+    escalate = _aic(ar5_rss, n, MODEL_PARAMS["ar5"]) < aic_matrix[best, np.arange(len(symbols))] - ESCALATION_AIC_MARGIN
+
+    # Forecast paths, h = 1..steps
+    h = np.arange(1, steps + 1)[:, None]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        long_run = intercept / (1 - phi)
+    paths = {
+        "drift": np.broadcast_to(drift, (steps, len(symbols))),
+        "ewmaMean": np.broadcast_to(ewma[-1], (steps, len(symbols))),
+        "ar1": long_run + phi ** h * (last - long_run),
+    }
+
+    std = np.sqrt(np.where(mask, (values - drift) ** 2, 0.0).sum(axis=0) / np.maximum(counts - 1, 1))
+    result = {}
+    for j, sym in enumerate(symbols):
+        if counts[j] < MIN_OBSERVATIONS or std[j] < 1e-9:
+            result[sym] = {"model": None, "path": np.full(steps, np.nan)}
+        elif mode == "auto" and escalate[j]:
+            result[sym] = {"model": "arima", "path": None}
+        else:
+            name = CHEAP_MODELS[best[j]]
+            result[sym] = {"model": name, "path": np.array(paths[name][:, j])}
+    return result
@@ -0,0 +1,213 @@
+# forecast_backtest.py
+"""
+Walk-forward evaluation of the forecast models over stored history.
+
+    python forecast_backtest.py --symbols RELIANCE.NS TCS.NS --start 2021-01-01 --end 2025-12-31
+    python forecast_backtest.py --symbols-file utils/nse_symbols.csv --workers 8 --out backtest.json
+
+At every rebalance date each model sees only the trailing `window` returns and forecasts the
+next `horizon` days; forecasts are scored against what actually happened. Symbols are spread
+over a process pool.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+
+from data_fetcher import get_historical_data
+from forecasting_models import forecast_arima, forecast_garch, monte_carlo_simulation
+from fast_forecast import select_models
+
+BACKTEST_MODELS = ("arima", "fast", "garch", "ewmaVol", "monteCarlo")
+DEFAULT_WINDOW = 250
+DEFAULT_HORIZON = 10
+DEFAULT_STEP = 20
+INTERVAL_LEVEL = 0.90
+MC_SIMS = 500
+
+
+# ---------------------------
+# Models under test: returns window -> forecast fields
+# ---------------------------
+def _run_arima(window, horizon):
+    return {"mean": float(np.nanmean(forecast_arima(pd.Series(window), horizon)))}
+
+
+def _run_fast(window, horizon):
+    forecast = select_models({"_": window}, horizon, mode="fast")["_"]
+    return {"mean": float(np.nanmean(forecast["path"]))}
+
+
+def _run_garch(window, horizon):
+    return {"vol": float(np.nanmean(forecast_garch(pd.Series(window), horizon)))}
+
+
+def _run_ewma_vol(window, horizon, lam=0.94):
+    weights = lam ** np.arange(len(window) - 1, -1, -1)
+    return {"vol": float(np.sqrt(np.sum(weights * window ** 2) / np.sum(weights)))}
+
+
+def _run_monte_carlo(window, horizon):
+    paths = monte_carlo_simulation(1.0, float(window.mean()), float(window.std()), steps=horizon, sims=MC_SIMS)
+    tail = (1 - INTERVAL_LEVEL) / 2
+    lo, hi = np.quantile(paths[-1, :] - 1.0, [tail, 1 - tail])
+    return {"mean": float((paths[-1, :].mean() - 1.0) / horizon), "interval": (float(lo), float(hi))}
+
+
+MODEL_RUNNERS = {
+    "arima": _run_arima,
+    "fast": _run_fast,
+    "garch": _run_garch,
+    "ewmaVol": _run_ewma_vol,
+    "monteCarlo": _run_monte_carlo,
+}
+
+
+# ---------------------------
+# Walk-forward (one symbol per worker task)
+# ---------------------------
+def evaluate_symbol(symbol, returns, models=BACKTEST_MODELS, window=DEFAULT_WINDOW,
+                    horizon=DEFAULT_HORIZON, step=DEFAULT_STEP):
+    """
+    Walk forward over one symbol's daily returns. Returns one record per
+    (rebalance date, model) with the forecast, the realised outcome and the compute time.
+    """
+    returns = np.asarray(returns, dtype=float)
+    records = []
+    for end in range(window, len(returns) - horizon + 1, step):
+        past, future = returns[end - window:end], returns[end:end + horizon]
+        realized = {
+            "realizedMean": float(future.mean()),
+            "realizedCum": float(np.prod(1 + future) - 1),
+            "realizedVol": float(np.sqrt(np.mean(future ** 2))),
+        }
+        for model in models:
+            started = time.perf_counter()
+            try:
+                with warnings.catch_warnings():
+                    warnings.simplefilter("ignore")  # optimizer convergence chatter from statsmodels / arch
+                    forecast = MODEL_RUNNERS[model](past, horizon)
+            except Exception as e:
+                print(f"[Backtest Warning] {model} failed for {symbol} at bar {end}: {e}")
+                forecast = {}
+            records.append({"symbol": symbol, "bar": end, "model": model,
+                            "seconds": time.perf_counter() - started, **forecast, **realized})
+    return records
+
+
+def _evaluate_task(args):
+    return evaluate_symbol(*args)
+
+
+# ---------------------------
+# Scoring
+# ---------------------------
+def score_records(records: pd.DataFrame):
+    """Accuracy and cost per model."""
+    summary = {}
+    for model, group in records.groupby("model"):
+        metrics = {
+            "forecasts": int(len(group)),
+            "computeSeconds": round(float(group["seconds"].sum()), 4),
+            "msPerForecast": round(float(group["seconds"].mean() * 1000), 3),
+        }
+        if "mean" in group and group["mean"].notna().any():
+            g = group.dropna(subset=["mean"])
+            metrics["directionHitRate"] = round(float((np.sign(g["mean"]) == np.sign(g["realizedCum"])).mean()), 4)
+            metrics["meanAbsoluteError"] = round(float((g["mean"] - g["realizedMean"]).abs().mean()), 6)
+        if "vol" in group and group["vol"].notna().any():
+            g = group.dropna(subset=["vol"])
+            g = g[(g["vol"] > 0) & (g["realizedVol"] > 0)]
+            ratio = g["realizedVol"] ** 2 / g["vol"] ** 2
+            metrics["volatilityQLIKE"] = round(float((ratio - np.log(ratio) - 1).mean()), 6)
+            metrics["volatilityRMSE"] = round(float(np.sqrt(((g["vol"] - g["realizedVol"]) ** 2).mean())), 6)
+        if "interval" in group and group["interval"].notna().any():
+            g = group.dropna(subset=["interval"])
+            lo = g["interval"].str[0]
+            hi = g["interval"].str[1]
+            metrics["intervalCoverage"] = round(float(((g["realizedCum"] >= lo) & (g["realizedCum"] <= hi)).mean()), 4)
+            metrics["intervalNominal"] = INTERVAL_LEVEL
+        summary[model] = metrics
+    return summary
+
+
+# ---------------------------
+# Entry point
+# ---------------------------
+def run_backtest(symbols, start_date, end_date, models=BACKTEST_MODELS, window=DEFAULT_WINDOW,
+                 horizon=DEFAULT_HORIZON, step=DEFAULT_STEP, workers=None):
+    """
+    Load history for `symbols`, walk forward in a process pool and score every model.
+    Returns {"config": ..., "models": {model: metrics}}.
+    """
+    unknown = [m for m in models if m not in MODEL_RUNNERS]
+    if unknown:
+        raise ValueError(f"Unknown backtest models {unknown}. Use any of {BACKTEST_MODELS}.")
+
+    tasks = []
+    for sym in symbols:
+        hist = get_historical_data(sym, start_date, end_date)
+        if hist.empty:
+            continue
+        returns = hist["Close"].pct_change().dropna().to_numpy()
+        if len(returns) >= window + horizon:
+            tasks.append((sym, returns, tuple(models), window, horizon, step))
+        else:
+            print(f"[Backtest Warning] Not enough history for {sym} ({len(returns)} bars).")
+
+    started = time.perf_counter()
+    if workers == 1:
+        results = [_evaluate_task(t) for t in tasks]
+    else:
+        chunksize = max(1, len(tasks) // (4 * (workers or os.cpu_count() or 1)))
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(_evaluate_task, tasks, chunksize=chunksize))
+    wall = time.perf_counter() - started
+
+    records = pd.DataFrame([r for symbol_records in results for r in symbol_records])
+    return {
+        "config": {
+            "symbols": len(tasks), "start": start_date, "end": end_date, "window": window,
+            "horizon": horizon, "step": step, "workers": workers or os.cpu_count(),
+            "wallSeconds": round(wall, 3),
+        },
+        "models": score_records(records) if not records.empty else {},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Walk-forward backtest of the forecast models.")
+    parser.add_argument("--symbols", nargs="*", default=[])
+    parser.add_argument("--symbols-file", help="CSV with a SYMBOL column (e.g. utils/nse_symbols.csv); .NS is appended")
+    parser.add_argument("--start", default=str((pd.Timestamp.today() - pd.Timedelta(days=5 * 365)).date()))
+    parser.add_argument("--end", default=str(pd.Timestamp.today().date()))
+    parser.add_argument("--models", nargs="*", default=list(BACKTEST_MODELS))
+    parser.add_argument("--window", type=int, default=DEFAULT_WINDOW)
+    parser.add_argument("--horizon", type=int, default=DEFAULT_HORIZON)
+    parser.add_argument("--step", type=int, default=DEFAULT_STEP)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--out", help="Write the JSON summary here as well as to stdout")
+    args = parser.parse_args()
+
+    symbols = list(args.symbols)
+    if args.symbols_file:
+        symbols += [f"{s}.NS" for s in pd.read_csv(args.symbols_file)["SYMBOL"].dropna().unique()]
+    if not symbols:
+        parser.error("no symbols given")
+
+    summary = run_backtest(symbols, args.start, args.end, args.models, args.window,
+                           args.horizon, args.step, args.workers)
+    output = json.dumps(summary, indent=2)
+    print(output)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(output)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
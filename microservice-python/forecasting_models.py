@@ -4,6 +4,11 @@ import pandas as pd
 from statsmodels.tsa.arima.model import ARIMA
 from arch import arch_model
 
+import garch_engine
+import deadlines
+from fast_forecast import select_models
+from monte_carlo import simulate_paths, simulate_price_summary, symbol_seed
+
 
 def forecast_arima(series: pd.Series, steps: int = 30) -> pd.Series:
     """
@@ -50,7 +55,8 @@ def forecast_garch(series: pd.Series, steps: int = 30) -> np.ndarray:
         return np.full(steps, np.nan)
 
 
-def monte_carlo_simulation(current_price: float, mu: float, sigma: float, steps: int = 30, sims: int = 1000) -> np.ndarray:
+def monte_carlo_simulation(current_price: float, mu: float, sigma: float, steps: int = 30, sims: int = 1000,
+                           seed=None) -> np.ndarray:
     """
     Monte Carlo simulation for future price paths using geometric Brownian motion.
     Returns a 2D array: shape (steps x sims).
@@ -59,38 +65,49 @@ def monte_carlo_simulation(current_price: float, mu: float, sigma: float, steps:
     current_price = float(np.squeeze(current_price))
     mu = float(np.squeeze(mu))
     sigma = float(np.squeeze(sigma))
+    return simulate_paths(current_price, mu, sigma, steps=steps, sims=sims, seed=seed)
 
-    dt = 1 / 252
-    paths = np.zeros((steps, sims))
-
-    for s in range(sims):
-        prices = [current_price]
-        for _ in range(steps):
-            shock = float(np.random.normal(loc=mu * dt, scale=sigma * np.sqrt(dt)))
-            next_price = max(float(prices[-1]) * (1 + shock), 0.0)
-            prices.append(next_price)
-        paths[:, s] = prices[1:]
 
-    return paths
+def dated_returns(df: pd.DataFrame) -> pd.Series:
+    """Daily close-to-close returns indexed by date (positional index if there is no Date column)."""
+    close = df.set_index("Date")["Close"] if "Date" in df.columns else df["Close"]
+    if isinstance(close, pd.DataFrame):
+        close = close.squeeze(axis=1)
+    return close.pct_change().dropna()
 
 
-def summarize_forecast(symbol: str, df: pd.DataFrame, steps: int = 30, sims: int = 500) -> dict:
+def summarize_forecast(symbol: str, df: pd.DataFrame, steps: int = 30, sims: int = 500, garch_vol=None,
+                       mean_forecast=None, seed=None) -> dict:
     """
-    Compact summary of ARIMA, GARCH, and Monte Carlo simulations for one stock.
+    Compact summary of return (fast model or ARIMA), GARCH, and Monte Carlo simulations for one stock.
+    garch_vol: precomputed volatility path (see garch_engine) to skip the GARCH step.
+    mean_forecast: precomputed {"model", "path"} from fast_forecast.select_models.
+    seed: request seed; the simulation is reproducible for a given seed and last bar.
     """
     returns = df["Close"].pct_change().dropna()
     if returns.empty:
         return {"symbol": symbol, "error": "No valid returns"}
 
-    # Run forecasts
-    arima_fc = forecast_arima(returns, steps)
-    garch_vol = forecast_garch(returns, steps)
-    mc_paths = monte_carlo_simulation(
+    # Run forecasts: cheap mean models first, ARIMA only when selected
+    if mean_forecast is None:
+        mean_forecast = select_models({symbol: returns.to_numpy()}, steps)[symbol]
+    if mean_forecast["path"] is None:
+        arima_fc = forecast_arima(returns, steps)
+    else:
+        arima_fc = pd.Series(mean_forecast["path"])
+    if garch_vol is None:
+        if "Date" in df.columns:
+            garch_vol = garch_engine.forecast_volatility(symbol, dated_returns(df), steps)
+        else:
+            garch_vol = forecast_garch(returns, steps)
+    last_bar = df["Date"].iloc[-1] if "Date" in df.columns else len(df)
+    simulation = simulate_price_summary(
         current_price=float(df["Close"].iloc[-1]),
         mu=float(returns.mean(skipna=True)),
         sigma=float(returns.std(skipna=True)),
         steps=steps,
-        sims=sims
+        sims=sims,
+        seed=symbol_seed(symbol, seed, salt=str(last_bar))
     )
 
     # --- Summaries ---
@@ -102,10 +119,9 @@ def summarize_forecast(symbol: str, df: pd.DataFrame, steps: int = 30, sims: int
         "decreasing" if garch_vol[-1] < garch_vol[0] else "stable"
     ) if np.all(np.isfinite(garch_vol)) else "unknown"
 
-    final_prices = mc_paths[-1, :]
-    price_mean = float(np.nanmean(final_prices))
-    price_min = float(np.nanmin(final_prices))
-    price_max = float(np.nanmax(final_prices))
+    price_mean = simulation["expected"]
+    price_min = simulation["min"]
+    price_max = simulation["max"]
     current_price = float(df["Close"].iloc[-1])
     pct_change_range = [round((price_min - current_price) / current_price * 100, 2),
                         round((price_max - current_price) / current_price * 100, 2)]
@@ -115,6 +131,7 @@ def summarize_forecast(symbol: str, df: pd.DataFrame, steps: int = 30, sims: int
         "currentPrice": round(current_price, 2),
         "forecast": {
             "expectedReturn": round(arima_mean, 6),
+            "model": mean_forecast["model"],
             "trendDirection": "up" if arima_mean > 0 else "down" if arima_mean < 0 else "flat",
             "volatility": {
                 "average": round(garch_mean, 6),
@@ -124,18 +141,27 @@ def summarize_forecast(symbol: str, df: pd.DataFrame, steps: int = 30, sims: int
                 "expected": round(price_mean, 2),
                 "min": round(price_min, 2),
                 "max": round(price_max, 2),
-                "pctChangeRange": pct_change_range
+                "pctChangeRange": pct_change_range,
+                "p05": round(simulation["p05"], 2),
+                "p95": round(simulation["p95"], 2),
+                "probabilityOfGain": round(simulation["probabilityOfGain"], 4),
+                "standardError": {k: round(v, 4) for k, v in simulation["standardError"].items()},
+                "paths": simulation["paths"]
             }
         }
     }
 
 
-def generate_forecasts(holdings: list, historical_data: dict, steps: int = 30, sims: int = 1000) -> dict:
+def generate_forecasts(holdings: list, historical_data: dict, steps: int = 30, sims: int = 1000, seed=None) -> dict:
     """
     Compact, API-friendly version — only summary metrics for each holding.
+    Under a request deadline (see deadlines), Monte Carlo paths are cut and ARIMA
+    escalations fall back to the best cheap model once the budget runs short.
     """
+    sims = deadlines.simulation_count(sims, "forecasts")
     forecasts = {}
 
+    valid = {}
     for h in holdings:
         symbol = h.get("symbol")
         if not symbol or symbol not in historical_data:
@@ -146,8 +172,24 @@ def generate_forecasts(holdings: list, historical_data: dict, steps: int = 30, s
         if "Close" not in df.columns or df["Close"].dropna().empty:
             print(f"[Data Warning] Invalid price data for {symbol}.")
             continue
+        valid[symbol] = df
 
-        forecasts[symbol] = summarize_forecast(symbol, df, steps, sims)
+    # Volatility per holding from the stored GARCH parameters (no refits at request time)
+    garch_vols = garch_engine.forecast_volatilities(
+        {sym: dated_returns(df) for sym, df in valid.items() if "Date" in df.columns}, steps
+    )
+    # Mean-return model selection for all holdings in one NumPy pass
+    mean_forecasts = select_models(
+        {sym: df["Close"].pct_change().dropna().to_numpy() for sym, df in valid.items()}, steps
+    )
+    for symbol, df in valid.items():
+        mean_forecast = mean_forecasts.get(symbol)
+        if mean_forecast and mean_forecast["path"] is None and not deadlines.has_budget(deadlines.ARIMA_MIN_SECONDS):
+            mean_forecast = select_models({symbol: df["Close"].pct_change().dropna().to_numpy()}, steps,
+                                          mode="fast")[symbol]
+            deadlines.degrade("forecasts", "arimaSkipped", [symbol])
+        forecasts[symbol] = summarize_forecast(symbol, df, steps, sims, garch_vol=garch_vols.get(symbol),
+                                               mean_forecast=mean_forecast, seed=seed)
 
     return forecasts
 
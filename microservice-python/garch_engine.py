@@ -0,0 +1,239 @@
+# garch_engine.py
+import os
+import json
+import threading
+from datetime import datetime, timedelta
+import numpy as np
+import pandas as pd
+from scipy.signal import lfilter
+from arch import arch_model
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+GARCH_STATE_PATH = os.getenv("GARCH_STATE_PATH", os.path.join(BASE_DIR, "analytics_store", "garch_params.json"))
+GARCH_REFIT_DAYS = float(os.getenv("GARCH_REFIT_DAYS", 7))         # full refit at least this often
+GARCH_DRIFT_TOLERANCE = float(os.getenv("GARCH_DRIFT_TOLERANCE", 0.5))  # |mean(z^2) - 1| that triggers a refit
+GARCH_DRIFT_MIN_BARS = 10
+MIN_OBSERVATIONS = 20
+SCALE = 100.0  # arch works on percent returns
+
+_lock = threading.Lock()
+_save_lock = threading.Lock()  # serialises writers so the newest state is the one left on disk
+_state = {}      # symbol -> fitted parameters + recursion state (percent units)
+_loaded = False
+_stats = {"fits": 0, "warmFits": 0, "recursions": 0}
+
+
+# ---------------------------
+# Parameter store
+# ---------------------------
+def _ensure_loaded():
+    global _loaded
+    if _loaded:
+        return
+    with _lock:
+        if _loaded:
+            return
+        if os.path.exists(GARCH_STATE_PATH):
+            try:
+                with open(GARCH_STATE_PATH, "r", encoding="utf-8") as f:
+                    _state.update(json.load(f))
+            except Exception as e:
+                print(f"[GARCH Warning] Could not load stored parameters: {e}")
+        _loaded = True
+
+
+def _save_state():
+    with _save_lock:
+        with _lock:
+            payload = json.dumps(_state).encode("utf-8")
+        try:
+            os.makedirs(os.path.dirname(GARCH_STATE_PATH), exist_ok=True)
+            tmp = f"{GARCH_STATE_PATH}.tmp"
+            with open(tmp, "wb") as f:
+                f.write(payload)
+            os.replace(tmp, GARCH_STATE_PATH)
+        except Exception as e:
+            print(f"[GARCH Warning] Could not persist parameters: {e}")
+
+
+def get_params(symbol):
+    _ensure_loaded()
+    with _lock:
+        state = _state.get(symbol)
+        return dict(state) if state else None
+
+
+def stats():
+    with _lock:
+        return {**_stats, "symbols": len(_state)}
+
+
+# ---------------------------
+# Variance recursion
+# ---------------------------
+def filter_variance(resid, omega, alpha, beta, initial_variance):
+    """
+    GARCH(1,1) recursion s_{t+1} = omega + alpha e_t^2 + beta s_t over the residuals,
+    as one linear filter. Returns (variance of each bar, variance forecast for the next bar).
+    """
+    resid = np.asarray(resid, dtype=float)
+    if resid.size == 0:
+        return np.empty(0), float(initial_variance)
+    nxt = lfilter([1.0], [1.0, -beta], omega + alpha * resid ** 2, zi=[beta * initial_variance])[0]
+    per_bar = np.concatenate([[initial_variance], nxt[:-1]])
+    return per_bar, float(nxt[-1])
+
+
+def variance_path(next_variance, omega, alpha, beta, steps):
+    """h-step variance forecasts: s_{t+h} = s_bar + (alpha + beta)^(h-1) (s_{t+1} - s_bar)."""
+    persistence = alpha + beta
+    if persistence >= 1:
+        return np.full(steps, next_variance)
+    long_run = omega / (1 - persistence)
+    return long_run + persistence ** np.arange(steps) * (next_variance - long_run)
+
+
+# ---------------------------
+# Fitting
+# ---------------------------
+def fit_symbol(symbol, returns: pd.Series):
+    """
+    Full GARCH(1,1) fit, warm-started from the symbol's stored parameters when present.
+    Stores and returns the new state.
+    """
+    previous = get_params(symbol)
+    scaled = returns.to_numpy(dtype=float) * SCALE
+    model = arch_model(scaled, vol="Garch", p=1, q=1, rescale=False)
+    starting = None
+    if previous:
+        starting = np.array([previous["mu"], previous["omega"], previous["alpha"], previous["beta"]])
+    fit = model.fit(disp="off", starting_values=starting)
+
+    mu, omega, alpha, beta = (float(fit.params[k]) for k in ("mu", "omega", "alpha[1]", "beta[1]"))
+    _, next_variance = filter_variance(scaled - mu, omega, alpha, beta, float(np.var(scaled)))
+
+    state = {
+        "mu": mu, "omega": omega, "alpha": alpha, "beta": beta,
+        "nextVariance": next_variance,
+        "lastDate": returns.index[-1].isoformat(),
+        "fittedAt": datetime.now().isoformat(),
+        "driftSum": 0.0,
+        "driftCount": 0,
+    }
+    with _lock:
+        _state[symbol] = state
+        _stats["fits"] += 1
+        _stats["warmFits"] += int(starting is not None)
+    _save_state()
+    return state
+
+
+def _needs_refit(state, now):
+    if state is None:
+        return True
+    if now - datetime.fromisoformat(state["fittedAt"]) > timedelta(days=GARCH_REFIT_DAYS):
+        return True
+    if state["alpha"] + state["beta"] >= 1:
+        return True
+    if state["driftCount"] >= GARCH_DRIFT_MIN_BARS:
+        return abs(state["driftSum"] / state["driftCount"] - 1) > GARCH_DRIFT_TOLERANCE
+    return False
+
+
+def _advance(symbol, returns: pd.Series):
+    """
+    Roll the stored conditional variance forward over bars after the stored lastDate
+    with the fitted parameters (no optimisation) and persist it. Standardised residuals
+    of those bars accumulate into the drift statistic. The stored state is read and
+    updated under the lock, so concurrent requests never count the same bar twice.
+    Returns (state, next-bar variance).
+    """
+    with _lock:
+        state = _state[symbol]
+        last_date = pd.Timestamp(state["lastDate"])
+        if returns.index[-1] < last_date:
+            # Window ends before the stored state (e.g. replayed history): filter the whole window
+            scaled = returns.to_numpy(dtype=float) * SCALE
+            _, next_variance = filter_variance(scaled - state["mu"], state["omega"], state["alpha"],
+                                               state["beta"], float(np.var(scaled)))
+            return dict(state), next_variance
+        new = returns[returns.index > last_date]
+        if new.empty:
+            return dict(state), state["nextVariance"]
+
+        resid = new.to_numpy(dtype=float) * SCALE - state["mu"]
+        per_bar, next_variance = filter_variance(resid, state["omega"], state["alpha"], state["beta"],
+                                                 state["nextVariance"])
+        z2 = resid ** 2 / np.clip(per_bar, 1e-12, None)
+        state["nextVariance"] = next_variance
+        state["lastDate"] = new.index[-1].isoformat()
+        state["driftSum"] += float(z2.sum())
+        state["driftCount"] += int(z2.size)
+        _stats["recursions"] += 1
+        state = dict(state)
+    _save_state()
+    return state, next_variance
+
+
+# ---------------------------
+# Entry points
+# ---------------------------
+def forecast_volatility(symbol, returns: pd.Series, steps: int = 30) -> np.ndarray:
+    """
+    Daily volatility forecasts for the next `steps` bars.
+    returns: daily returns indexed by date.
+    Uses the stored parameters and the variance recursion. Only a symbol seen for the first
+    time is fitted here; stale or drifted parameters are refitted after close (refit_due).
+    """
+    returns = returns.dropna()
+    if len(returns) < MIN_OBSERVATIONS:
+        print(f"[GARCH Warning] Insufficient data for {symbol} — returning NaNs.")
+        return np.full(steps, np.nan)
+
+    try:
+        if get_params(symbol) is None:
+            if float(returns.std()) < 1e-9:
+                print(f"[GARCH Warning] Constant data for {symbol} — returning NaNs.")
+                return np.full(steps, np.nan)
+            state = fit_symbol(symbol, returns)
+            next_variance = state["nextVariance"]
+        else:
+            state, next_variance = _advance(symbol, returns)
+        path = variance_path(next_variance, state["omega"], state["alpha"], state["beta"], steps)
+        return np.sqrt(path) / SCALE
+    except Exception as e:
+        print(f"[GARCH Error] {symbol}: {e}")
+        return np.full(steps, np.nan)
+
+
+def forecast_volatilities(returns_by_symbol: dict, steps: int = 30) -> dict:
+    """forecast_volatility for each symbol: {symbol: daily returns} -> {symbol: volatility path}."""
+    _ensure_loaded()
+    return {sym: forecast_volatility(sym, rets, steps) for sym, rets in returns_by_symbol.items()}
+
+
+# ---------------------------
+# After-close refits
+# ---------------------------
+def due_for_refit(now=None):
+    """Stored symbols whose parameters are older than GARCH_REFIT_DAYS, non-stationary or drifted."""
+    _ensure_loaded()
+    now = now or datetime.now()
+    with _lock:
+        return [sym for sym, state in _state.items() if _needs_refit(state, now)]
+
+
+def refit_if_due(symbol, returns: pd.Series):
+    """Warm-started refit of a stored symbol when it is due. Returns True when it was refitted."""
+    returns = returns.dropna()
+    state = get_params(symbol)
+    if state is None or not _needs_refit(state, datetime.now()):
+        return False
+    if len(returns) < MIN_OBSERVATIONS or float(returns.std()) < 1e-9:
+        return False
+    try:
+        fit_symbol(symbol, returns)
+        return True
+    except Exception as e:
+        print(f"[GARCH Error] Refit failed for {symbol}: {e}")
+        return False
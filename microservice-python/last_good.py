@@ -0,0 +1,114 @@
+# last_good.py
+"""
+Last-known-good market data, served when the upstream fails or its circuit is open.
+
+Every successful history fetch is kept as one pickle per symbol (rewritten only when it
+ends on a newer bar), every successful quote in memory. Fallbacks are flagged stale:
+history frames carry attrs {"stale": True, "asOf": last bar date}, quotes "stale": True
+(their "timestamp" stays the time of the original fetch, or the last bar's date).
+The shared price panel (see price_panel) is the second source for closes, whatever its age.
+"""
+import os
+import pickle
+import threading
+import pandas as pd
+
+from price_panel import attach as attach_price_panel
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+LAST_GOOD_DIR = os.getenv("MARKET_DATA_LAST_GOOD_DIR", os.path.join(BASE_DIR, "analytics_store", "last_good"))
+
+_lock = threading.Lock()
+_saved = {}   # symbol -> (last bar, rows) of the stored copy
+_quotes = {}  # symbol -> formatted quote
+
+
+def _path(symbol):
+    return os.path.join(LAST_GOOD_DIR, f"{symbol}.pkl")
+
+
+def _mark_stale(df):
+    df.attrs["stale"] = True
+    df.attrs["asOf"] = str(pd.Timestamp(df["Date"].iloc[-1]).date())
+    return df
+
+
+# ---------------------------
+# History
+# ---------------------------
+def save_history(symbol, df):
+    """Keep `df` (Date + OHLCV columns) unless the stored copy already ends on the same bar with more rows."""
+    if df.empty or "Date" not in df.columns:
+        return
+    marker = (str(df["Date"].iloc[-1]), len(df))
+    with _lock:
+        saved = _saved.get(symbol)
+        if saved and (saved[0] > marker[0] or (saved[0] == marker[0] and saved[1] >= marker[1])):
+            return
+        _saved[symbol] = marker
+    try:
+        os.makedirs(LAST_GOOD_DIR, exist_ok=True)
+        tmp = f"{_path(symbol)}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as f:
+            pickle.dump(df, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, _path(symbol))
+    except Exception as e:
+        print(f"[Cache Warning] Could not store last-known-good history for {symbol}: {e}")
+
+
+def _stored_history(symbol):
+    try:
+        with open(_path(symbol), "rb") as f:
+            return pickle.load(f)
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        print(f"[Cache Warning] Could not read last-known-good history for {symbol}: {e}")
+        return None
+
+
+def history(symbol, start_date, end_date):
+    """The stored window for `symbol` within [start_date, end_date), flagged stale; empty if none is kept."""
+    df = _stored_history(symbol)
+    if df is not None:
+        df = df[(df["Date"] >= pd.Timestamp(start_date)) & (df["Date"] < pd.Timestamp(end_date))]
+        if not df.empty:
+            return _mark_stale(df.reset_index(drop=True))
+
+    panel = attach_price_panel()
+    if panel is not None and symbol in panel:
+        close = panel.series(symbol, start_date, end_date)
+        if not close.empty:
+            return _mark_stale(pd.DataFrame({"Date": close.index, "Close": close.to_numpy()}))
+    return pd.DataFrame()
+
+
+# ---------------------------
+# Quotes
+# ---------------------------
+def save_quote(symbol, quote):
+    with _lock:
+        _quotes[symbol] = dict(quote)
+
+
+def quote(symbol):
+    """
+    The last good quote for `symbol` (provider quote() shape plus "timestamp"), else one
+    derived from the last stored bars; None when neither exists.
+    """
+    with _lock:
+        if symbol in _quotes:
+            return dict(_quotes[symbol])
+    df = _stored_history(symbol)
+    if df is None or df.empty:
+        return None
+    last = df.iloc[-1]
+    return {
+        "lastPrice": float(last["Close"]),
+        "previousClose": float(df["Close"].iloc[-2]) if len(df) > 1 else None,
+        "open": float(last.get("Open", last["Close"])),
+        "high": float(last.get("High", last["Close"])),
+        "low": float(last.get("Low", last["Close"])),
+        "volume": float(last.get("Volume", 0) or 0),
+        "timestamp": pd.Timestamp(last["Date"]).isoformat(),
+    }
@@ -0,0 +1,376 @@
+# market_data.py
+import os
+import json
+import time
+import random
+import threading
+from abc import ABC, abstractmethod
+import pandas as pd
+import yfinance as yf
+from dotenv import load_dotenv
+
+load_dotenv()
+
+OHLCV_COLUMNS = ["Open", "High", "Low", "Close", "Volume"]
+
+# yfinance-style period strings -> lookback offsets (used by the replay provider)
+PERIOD_OFFSETS = {
+    "1d": pd.DateOffset(days=1),
+    "5d": pd.DateOffset(days=5),
+    "1mo": pd.DateOffset(months=1),
+    "3mo": pd.DateOffset(months=3),
+    "6mo": pd.DateOffset(months=6),
+    "1y": pd.DateOffset(years=1),
+    "2y": pd.DateOffset(years=2),
+    "5y": pd.DateOffset(years=5),
+    "10y": pd.DateOffset(years=10),
+}
+
+
+class MarketDataError(Exception):
+    """Raised by providers when market data cannot be served."""
+
+
+# ---------------------------
+# Provider Interface
+# ---------------------------
+class MarketDataProvider(ABC):
+    """
+    Single entry point for all market data used by the service.
+
+    history()      -> DataFrame indexed by Date with flat OHLCV columns
+    quote()        -> dict with lastPrice, previousClose, open, high, low, volume
+    bulk_history() -> yf.download(group_by="ticker") shaped frame: (ticker, field) columns
+    fundamentals() -> raw info dict (Yahoo 'info' keys)
+
+    Providers must implement all four; a missing one fails at instantiation.
+    """
+
+    name = "base"
+
+    @abstractmethod
+    def history(self, symbol: str, start_date: str, end_date: str) -> pd.DataFrame:
+        raise NotImplementedError
+
+    @abstractmethod
+    def quote(self, symbol: str) -> dict:
+        raise NotImplementedError
+
+    @abstractmethod
+    def bulk_history(self, symbols: list, period: str = "6mo", interval: str = "1d") -> pd.DataFrame:
+        raise NotImplementedError
+
+    @abstractmethod
+    def fundamentals(self, symbol: str) -> dict:
+        raise NotImplementedError
+
+
+def _flatten_columns(df: pd.DataFrame) -> pd.DataFrame:
+    """Single-ticker yf.download returns (field, ticker) columns — keep only the field level."""
+    if isinstance(df.columns, pd.MultiIndex):
+        df = df.copy()
+        df.columns = df.columns.get_level_values(0)
+    return df
+
+
+# ---------------------------
+# Live Provider: Yahoo Finance
+# ---------------------------
+class YFinanceProvider(MarketDataProvider):
+    """Wraps the yfinance calls the service previously made inline."""
+
+    name = "yfinance"
+
+    # yf.download swallows per-ticker errors; these mean "no data", anything else an upstream fault
+    NO_DATA_ERRORS = ("YFPricesMissingError", "YFTzMissingError", "YFTickerMissingError", "delisted")
+
+    def history(self, symbol, start_date, end_date):
+        df = yf.download(symbol, start=start_date, end=end_date, auto_adjust=True, progress=False)
+        if df is None or df.empty:
+            error = getattr(yf.shared, "_ERRORS", {}).get(symbol)
+            if error and not any(marker in str(error) for marker in self.NO_DATA_ERRORS):
+                raise MarketDataError(f"Yahoo download failed for {symbol}: {error}")
+            return pd.DataFrame(columns=OHLCV_COLUMNS)
+        df = _flatten_columns(df)
+        df.index.name = "Date"
+        return df
+
+    def quote(self, symbol):
+        ticker = yf.Ticker(symbol)
+        data = ticker.history(period="1d", auto_adjust=True)
+        if data.empty:
+            return None
+
+        fast_info = ticker.fast_info  # faster and more stable than .info
+        return {
+            "lastPrice": fast_info.get("last_price") or data["Close"].iloc[-1],
+            "previousClose": fast_info.get("previous_close"),
+            "open": fast_info.get("open", data["Open"].iloc[-1]),
+            "high": fast_info.get("day_high", data["High"].iloc[-1]),
+            "low": fast_info.get("day_low", data["Low"].iloc[-1]),
+            "volume": fast_info.get("last_volume", data["Volume"].iloc[-1]),
+        }
+
+    def bulk_history(self, symbols, period="6mo", interval="1d"):
+        return yf.download(list(symbols), period=period, interval=interval, group_by="ticker",
+                           auto_adjust=True, progress=False)
+
+    def fundamentals(self, symbol):
+        return yf.Ticker(symbol).info or {}
+
+
+# ---------------------------
+# Offline Provider: Local Snapshot Replay
+# ---------------------------
+class ReplayProvider(MarketDataProvider):
+    """
+    Serves market data from local snapshots so the service can be load-tested offline.
+
+    Layout of `data_dir`:
+        <SYMBOL>.parquet or <SYMBOL>.csv   Date + OHLCV columns (e.g. RELIANCE.NS.csv, ^NSEI.csv)
+        fundamentals.json                  optional {symbol: info dict}
+
+    `latency_ms` (+ uniform `jitter_ms`) is slept before every call and `error_rate`
+    is the probability that a call raises MarketDataError, to mimic a real upstream.
+    `as_of` pins "today" so replays are reproducible.
+    """
+
+    name = "replay"
+
+    def __init__(self, data_dir, latency_ms=0.0, jitter_ms=0.0, error_rate=0.0, as_of=None, seed=None):
+        self.data_dir = data_dir
+        self.latency_ms = float(latency_ms)
+        self.jitter_ms = float(jitter_ms)
+        self.error_rate = float(error_rate)
+        self.as_of = pd.Timestamp(as_of) if as_of else None
+        self._rng = random.Random(seed)
+        self._frames = {}
+        self._fundamentals = None
+        self._lock = threading.Lock()
+
+    # --- upstream simulation ---
+    def _simulate_upstream(self, what):
+        delay = self.latency_ms
+        if self.jitter_ms:
+            delay += self._rng.uniform(0, self.jitter_ms)
+        if delay > 0:
+            time.sleep(delay / 1000)
+        if self.error_rate and self._rng.random() < self.error_rate:
+            raise MarketDataError(f"Injected replay failure for {what}")
+
+    # --- snapshot loading (each file is parsed once, then served from memory) ---
+    def _load(self, symbol):
+        with self._lock:
+            if symbol in self._frames:
+                return self._frames[symbol]
+
+        df = None
+        for ext in ("parquet", "csv"):
+            path = os.path.join(self.data_dir, f"{symbol}.{ext}")
+            if not os.path.exists(path):
+                continue
+            df = pd.read_parquet(path) if ext == "parquet" else pd.read_csv(path)
+            break
+
+        if df is not None and not df.empty:
+            if "Date" in df.columns:
+                df = df.set_index("Date")
+            df.index = pd.to_datetime(df.index)
+            df.index.name = "Date"
+            df = df.sort_index()[[c for c in OHLCV_COLUMNS if c in df.columns]]
+            if self.as_of is not None:
+                df = df.loc[:self.as_of]
+        else:
+            df = pd.DataFrame(columns=OHLCV_COLUMNS, index=pd.DatetimeIndex([], name="Date"))
+
+        with self._lock:
+            self._frames[symbol] = df
+        return df
+
+    def history(self, symbol, start_date, end_date):
+        self._simulate_upstream(symbol)
+        df = self._load(symbol)
+        # yf.download treats `end` as exclusive
+        mask = (df.index >= pd.Timestamp(start_date)) & (df.index < pd.Timestamp(end_date))
+        return df.loc[mask].copy()
+
+    def quote(self, symbol):
+        self._simulate_upstream(symbol)
+        df = self._load(symbol)
+        if df.empty:
+            return None
+
+        last = df.iloc[-1]
+        return {
+            "lastPrice": float(last["Close"]),
+            "previousClose": float(df["Close"].iloc[-2]) if len(df) > 1 else None,
+            "open": float(last.get("Open", last["Close"])),
+            "high": float(last.get("High", last["Close"])),
+            "low": float(last.get("Low", last["Close"])),
+            "volume": float(last.get("Volume", 0) or 0),
+        }
+
+    def bulk_history(self, symbols, period="6mo", interval="1d"):
+        self._simulate_upstream(f"{len(symbols)} symbols")
+        frames = {}
+        for sym in symbols:
+            df = self._load(sym)
+            if df.empty:
+                continue
+            if period in PERIOD_OFFSETS:
+                df = df.loc[df.index > df.index[-1] - PERIOD_OFFSETS[period]]
+            frames[sym] = df
+        if not frames:
+            return pd.DataFrame()
+        return pd.concat(frames, axis=1).sort_index()
+
+    def fundamentals(self, symbol):
+        self._simulate_upstream(symbol)
+        with self._lock:
+            if self._fundamentals is None:
+                path = os.path.join(self.data_dir, "fundamentals.json")
+                if os.path.exists(path):
+                    with open(path, "r", encoding="utf-8") as f:
+                        self._fundamentals = json.load(f)
+                else:
+                    self._fundamentals = {}
+        return dict(self._fundamentals.get(symbol, {}))
+
+
+# ---------------------------
+# Fault Injection: local stub for resilience drills
+# ---------------------------
+class FaultInjectingProvider(MarketDataProvider):
+    """
+    Wraps another provider (usually ReplayProvider) and injects upstream faults on demand:
+
+    error_rate     probability that a call raises MarketDataError
+    fail_symbols   symbols whose calls always fail
+    latency_ms     slept before every call
+    throttle()     every call fails like a Yahoo rate limit until restore()
+
+    `calls` / `failures` count what reached the stub, so a drill can check how much
+    traffic the circuit breaker let through (see market_data_drill.py).
+    """
+
+    name = "faulty"
+
+    def __init__(self, inner, error_rate=0.0, fail_symbols=(), latency_ms=0.0, seed=None):
+        self.inner = inner
+        self.error_rate = float(error_rate)
+        self.fail_symbols = set(fail_symbols)
+        self.latency_ms = float(latency_ms)
+        self.calls = 0
+        self.failures = 0
+        self._throttled = False
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def throttle(self):
+        self._throttled = True
+
+    def restore(self):
+        self._throttled = False
+
+    def _inject(self, what, symbols=()):
+        with self._lock:
+            self.calls += 1
+            fail = (self._throttled or bool(self.fail_symbols.intersection(symbols))
+                    or (self.error_rate and self._rng.random() < self.error_rate))
+            if fail:
+                self.failures += 1
+        if self.latency_ms:
+            time.sleep(self.latency_ms / 1000)
+        if fail:
+            raise MarketDataError(f"Injected fault for {what}: Too Many Requests")
+
+    def history(self, symbol, start_date, end_date):
+        self._inject(symbol, [symbol])
+        return self.inner.history(symbol, start_date, end_date)
+
+    def quote(self, symbol):
+        self._inject(symbol, [symbol])
+        return self.inner.quote(symbol)
+
+    def bulk_history(self, symbols, period="6mo", interval="1d"):
+        self._inject(f"{len(symbols)} symbols", symbols)
+        return self.inner.bulk_history(symbols, period=period, interval=interval)
+
+    def fundamentals(self, symbol):
+        self._inject(symbol, [symbol])
+        return self.inner.fundamentals(symbol)
+
+
+# ---------------------------
+# Snapshot Recording
+# ---------------------------
+def record_snapshots(symbols, start_date, end_date, data_dir, provider=None, fmt="csv"):
+    """
+    Download history for `symbols` and write replay snapshots into `data_dir`.
+    Returns the list of symbols that were written.
+    """
+    provider = provider or YFinanceProvider()
+    os.makedirs(data_dir, exist_ok=True)
+
+    written = []
+    for sym in symbols:
+        try:
+            df = provider.history(sym, start_date, end_date)
+        except Exception as e:
+            print(f"[Error] Recording snapshot for {sym}: {e}")
+            continue
+        if df.empty:
+            print(f"[Warning] No data to record for {sym}")
+            continue
+
+        path = os.path.join(data_dir, f"{sym}.{fmt}")
+        if fmt == "parquet":
+            df.to_parquet(path)
+        else:
+            df.to_csv(path)
+        written.append(sym)
+    return written
+
+
+# ---------------------------
+# Provider Registry
+# ---------------------------
+_provider = None
+_provider_lock = threading.Lock()
+
+
+def _provider_from_env():
+    kind = os.getenv("MARKET_DATA_PROVIDER", "yfinance").lower()
+    if kind == "replay":
+        provider = ReplayProvider(
+            data_dir=os.getenv("MARKET_DATA_REPLAY_DIR", "replay_data"),
+            latency_ms=float(os.getenv("MARKET_DATA_REPLAY_LATENCY_MS", 0)),
+            jitter_ms=float(os.getenv("MARKET_DATA_REPLAY_JITTER_MS", 0)),
+            error_rate=float(os.getenv("MARKET_DATA_REPLAY_ERROR_RATE", 0)),
+            as_of=os.getenv("MARKET_DATA_REPLAY_AS_OF") or None,
+        )
+    else:
+        provider = YFinanceProvider()
+
+    fault_rate = float(os.getenv("MARKET_DATA_FAULT_RATE", 0))
+    fail_symbols = [s for s in os.getenv("MARKET_DATA_FAULT_SYMBOLS", "").split(",") if s]
+    if fault_rate or fail_symbols:
+        provider = FaultInjectingProvider(provider, error_rate=fault_rate, fail_symbols=fail_symbols)
+    return provider
+
+
+def get_provider() -> MarketDataProvider:
+    """Return the process-wide provider (chosen via MARKET_DATA_PROVIDER on first use)."""
+    global _provider
+    if _provider is None:
+        with _provider_lock:
+            if _provider is None:
+                _provider = _provider_from_env()
+    return _provider
+
+
+def set_provider(provider: MarketDataProvider):
+    """Swap the process-wide provider (load tests, offline runs)."""
+    global _provider
+    with _provider_lock:
+        _provider = provider
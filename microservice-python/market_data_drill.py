@@ -0,0 +1,105 @@
+# market_data_drill.py
+"""
+Resilience drill for the market-data layer, run against a fault-injecting local stub.
+
+    python market_data_drill.py --replay-dir replay_data --symbols RELIANCE.NS TCS.NS INFY.NS
+
+Phases:
+    healthy   every symbol is fetched once (fills the last-known-good store)
+    outage    the stub throttles every call; requests must keep answering with stale
+              last-known-good data while the circuit opens and stops upstream traffic
+    recovery  the stub is restored; after the open period a probe closes the circuit
+              and fresh data is served again
+
+Prints a JSON summary and exits non-zero when an expectation fails.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+
+# Short breaker timings and a throwaway store, set before data_fetcher reads them
+DRILL_ENV = {
+    "MARKET_DATA_BREAKER_MIN_CALLS": "4",
+    "MARKET_DATA_BREAKER_OPEN_SECONDS": "2",
+    "MARKET_DATA_NEGATIVE_TTL_SECONDS": "1",
+    "MARKET_DATA_LAST_GOOD_DIR": os.path.join(tempfile.mkdtemp(prefix="drill_"), "last_good"),
+    "PRICE_PANEL_DIR": os.path.join(tempfile.mkdtemp(prefix="drill_"), "price_panel"),
+    "ADMISSION_ENABLED": "false",
+}
+
+
+def run_phase(symbols, start_date, end_date, rounds, data_fetcher):
+    """Fetch history and a quote per symbol `rounds` times; count fresh / stale / missing answers."""
+    counts = {"fresh": 0, "stale": 0, "missing": 0}
+    for _ in range(rounds):
+        for sym in symbols:
+            data_fetcher.quote_cache.invalidate(sym)
+            hist = data_fetcher.get_historical_data(sym, start_date, end_date)
+            quote = data_fetcher.get_current_quote(sym)
+            for stale, ok in ((hist.attrs.get("stale"), not hist.empty), (quote and quote.get("stale"), bool(quote))):
+                counts["missing" if not ok else "stale" if stale else "fresh"] += 1
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Circuit breaker / stale-data drill against a fault-injecting stub")
+    parser.add_argument("--replay-dir", default=os.getenv("MARKET_DATA_REPLAY_DIR", "replay_data"))
+    parser.add_argument("--as-of", default=os.getenv("MARKET_DATA_REPLAY_AS_OF"))
+    parser.add_argument("--symbols", nargs="+", required=True)
+    parser.add_argument("--rounds", type=int, default=10, help="request rounds during the outage")
+    args = parser.parse_args()
+
+    for key, value in DRILL_ENV.items():
+        os.environ.setdefault(key, value)
+
+    import pandas as pd
+    import data_fetcher
+    from market_data import ReplayProvider, FaultInjectingProvider, set_provider
+
+    stub = FaultInjectingProvider(ReplayProvider(args.replay_dir, as_of=args.as_of))
+    set_provider(stub)
+    end_date = (pd.Timestamp(args.as_of) if args.as_of else pd.Timestamp.today()).date() + pd.Timedelta(days=1)
+    start_date = str(end_date - pd.Timedelta(days=365))
+    end_date = str(end_date)
+    breaker = data_fetcher.upstream_breaker
+
+    summary, failures = {}, []
+
+    healthy = run_phase(args.symbols, start_date, end_date, 1, data_fetcher)
+    summary["healthy"] = healthy
+    if healthy["stale"] or healthy["missing"]:
+        failures.append("healthy phase should serve fresh data only")
+
+    stub.throttle()
+    calls_before = stub.calls
+    outage = run_phase(args.symbols, start_date, end_date, args.rounds, data_fetcher)
+    outage["upstreamCalls"] = stub.calls - calls_before
+    outage["requests"] = 2 * len(args.symbols) * args.rounds
+    outage["breaker"] = breaker.state()
+    summary["outage"] = outage
+    if outage["fresh"] or outage["missing"]:
+        failures.append("outage phase should serve stale last-known-good data only")
+    if outage["breaker"] != "open":
+        failures.append("circuit should be open during the outage")
+    if outage["upstreamCalls"] >= outage["requests"]:
+        failures.append("breaker / negative cache should cut upstream calls during the outage")
+
+    stub.restore()
+    time.sleep(max(breaker.open_seconds, data_fetcher.NEGATIVE_TTL_SECONDS) + 0.1)
+    recovery = run_phase(args.symbols, start_date, end_date, 1, data_fetcher)
+    recovery["breaker"] = breaker.state()
+    summary["recovery"] = recovery
+    if recovery["breaker"] != "closed" or recovery["stale"] or recovery["missing"]:
+        failures.append("circuit should close and serve fresh data after recovery")
+
+    summary["breakerMetrics"] = breaker.metrics()
+    summary["failures"] = failures
+    print(json.dumps(summary, indent=2))
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
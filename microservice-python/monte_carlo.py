@@ -0,0 +1,113 @@
+# monte_carlo.py
+import os
+import zlib
+import numpy as np
+from scipy.stats import norm, qmc
+
+VARIANCE_REDUCTION = ("antithetic", "moment", "sobol")
+DEFAULT_TECHNIQUES = tuple(
+    t.strip() for t in os.getenv("MC_VARIANCE_REDUCTION", ",".join(VARIANCE_REDUCTION)).split(",") if t.strip()
+)
+REPLICATES = 8  # independent replicates; standard errors are their spread
+DT = 1  # mu and sigma are daily return moments, so one step is one trading day
+
+
+# -----------------------------
+# Helper: Seeds
+# -----------------------------
+def symbol_seed(symbol: str, seed=None, salt="") -> np.random.SeedSequence:
+    """
+    Per-symbol seed sequence. With a request seed the paths are reproducible for that seed;
+    without one they depend only on the symbol and `salt` (e.g. the last bar date).
+    """
+    key = zlib.crc32(f"{symbol}|{salt}".encode("utf-8"))
+    return np.random.SeedSequence([key] if seed is None else [int(seed), key])
+
+
+# -----------------------------
+# Shocks
+# -----------------------------
+def standard_normals(sims: int, steps: int, techniques=DEFAULT_TECHNIQUES, seed=None) -> np.ndarray:
+    """
+    (sims x steps) standard normal shocks for one replicate.
+    sobol      -> scrambled Sobol points mapped through the normal inverse CDF
+    antithetic -> second half of the paths mirrors the first (Z, -Z)
+    moment     -> every step's shocks rescaled to exactly mean 0 / variance 1
+    """
+    rng = np.random.default_rng(seed)
+    base = (sims + 1) // 2 if "antithetic" in techniques else sims
+
+    if "sobol" in techniques:
+        sampler = qmc.Sobol(d=steps, scramble=True, seed=rng)
+        m = int(np.ceil(np.log2(max(base, 2))))
+        u = sampler.random_base2(m)[:base]
+        z = norm.ppf(np.clip(u, 1e-12, 1 - 1e-12))
+    else:
+        z = rng.standard_normal((base, steps))
+
+    if "antithetic" in techniques:
+        z = np.vstack([z, -z])[:sims]
+    if "moment" in techniques and sims > 1:
+        z = (z - z.mean(axis=0)) / np.where(z.std(axis=0) > 0, z.std(axis=0), 1.0)
+    return z
+
+
+def simulate_paths(current_price, mu, sigma, steps=30, sims=500, techniques=DEFAULT_TECHNIQUES, seed=None, dt=DT):
+    """
+    GBM price paths, shape (steps x sims), built in one cumulative sum of log increments:
+    S_t = S_0 exp((mu - sigma^2 / 2) t + sigma W_t).
+    """
+    z = standard_normals(sims, steps, techniques, seed)
+    increments = (mu - 0.5 * sigma ** 2) * dt + sigma * np.sqrt(dt) * z
+    return current_price * np.exp(np.cumsum(increments, axis=1)).T
+
+
+# -----------------------------
+# Estimates with standard errors
+# -----------------------------
+def terminal_prices(current_price, mu, sigma, horizon, sims, techniques=DEFAULT_TECHNIQUES, seed=None):
+    """S_T drawn exactly in one step (only the terminal distribution is needed), so Sobol works in 1-D."""
+    z = standard_normals(sims, 1, techniques, seed)[:, 0]
+    return current_price * np.exp((mu - 0.5 * sigma ** 2) * horizon + sigma * np.sqrt(horizon) * z)
+
+
+def simulate_price_summary(current_price, mu, sigma, steps=30, sims=500, techniques=DEFAULT_TECHNIQUES,
+                           seed=None, dt=DT, replicates=REPLICATES):
+    """
+    Terminal-price estimates from `sims` GBM draws split into independent replicates
+    (own seed / Sobol scramble each); standard errors are the spread across replicates.
+    Quantiles come from the pooled draws.
+    """
+    current_price, mu, sigma = float(current_price), float(mu), float(sigma)
+    horizon = steps * dt
+    replicates = max(2, min(replicates, sims // 2))
+    per_replicate = max(2, -(-sims // replicates))
+    seed_seq = seed if isinstance(seed, np.random.SeedSequence) else np.random.SeedSequence(seed)
+
+    finals = np.vstack([
+        terminal_prices(current_price, mu, sigma, horizon, per_replicate, techniques, child)
+        for child in seed_seq.spawn(replicates)
+    ])  # replicates x per_replicate
+    expected, prob_gain = finals.mean(axis=1), (finals > current_price).mean(axis=1)
+    quantiles = np.quantile(finals, [0.05, 0.95], axis=1)  # per replicate, only for the standard errors
+
+    def standard_error(values):
+        return float(np.std(values, ddof=1) / np.sqrt(replicates))
+
+    pooled = finals.ravel()
+    return {
+        "expected": float(expected.mean()),
+        "p05": float(np.quantile(pooled, 0.05)),
+        "p95": float(np.quantile(pooled, 0.95)),
+        "min": float(pooled.min()),
+        "max": float(pooled.max()),
+        "probabilityOfGain": float(prob_gain.mean()),
+        "standardError": {
+            "expected": standard_error(expected),
+            "p05": standard_error(quantiles[0]),
+            "p95": standard_error(quantiles[1]),
+            "probabilityOfGain": standard_error(prob_gain),
+        },
+        "paths": int(pooled.size),
+        "techniques": list(techniques),
+    }
@@ -1,6 +1,13 @@
 # optimization_engine.py
 import numpy as np
 import pandas as pd
+from allocation_engine import allocate_portfolio
+from tail_risk import var_cvar_from_sample
+from risk_engine import covariance_to_correlation
+from monte_carlo import symbol_seed
+
+FRONTIER_SIMULATIONS = 5000
+CVAR_SIMULATIONS = 10000
 
 
 def calculate_portfolio_metrics(weights, expected_returns, cov_matrix):
@@ -12,9 +19,40 @@ def calculate_portfolio_metrics(weights, expected_returns, cov_matrix):
     return port_return, port_vol
 
 
-def simulate_efficient_frontier(forecasts, holdings, simulations=5000):
+def forecast_covariance(symbols, volatilities, cov_matrix=None):
+    """
+    Covariance for the optimizer: forecast (GARCH) volatilities on the diagonal,
+    cross terms from the correlation implied by the shared historical covariance.
+    Falls back to a diagonal matrix when no covariance is available.
+    """
+    volatilities = np.asarray(volatilities, dtype=float)
+    if cov_matrix is None:
+        return np.diag(volatilities ** 2)
+
+    if isinstance(cov_matrix, pd.DataFrame):
+        cov_matrix = cov_matrix.reindex(index=symbols, columns=symbols).to_numpy(dtype=float)
+    hist_std = np.sqrt(np.clip(np.diag(cov_matrix), 0, None))
+    corr = covariance_to_correlation(cov_matrix)
+
+    # Use the historical volatility where a forecast is missing
+    vols = np.where(np.isfinite(volatilities), volatilities, hist_std)
+    return corr * np.outer(vols, vols)
+
+
+def sampler_seeds(symbols, seed=None, salt=""):
+    """
+    Independent (frontier, CVaR) child seeds for one symbol set: derived from the request
+    seed when given, else from the symbols and `salt` (e.g. the last bar date), so the
+    random portfolios and CVaR draws are reproducible either way.
+    """
+    frontier_seed, cvar_seed = symbol_seed("|".join(symbols), seed, salt).spawn(2)
+    return frontier_seed, cvar_seed
+
+
+def simulate_efficient_frontier(forecasts, holdings, simulations=FRONTIER_SIMULATIONS, cov_matrix=None, seed=None):
     """
     Monte Carlo simulation to approximate the efficient frontier.
+    seed: seeds the random portfolio weights (see sampler_seeds).
     Returns a dictionary with optimal portfolio allocations and metrics.
     """
     symbols = [h['symbol'] for h in holdings]
@@ -23,78 +61,104 @@ def simulate_efficient_frontier(forecasts, holdings, simulations=5000):
     expected_returns = np.array([forecasts[s]['forecast']['expectedReturn'] for s in symbols])
     volatilities = np.array([forecasts[s]['forecast']['volatility']['average'] for s in symbols])
 
-    # Construct covariance matrix (assume diagonal for simplicity if no correlation info)
-    cov_matrix = np.diag(volatilities ** 2)
+    # Covariance from the shared estimate (diagonal if none was supplied)
+    cov_matrix = forecast_covariance(symbols, volatilities, cov_matrix)
 
-    results = []
-    for _ in range(simulations):
-        weights = np.random.random(len(symbols))
-        weights /= np.sum(weights)
-        port_return, port_vol = calculate_portfolio_metrics(weights, expected_returns, cov_matrix)
-        results.append({'weights': weights, 'return': port_return, 'volatility': port_vol})
+    # All random portfolios at once: returns W mu, volatilities sqrt(diag(W S W'))
+    weights = np.random.default_rng(seed).random((simulations, len(symbols)))
+    weights /= weights.sum(axis=1, keepdims=True)
+    returns = weights @ expected_returns
+    volatilities = np.sqrt(np.einsum("ij,ij->i", weights @ cov_matrix, weights))
+    sharpe = returns / volatilities
 
     # Find portfolios with max Sharpe ratio and min volatility
-    results_df = pd.DataFrame(results)
-    results_df['sharpe'] = results_df['return'] / results_df['volatility']
-    max_sharpe_idx = results_df['sharpe'].idxmax()
-    min_vol_idx = results_df['volatility'].idxmin()
+    def portfolio(i):
+        return {
+            'weights': dict(zip(symbols, weights[i].round(4))),
+            'expectedReturn': round(float(returns[i]), 6),
+            'volatility': round(float(volatilities[i]), 6),
+            'sharpeRatio': round(float(sharpe[i]), 6)
+        }
 
     optimal_portfolios = {
-        'maxSharpe': {
-            'weights': dict(zip(symbols, results_df.loc[max_sharpe_idx, 'weights'].round(4))),
-            'expectedReturn': round(float(results_df.loc[max_sharpe_idx, 'return']), 6),
-            'volatility': round(float(results_df.loc[max_sharpe_idx, 'volatility']), 6),
-            'sharpeRatio': round(float(results_df.loc[max_sharpe_idx, 'sharpe']), 6)
-        },
-        'minVolatility': {
-            'weights': dict(zip(symbols, results_df.loc[min_vol_idx, 'weights'].round(4))),
-            'expectedReturn': round(float(results_df.loc[min_vol_idx, 'return']), 6),
-            'volatility': round(float(results_df.loc[min_vol_idx, 'volatility']), 6),
-            'sharpeRatio': round(float(results_df.loc[min_vol_idx, 'sharpe']), 6)
-        }
+        'maxSharpe': portfolio(int(np.nanargmax(sharpe))),
+        'minVolatility': portfolio(int(np.nanargmin(volatilities)))
     }
 
     return optimal_portfolios
 
 
-def calculate_cvar(forecasts, holdings, confidence=0.95, sims=10000):
+def holding_weights(forecasts, holdings):
+    """
+    Value weights (quantity x current price) of the holdings; equal weights when
+    quantities are not supplied.
+    """
+    symbols = [h['symbol'] for h in holdings]
+    values = np.array([
+        float(h.get('quantity') or 0) * float(forecasts[s].get('currentPrice') or 0)
+        for h, s in zip(holdings, symbols)
+    ])
+    if values.sum() <= 0:
+        return np.full(len(symbols), 1 / len(symbols))
+    return values / values.sum()
+
+
+def calculate_cvar(forecasts, holdings, confidence=0.95, sims=CVAR_SIMULATIONS, cov_matrix=None, weights=None, seed=None):
     """
     Estimate portfolio Conditional Value at Risk (CVaR) using Monte Carlo simulation.
+    All paths are drawn in one matrix; shocks are correlated through the shared covariance
+    when one is supplied. Uses the actual holding weights unless weights are given.
     """
     symbols = [h['symbol'] for h in holdings]
-    weights = np.array([1 / len(symbols)] * len(symbols))  # simple equal weights
+    weights = holding_weights(forecasts, holdings) if weights is None else np.asarray(weights, dtype=float)
 
     # Extract expected returns and volatility
     expected_returns = np.array([forecasts[s]['forecast']['expectedReturn'] for s in symbols])
     volatilities = np.array([forecasts[s]['forecast']['volatility']['average'] for s in symbols])
 
     # Generate Monte Carlo portfolio returns
-    portfolio_returns = []
-    for _ in range(sims):
-        simulated_returns = np.random.normal(loc=expected_returns, scale=volatilities)
-        portfolio_returns.append(np.dot(weights, simulated_returns))
-
-    portfolio_returns = np.array(portfolio_returns)
-    var = np.percentile(portfolio_returns, (1 - confidence) * 100)
-    cvar = portfolio_returns[portfolio_returns <= var].mean()
+    cov = forecast_covariance(symbols, volatilities, cov_matrix)
+    chol = np.linalg.cholesky(cov + 1e-12 * np.eye(len(symbols)))
+    rng = np.random.default_rng(seed)
+    portfolio_returns = (expected_returns + rng.standard_normal((sims, len(symbols))) @ chol.T) @ weights
 
+    _, cvar = var_cvar_from_sample(portfolio_returns, confidence)
     return round(float(cvar), 6)
 
 
-def optimize_portfolio(forecasts, holdings):
+def optimize_portfolio(forecasts, holdings, cov_matrix=None, efficient_frontier=None, allocation=None,
+                       simulations=FRONTIER_SIMULATIONS, cvar_sims=CVAR_SIMULATIONS, seed=None, salt=""):
     """
     Main entry point for Layer E:
-    Combines efficient frontier simulation and CVaR estimation.
+    Combines efficient frontier simulation and CVaR estimation, plus hierarchical
+    risk parity / equal risk contribution allocations when a covariance is supplied.
+    cov_matrix: the shared historical covariance (see covariance_service), if available.
+    efficient_frontier / allocation: results already computed for this symbol set
+    (they do not depend on quantities); only the weight-dependent CVaR is then computed.
+    simulations / cvar_sims: random portfolios and CVaR draws (reduced under a tight deadline).
+    seed / salt: request seed and last bar date; each sampler gets its own child seed (see sampler_seeds).
     Returns a JSON-ready dictionary.
     """
-    ef_summary = simulate_efficient_frontier(forecasts, holdings)
-    cvar_estimate = calculate_cvar(forecasts, holdings)
+    frontier_seed, cvar_seed = sampler_seeds([h['symbol'] for h in holdings], seed, salt)
+    ef_summary = efficient_frontier or simulate_efficient_frontier(forecasts, holdings, simulations=simulations,
+                                                                   cov_matrix=cov_matrix, seed=frontier_seed)
+    cvar_estimate = calculate_cvar(forecasts, holdings, sims=cvar_sims, cov_matrix=cov_matrix, seed=cvar_seed)
 
-    return {
+    result = {
         "efficientFrontier": ef_summary,
         "portfolioCVaR95": cvar_estimate
     }
 
+    # Deterministic risk-based allocations (HRP / ERC) from the shared covariance
+    if allocation is not None:
+        result["riskBasedAllocation"] = allocation
+    elif cov_matrix is not None and isinstance(cov_matrix, pd.DataFrame):
+        symbols = [h['symbol'] for h in holdings if h['symbol'] in cov_matrix.columns]
+        if symbols:
+            result["riskBasedAllocation"] = allocate_portfolio(cov_matrix, symbols)
+
+    return result
+
 
 # Example test run
 # if __name__ == "__main__":
@@ -0,0 +1,152 @@
+# price_panel.py
+"""
+Daily close panel for the whole universe, shared by every process on the host.
+
+The Top Picks job publishes a date x symbol float32 matrix into a memory-mapped file
+plus a small JSON index (symbols, dates, file). Gunicorn workers and pool processes
+attach read-only: the OS page cache holds one copy, and reading a symbol's history is
+a slice of the map (stored column-major, so one symbol is contiguous) instead of a
+download or unpickle.
+"""
+import os
+import json
+import threading
+from datetime import datetime
+import numpy as np
+import pandas as pd
+
+from trading_calendar import covers_last_session
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+PANEL_DIR = os.getenv("PRICE_PANEL_DIR", os.path.join(BASE_DIR, "analytics_store", "price_panel"))
+KEEP_VERSIONS = 2  # older data files are removed; processes still mapping them keep their view
+START_TOLERANCE_DAYS = 7  # panel may start a few (non-trading) days after the requested start
+
+_lock = threading.Lock()
+_attached = None  # (index mtime, PricePanel)
+
+
+def _index_path():
+    return os.path.join(PANEL_DIR, "index.json")
+
+
+# ---------------------------
+# Reader
+# ---------------------------
+class PricePanel:
+    """Read-only view over a published panel; `values` is the memory map itself."""
+
+    def __init__(self, values, symbols, dates, created_at):
+        self.values = values
+        self.symbols = symbols
+        self.dates = dates
+        self.created_at = created_at
+        self.columns = {sym: i for i, sym in enumerate(symbols)}
+
+    def __contains__(self, symbol):
+        return symbol in self.columns
+
+    def is_fresh(self):
+        """
+        Published after the last completed session's close. An older panel lacks that bar,
+        so reads fall through to the provider (or the flagged last-known-good copy).
+        """
+        return covers_last_session(self.created_at)
+
+    def _rows(self, start=None, end=None):
+        """Row slice for [start, end) — end is exclusive, like the providers' history()."""
+        lo = self.dates.searchsorted(pd.Timestamp(start)) if start is not None else 0
+        hi = self.dates.searchsorted(pd.Timestamp(end)) if end is not None else len(self.dates)
+        return slice(lo, hi)
+
+    def series(self, symbol, start=None, end=None):
+        """Close prices of one symbol (NaN rows dropped) as a float64 Series."""
+        rows = self._rows(start, end)
+        values = np.asarray(self.values[rows, self.columns[symbol]], dtype=float)
+        series = pd.Series(values, index=self.dates[rows], name=symbol)
+        return series[np.isfinite(values)]
+
+    def frame(self, symbols=None, start=None, end=None):
+        """Date x symbol closes for `symbols` (default: all), as stored (float32)."""
+        rows = self._rows(start, end)
+        if symbols is None:
+            return pd.DataFrame(np.asarray(self.values[rows]), index=self.dates[rows], columns=self.symbols)
+        symbols = [s for s in symbols if s in self.columns]
+        cols = [self.columns[s] for s in symbols]
+        return pd.DataFrame(self.values[rows][:, cols], index=self.dates[rows], columns=symbols)
+
+    def covers(self, symbol, start_date):
+        """True when the panel is fresh, has `symbol` and reaches back to `start_date`."""
+        return (symbol in self.columns and self.is_fresh() and len(self.dates) > 0
+                and self.dates[0] <= pd.Timestamp(start_date) + pd.Timedelta(days=START_TOLERANCE_DAYS))
+
+
+def attach():
+    """
+    The latest published panel, mapped read-only (re-attached when a new one is
+    published), or None when nothing has been published.
+    """
+    global _attached
+    try:
+        mtime = os.path.getmtime(_index_path())
+    except OSError:
+        return None
+
+    with _lock:
+        if _attached and _attached[0] == mtime:
+            return _attached[1]
+    try:
+        with open(_index_path(), "r", encoding="utf-8") as f:
+            index = json.load(f)
+        values = np.memmap(os.path.join(PANEL_DIR, index["file"]), dtype=np.float32, mode="r",
+                           shape=tuple(index["shape"]), order="F")
+        panel = PricePanel(values, index["symbols"], pd.DatetimeIndex(pd.to_datetime(index["dates"])),
+                           datetime.fromisoformat(index["createdAt"]))
+    except Exception as e:
+        print(f"[Panel Warning] Could not attach price panel: {e}")
+        return None
+    with _lock:
+        _attached = (mtime, panel)
+    return panel
+
+
+# ---------------------------
+# Writer
+# ---------------------------
+def publish_panel(closes: pd.DataFrame):
+    """
+    Write `closes` (date x symbol) as a new float32 memory-mapped file and point the
+    index at it. Returns the index dict.
+    """
+    closes = closes.sort_index()
+    closes = closes.loc[:, ~closes.columns.duplicated()]
+    os.makedirs(PANEL_DIR, exist_ok=True)
+    created_at = datetime.now()
+    name = f"close_{created_at:%Y%m%d%H%M%S%f}.f32"
+
+    values = np.memmap(os.path.join(PANEL_DIR, name), dtype=np.float32, mode="w+",
+                       shape=closes.shape, order="F")
+    values[:] = closes.to_numpy(dtype=np.float32)
+    values.flush()
+    del values
+
+    index = {
+        "file": name,
+        "shape": list(closes.shape),
+        "symbols": [str(s) for s in closes.columns],
+        "dates": [d.strftime("%Y-%m-%d") for d in pd.to_datetime(closes.index)],
+        "createdAt": created_at.isoformat(),
+    }
+    tmp = f"{_index_path()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(index, f)
+    os.replace(tmp, _index_path())
+
+    data_files = sorted(f for f in os.listdir(PANEL_DIR) if f.startswith("close_") and f.endswith(".f32"))
+    for old in data_files[:-KEEP_VERSIONS]:
+        try:
+            os.remove(os.path.join(PANEL_DIR, old))
+        except OSError:
+            pass
+    print(f"[Panel] Published {closes.shape[1]} symbols x {closes.shape[0]} days ({name}).")
+    return index
@@ -0,0 +1,174 @@
+# report_cache.py
+"""
+Full-report cache for /analyze-portfolio.
+
+Reports are keyed by a canonical hash of the holdings (symbol, quantity, avgCost) and
+the request options, plus the market date of the latest bar. When a new bar lands the
+key changes, so earlier entries are simply never looked up again. During the trading
+session the market key also rolls every REPORT_CACHE_INTRADAY_TTL_SECONDS, so live
+quotes are not frozen for the whole day.
+
+Tiers: an in-memory LRU per process, then pickled reports on disk shared by all workers.
+Identical concurrent requests are coalesced into one computation.
+"""
+import os
+import json
+import time
+import pickle
+import hashlib
+import threading
+from collections import OrderedDict
+from caching import SingleFlight
+from trading_calendar import market_now, in_session, last_completed_session, SESSION_OPEN
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+CACHE_DIR = os.getenv("REPORT_CACHE_DIR", os.path.join(BASE_DIR, "analytics_store", "reports"))
+MAX_ENTRIES = int(os.getenv("REPORT_CACHE_MAX_ENTRIES", 256))
+INTRADAY_TTL_SECONDS = int(os.getenv("REPORT_CACHE_INTRADAY_TTL_SECONDS", 300))
+DISK_RETENTION_DAYS = float(os.getenv("REPORT_CACHE_DISK_RETENTION_DAYS", 3))
+ENABLED = os.getenv("REPORT_CACHE_ENABLED", "true").lower() != "false"
+
+# Cache status values, returned to clients in the X-Report-Cache header
+HIT, DISK, MISS, COALESCED, REFRESH, BYPASS = "hit", "disk", "miss", "coalesced", "refresh", "bypass"
+
+
+# ---------------------------
+# Keys
+# ---------------------------
+def holdings_fingerprint(holdings, options=None):
+    """
+    SHA-256 over the holdings (symbol, quantity, avgCost), order-insensitive,
+    and the request options that change the report.
+    """
+    canonical = sorted(
+        (str(h["symbol"]).upper(), float(h.get("quantity") or 0), float(h.get("avgCost") or 0))
+        for h in holdings
+    )
+    payload = json.dumps({"holdings": canonical, "options": options or {}}, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def market_date_key(now=None):
+    """
+    Date of the last completed NSE session (see trading_calendar; weekends and holidays
+    roll back to it); during a session, today's date plus an intraday bucket of
+    INTRADAY_TTL_SECONDS.
+    """
+    now = market_now(now)
+    if in_session(now):
+        seconds = (now - now.replace(hour=SESSION_OPEN.hour, minute=SESSION_OPEN.minute,
+                                     second=0, microsecond=0)).total_seconds()
+        return f"{now.date().isoformat()}T{int(seconds // max(INTRADAY_TTL_SECONDS, 1))}"
+    return last_completed_session(now).isoformat()
+
+
+def report_key(holdings, options=None, now=None):
+    return f"{market_date_key(now)}-{holdings_fingerprint(holdings, options)}"
+
+
+# ---------------------------
+# Two-tier cache
+# ---------------------------
+class ReportCache:
+    """In-memory LRU in front of a pickle-per-report directory, with single-flight loads."""
+
+    def __init__(self, cache_dir=CACHE_DIR, max_entries=MAX_ENTRIES):
+        self.cache_dir = cache_dir
+        self.max_entries = int(max_entries)
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> report
+        self._flight = SingleFlight()
+        self._stats = {HIT: 0, DISK: 0, MISS: 0, COALESCED: 0, REFRESH: 0}
+        self._last_prune = 0.0
+
+    # --- tiers ---
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.pkl")
+
+    def _remember(self, key, report):
+        with self._lock:
+            self._entries[key] = report
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _read_disk(self, key):
+        try:
+            with open(self._path(key), "rb") as f:
+                return pickle.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            print(f"[Cache Warning] Could not read cached report {key}: {e}")
+            return None
+
+    def _write_disk(self, key, report):
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            tmp = f"{self._path(key)}.{os.getpid()}.tmp"
+            with open(tmp, "wb") as f:
+                pickle.dump(report, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, self._path(key))
+        except Exception as e:
+            print(f"[Cache Warning] Could not write cached report {key}: {e}")
+        self._prune_disk()
+
+    def _prune_disk(self):
+        """Drop report files older than DISK_RETENTION_DAYS (at most once an hour)."""
+        now = time.time()
+        if now - self._last_prune < 3600:
+            return
+        self._last_prune = now
+        cutoff = now - DISK_RETENTION_DAYS * 86400
+        try:
+            for name in os.listdir(self.cache_dir):
+                path = os.path.join(self.cache_dir, name)
+                if name.endswith(".pkl") and os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+        except OSError as e:
+            print(f"[Cache Warning] Pruning report cache failed: {e}")
+
+    # --- public API ---
+    def get_or_compute(self, key, compute, refresh=False):
+        """
+        Returns (report, status). `refresh` skips both tiers and recomputes
+        (e.g. for a Cache-Control: no-cache request), storing the new report.
+        Reports cut short by a deadline (a "degraded" section) are returned but not stored.
+        """
+        if not refresh:
+            with self._lock:
+                report = self._entries.get(key)
+                if report is not None:
+                    self._entries.move_to_end(key)
+                    self._stats[HIT] += 1
+                    return report, HIT
+
+        def load():
+            if not refresh:
+                report = self._read_disk(key)
+                if report is not None:
+                    self._remember(key, report)
+                    return report, DISK
+            report = compute()
+            if not report.get("degraded"):
+                self._remember(key, report)
+                self._write_disk(key, report)
+            return report, REFRESH if refresh else MISS
+
+        (report, status), shared = self._flight.do(key, load)
+        status = COALESCED if shared else status
+        with self._lock:
+            self._stats[status] += 1
+        return report, status
+
+    def invalidate(self):
+        """Forget every in-memory report (disk entries expire with their market date)."""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {**self._stats, "size": len(self._entries)}
+
+
+report_cache = ReportCache()
@@ -1,74 +1,112 @@
 # report_generator.py
 import json
-from data_fetcher import get_historical_data
 from descriptive_metrics import analyze_portfolio
-from risk_diagnostics import compute_risk_diagnostics
-from forecasting_models import generate_forecasts
-from optimization_engine import optimize_portfolio
-import pandas as pd
+from risk_diagnostics import compute_risk_diagnostics, BENCHMARK_SYMBOL
+from optimization_engine import optimize_portfolio, CVAR_SIMULATIONS
+from analytics_snapshot import get_snapshot_inputs, record_symbol_requests
+from report_pipeline import histories, symbol_stats, symbol_forecasts, symbol_set_nodes
+import deadlines
 
 
 # ---------------------------
-# Utility: Convert NumPy types to Python native
+# Shared Inputs: history for a set of symbols
 # ---------------------------
-def convert_numpy(obj):
-    if isinstance(obj, dict):
-        return {k: convert_numpy(v) for k, v in obj.items()}
-    elif isinstance(obj, list):
-        return [convert_numpy(i) for i in obj]
-    elif isinstance(obj, (float, int)):
-        return obj
-    elif hasattr(obj, 'tolist'):
-        return obj.tolist()
-    else:
-        return obj
+CORRELATION_KEYS = ("correlationMatrix", "correlationTopK", "correlationClusters")
+
+
+def fetch_historical_data(symbols):
+    """
+    Fetch the 1-year history window once per unique symbol (and market date, see report_pipeline).
+    Returns {symbol: get_historical_data() frame}.
+    """
+    return histories(symbols)
 
 
 # ---------------------------
 # Sweet Spot: Portfolio Report Generator
 # ---------------------------
-def generate_portfolio_report(holdings, steps=30, sims=500):
+def generate_portfolio_report(holdings, steps=30, sims=500, historical_data=None, forecast_summary=None,
+                              benchmark_df=None, correlation_mode="auto", top_k=5, seed=None):
     """
     Generates a compact but informative 'sweet spot' JSON report:
     - Layer A: descriptive metrics
     - Layer B: risk diagnostics (with betas & simplified correlation)
     - Layer C: forecasts (expected return, trend, volatility, price range)
     - Layer D: optimization (max Sharpe, min volatility, CVaR)
+
+    historical_data / forecast_summary / benchmark_df may be supplied by callers that
+    share them across portfolios (see generate_portfolio_reports); anything missing is fetched.
+    correlation_mode / top_k select the correlation output (see correlation_summary).
+    seed makes the Monte Carlo price ranges, the simulated tail risk and the optimizer's
+    frontier / CVaR draws reproducible (see monte_carlo, optimization_engine.sampler_seeds).
+    Under a request deadline (see deadlines) stages degrade instead of overrunning it;
+    the report then lists what was cut under "degraded".
     """
+    # Precomputed per-symbol snapshots (refreshed after market close) cover the common holdings
+    symbols = [h["symbol"] for h in holdings]
+    record_symbol_requests(symbols)
+    if historical_data is None and forecast_summary is None:
+        historical_data, forecast_summary, snapshot_benchmark = get_snapshot_inputs(symbols, steps, sims, seed)
+        if benchmark_df is None:
+            benchmark_df = snapshot_benchmark
 
-    # Base portfolio & holdings metrics
-    descriptive_summary = analyze_portfolio(holdings)
+    # Historical data for all layers (fetched once per symbol)
+    historical_data = dict(historical_data or {})
+    missing = [h["symbol"] for h in holdings if h["symbol"] not in historical_data]
+    if missing:
+        historical_data.update(fetch_historical_data(missing))
+    if benchmark_df is None:
+        benchmark_df = fetch_historical_data([BENCHMARK_SYMBOL])[BENCHMARK_SYMBOL]
 
-    # Historical data for forecasting
-    historical_data = {}
-    for h in holdings:
-        symbol = h["symbol"]
-        end_date = pd.Timestamp.today().date()
-        start_date = end_date - pd.Timedelta(days=365)
-        historical_data[symbol] = get_historical_data(symbol, str(start_date), str(end_date))
+    # Base portfolio & holdings metrics (per-symbol statistics are memoised, P&L is not)
+    descriptive_summary = analyze_portfolio(holdings, historical_data,
+                                            symbol_stats=symbol_stats(symbols, historical_data))
+    if "error" in descriptive_summary:
+        raise ValueError(descriptive_summary["error"])
 
-    # Forecasting (compact)
-    forecast_summary = generate_forecasts(holdings, historical_data, steps=steps, sims=sims)
+    # Last-known-good fallbacks (upstream failing or circuit open) are flagged in the report
+    stale = [s for s in symbols if s in historical_data and historical_data[s].attrs.get("stale")]
+    stale += [h["symbol"] for h in descriptive_summary.get("holdings", []) if h.get("stale")]
+    if stale:
+        deadlines.degrade("marketData", "staleData", stale)
+
+    # Forecasting (compact) — shared/precomputed/memoised forecasts first, the rest in one batch
+    forecast_summary = symbol_forecasts(symbols, historical_data, steps, sims, seed, precomputed=forecast_summary)
     sweet_forecasts = {}
     for sym, f in forecast_summary.items():
         sweet_forecasts[sym] = {
             "currentPrice": f.get("currentPrice"),
             "expectedReturn": f["forecast"].get("expectedReturn"),
+            "model": f["forecast"].get("model"),
             "trend": f["forecast"].get("trendDirection"),
             "volatility": f["forecast"]["volatility"].get("average"),
-            "priceRange": f["forecast"]["priceRange"].get("pctChangeRange")
+            "priceRange": f["forecast"]["priceRange"].get("pctChangeRange"),
+            "simulation": {k: f["forecast"]["priceRange"].get(k)
+                           for k in ("expected", "p05", "p95", "probabilityOfGain", "standardError", "paths")}
         }
 
-    # Risk diagnostics
-    risk_summary = compute_risk_diagnostics(holdings)
-    risk_metrics = risk_summary.get("riskMetrics", {})
+    # Nodes that depend only on the symbol set: returns matrix, covariance, exposures, frontier, HRP/ERC
+    nodes = symbol_set_nodes(symbols, historical_data, forecast_summary, benchmark_df, steps, sims, seed)
 
-    # Simplified correlation matrix (only pairwise)
-    corr_matrix = risk_metrics.get("correlationMatrix", {})
-    simple_corr = {k: {kk: round(vv, 4) for kk, vv in val.items()} for k, val in corr_matrix.items()}
+    # Samplers below are seeded from the request seed, else from the symbols and this date
+    last_bar = str(nodes["returns"].index[-1]) if not nodes["returns"].empty else ""
 
-    # Optimization
-    optimization_summary = optimize_portfolio(forecast_summary, holdings)
+    # Risk diagnostics (weight-dependent figures on the shared nodes)
+    risk_summary = compute_risk_diagnostics(holdings, historical_data=historical_data, benchmark_df=benchmark_df,
+                                            base_summary=descriptive_summary,
+                                            correlation_mode=correlation_mode, top_k=top_k,
+                                            returns=nodes["returns"], exposure_df=nodes["exposures"], seed=seed)
+    risk_metrics = risk_summary.get("riskMetrics", {})
+
+    # Optimization on the same cached covariance the risk layer used (holdings with a forecast only:
+    # a history left out by the fetch deadline has none)
+    forecastable = [h for h in holdings if "forecast" in forecast_summary.get(h["symbol"], {})]
+    optimization_summary = optimize_portfolio(forecast_summary, forecastable, cov_matrix=nodes["covariance"],
+                                              efficient_frontier=nodes["efficientFrontier"],
+                                              allocation=nodes["allocation"],
+                                              cvar_sims=deadlines.simulation_count(CVAR_SIMULATIONS, "optimization"),
+                                              seed=seed, salt=last_bar) if forecastable else {}
+    efficient_frontier = optimization_summary.get("efficientFrontier", {})
 
     # Construct sweet spot JSON
     final_report = {
@@ -85,20 +123,71 @@ def generate_portfolio_report(holdings, steps=30, sims=500):
             "valueAtRisk95": risk_metrics.get("valueAtRisk95"),
             "conditionalVaR95": risk_metrics.get("conditionalVaR95"),
             "maxDrawdown": risk_metrics.get("maxDrawdown"),
+            "tailRisk": risk_metrics.get("tailRisk"),
             "diversificationScore": risk_metrics.get("diversificationScore"),
             "betas": risk_metrics.get("betas"),
-            "correlationMatrix": simple_corr
+            "exposures": risk_metrics.get("exposures"),
+            "riskContributions": risk_metrics.get("riskContributions"),
+            **{key: risk_metrics[key] for key in CORRELATION_KEYS if key in risk_metrics}
         },
         "forecasts": sweet_forecasts,
         "optimization": {
-            "maxSharpe": optimization_summary["efficientFrontier"]["maxSharpe"]["weights"],
-            "minVolatility": optimization_summary["efficientFrontier"]["minVolatility"]["weights"],
-            "portfolioCVaR95": optimization_summary.get("portfolioCVaR95")
+            "maxSharpe": efficient_frontier.get("maxSharpe", {}).get("weights"),
+            "minVolatility": efficient_frontier.get("minVolatility", {}).get("weights"),
+            "portfolioCVaR95": optimization_summary.get("portfolioCVaR95"),
+            "riskBasedAllocation": optimization_summary.get("riskBasedAllocation")
         }
     }
 
-    # Ensure JSON-serializable
-    return convert_numpy(final_report)
+    degraded = deadlines.degraded_report()
+    if degraded:
+        final_report["degraded"] = degraded
+
+    # NumPy values are encoded natively by the serialization layer
+    return final_report
+
+
+# ---------------------------
+# Batch: many portfolios, shared per-symbol work
+# ---------------------------
+def generate_portfolio_reports(portfolios, steps=30, sims=500, correlation_mode="auto", top_k=5, seed=None):
+    """
+    Reports for many portfolios at once. History and forecasts are computed once per
+    unique symbol across all portfolios (plus one benchmark fetch), and symbol-set nodes
+    (returns matrix, covariance, frontier) are shared by portfolios holding the same set.
+    Weight-level figures (P&L, volatility, VaR) are still computed per portfolio: each is
+    measured on the dates its own holdings all traded, which a single weights matrix over
+    the union of symbols would not preserve.
+
+    portfolios = [{"portfolioId": 1, "holdings": [...]}, ...]  (symbols already normalised)
+    Yields (portfolioId, report, error) per portfolio in input order.
+    """
+    symbols = list(dict.fromkeys(h["symbol"] for p in portfolios for h in p.get("holdings", [])))
+
+    # Start from precomputed snapshots, then fetch / fit only what they do not cover
+    historical_data, forecast_summary, benchmark_df = get_snapshot_inputs(symbols, steps, sims, seed)
+    to_fetch = [s for s in symbols if s not in historical_data]
+    if benchmark_df is None:
+        to_fetch.append(BENCHMARK_SYMBOL)
+    historical_data.update(fetch_historical_data(to_fetch))
+    if benchmark_df is None:
+        benchmark_df = historical_data.pop(BENCHMARK_SYMBOL)
+
+    forecast_summary = symbol_forecasts(symbols, historical_data, steps, sims, seed, precomputed=forecast_summary)
+
+    for p in portfolios:
+        portfolio_id = p.get("portfolioId")
+        try:
+            with deadlines.degradations():
+                report = generate_portfolio_report(p["holdings"], steps=steps, sims=sims,
+                                                   historical_data=historical_data,
+                                                   forecast_summary=forecast_summary,
+                                                   benchmark_df=benchmark_df,
+                                                   correlation_mode=correlation_mode, top_k=top_k, seed=seed)
+            yield portfolio_id, report, None
+        except Exception as e:
+            print(f"[Error] Batch report for portfolio {portfolio_id}: {e}")
+            yield portfolio_id, None, str(e)
 
 
 # ---------------------------
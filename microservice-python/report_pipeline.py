@@ -0,0 +1,195 @@
+# report_pipeline.py
+"""
+Dependency-aware building blocks for portfolio reports.
+
+A report is made of three kinds of nodes:
+
+    symbol       history, 1Y metrics + daily returns, forecast    key: symbol + its last bar
+    symbol set   returns matrix, covariance, benchmark            key: the symbols' bar keys
+                 exposures, efficient frontier, HRP / ERC
+    weights      P&L aggregation, portfolio volatility, VaR,      recomputed on every request
+                 risk contributions, tail risk, CVaR
+
+Symbol and symbol-set nodes are memoised, so editing a quantity only reruns the weight
+nodes, and adding a holding computes that symbol's nodes plus its row and column of the
+covariance moments (see covariance_service); the frontier and allocations for the new set
+are one vectorised pass each. Nodes cut short by a request deadline (see deadlines) are
+returned but not memoised.
+"""
+import os
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, wait
+import pandas as pd
+
+import deadlines
+
+from caching import TTLCache
+from data_fetcher import get_historical_data
+from descriptive_metrics import history_stats
+from exposure_engine import compute_exposures
+from forecasting_models import generate_forecasts
+from optimization_engine import simulate_efficient_frontier, sampler_seeds, FRONTIER_SIMULATIONS
+from allocation_engine import allocate_portfolio
+from risk_engine import build_returns_matrix
+from covariance_service import get_covariance
+from trading_calendar import session_window
+from risk_diagnostics import BENCHMARK_SYMBOL
+
+HISTORY_DAYS = 365
+NODE_TTL_SECONDS = float(os.getenv("REPORT_NODE_TTL_SECONDS", 26 * 3600))
+NODE_MAX_ENTRIES = int(os.getenv("REPORT_NODE_MAX_ENTRIES", 5000))
+FETCH_WORKERS = int(os.getenv("REPORT_FETCH_WORKERS", 8))
+
+history_nodes = TTLCache(ttl=NODE_TTL_SECONDS, stale_ttl=0, max_entries=NODE_MAX_ENTRIES)
+symbol_nodes = TTLCache(ttl=NODE_TTL_SECONDS, stale_ttl=0, max_entries=NODE_MAX_ENTRIES)
+set_nodes = TTLCache(ttl=NODE_TTL_SECONDS, stale_ttl=0, max_entries=512)
+
+# Deadline-bound fetches run here; a fetch that outlives its request still fills history_nodes
+_fetch_pool = ThreadPoolExecutor(max_workers=FETCH_WORKERS, thread_name_prefix="history-fetch")
+
+
+# ---------------------------
+# Keys
+# ---------------------------
+def bar_key(symbol, hist):
+    """Identifies the data a symbol node was computed from: its last bar and length."""
+    if hist is None or hist.empty or "Date" not in hist.columns:
+        return symbol, None, 0
+    return symbol, str(hist["Date"].iloc[-1]), len(hist)
+
+
+# ---------------------------
+# Symbol nodes
+# ---------------------------
+def histories(symbols):
+    """
+    The 1-year history window per symbol, ending with the last completed session
+    (see trading_calendar) and fetched once per window. Failed / empty fetches are retried next time.
+    Under a request deadline, uncached symbols are fetched in parallel and those not
+    back before the analytics reserve are returned empty (degraded "history").
+    """
+    start_date, end_date = session_window(HISTORY_DAYS)
+
+    def key(sym):
+        return "history", sym, start_date, end_date
+
+    def load(sym):
+        hist = get_historical_data(sym, start_date, end_date)
+        return None if hist.empty else hist
+
+    def node(sym):
+        return history_nodes.get(key(sym), lambda: load(sym))
+
+    symbols = list(dict.fromkeys(symbols))
+    if deadlines.remaining() is None:
+        loaded = {sym: node(sym) for sym in symbols}
+    else:
+        loaded = {sym: history_nodes.peek(key(sym)) for sym in symbols}
+        futures = {sym: _fetch_pool.submit(contextvars.copy_context().run, node, sym)
+                   for sym, hist in loaded.items() if hist is None}
+        if futures:
+            wait(futures.values(), timeout=max(0.0, deadlines.remaining() - deadlines.ANALYTICS_RESERVE_SECONDS))
+            late = [sym for sym, future in futures.items() if not future.done()]
+            if late:
+                deadlines.degrade("history", "fetchDeadline", late)
+            for sym, future in futures.items():
+                if future.done() and future.exception() is None:
+                    loaded[sym] = future.result()
+                elif future.done():
+                    print(f"[Warning] History fetch for {sym} failed: {future.exception()}")
+
+    # Stale fallbacks (see last_good) are served once, not kept for the whole window
+    for sym, hist in loaded.items():
+        if hist is not None and hist.attrs.get("stale"):
+            history_nodes.invalidate(key(sym))
+    return {sym: hist if hist is not None else pd.DataFrame() for sym, hist in loaded.items()}
+
+
+def symbol_stats(symbols, historical_data):
+    """{symbol: history_stats()} — 1Y metrics and daily returns, computed once per bar."""
+    return {
+        sym: symbol_nodes.get(("stats", bar_key(sym, historical_data.get(sym))),
+                              lambda sym=sym: history_stats(sym, historical_data.get(sym)))
+        for sym in symbols
+    }
+
+
+def symbol_forecasts(symbols, historical_data, steps, sims, seed=None, precomputed=None):
+    """
+    {symbol: forecast summary}. Uses `precomputed` (e.g. snapshots) first, then memoised
+    forecasts; the remaining symbols are fitted together in one generate_forecasts() batch.
+    """
+    def key(sym):
+        return "forecast", bar_key(sym, historical_data.get(sym)), steps, sims, seed
+
+    precomputed = precomputed or {}
+    forecasts, missing = {}, []
+    for sym in dict.fromkeys(symbols):
+        cached = precomputed.get(sym) or symbol_nodes.peek(key(sym))
+        if cached is not None:
+            forecasts[sym] = cached
+        else:
+            missing.append(sym)
+
+    if missing:
+        fresh = generate_forecasts([{"symbol": s} for s in missing], historical_data, steps=steps, sims=sims, seed=seed)
+        memoise = not deadlines.is_degraded("forecasts")  # deadline-cut forecasts are not reused
+        for sym, forecast in fresh.items():
+            if "forecast" in forecast and memoise:
+                symbol_nodes.put(key(sym), forecast)
+            forecasts[sym] = forecast
+    return {sym: forecasts[sym] for sym in symbols if sym in forecasts}
+
+
+# ---------------------------
+# Symbol-set nodes
+# ---------------------------
+def symbol_set_nodes(symbols, historical_data, forecast_summary, benchmark_df=None, steps=30, sims=500, seed=None):
+    """
+    Everything that depends on which symbols are held but not on how much of each:
+    {"returns", "covariance", "exposures", "efficientFrontier", "allocation"}.
+    Nodes that cannot be computed (no data, missing forecasts) are None.
+    """
+    symbols = list(dict.fromkeys(symbols))
+    bars = tuple(bar_key(s, historical_data.get(s)) for s in symbols)
+
+    returns = set_nodes.get(("returns", bars), lambda: build_returns_matrix(
+        {s: historical_data[s] for s in symbols if s in historical_data}))
+    nodes = {"returns": returns, "covariance": None, "exposures": None, "efficientFrontier": None,
+             "allocation": None}
+    if returns.empty:
+        return nodes
+
+    cov_matrix = get_covariance(returns)
+    nodes["covariance"] = cov_matrix
+
+    # Betas / alphas against the benchmark
+    if benchmark_df is not None and not benchmark_df.empty:
+        _, benchmark_returns = symbol_stats([BENCHMARK_SYMBOL], {BENCHMARK_SYMBOL: benchmark_df})[BENCHMARK_SYMBOL]
+        if benchmark_returns is not None and not benchmark_returns.empty:
+            nodes["exposures"] = set_nodes.get(
+                ("exposures", bars, bar_key(BENCHMARK_SYMBOL, benchmark_df)),
+                lambda: compute_exposures(returns, benchmark_returns))
+
+    # Random-portfolio frontier and HRP / ERC allocations
+    if all(s in forecast_summary and "forecast" in forecast_summary[s] for s in symbols):
+        frontier_key = ("frontier", bars, steps, sims, seed)
+        frontier = set_nodes.peek(frontier_key)
+        if frontier is None:
+            simulations = deadlines.simulation_count(FRONTIER_SIMULATIONS, "optimization")
+            frontier_seed, _ = sampler_seeds(symbols, seed, str(returns.index[-1]))
+            frontier = simulate_efficient_frontier(forecast_summary, [{"symbol": s} for s in symbols],
+                                                   simulations=simulations, cov_matrix=cov_matrix,
+                                                   seed=frontier_seed)
+            if simulations == FRONTIER_SIMULATIONS and not deadlines.is_degraded("forecasts"):
+                set_nodes.put(frontier_key, frontier)
+        nodes["efficientFrontier"] = frontier
+    allocatable = [s for s in symbols if s in cov_matrix.columns]
+    if allocatable:
+        nodes["allocation"] = set_nodes.get(("allocation", bars),
+                                            lambda: allocate_portfolio(cov_matrix, allocatable))
+    return nodes
+
+
+def stats():
+    return {"history": history_nodes.stats(), "symbol": symbol_nodes.stats(), "symbolSet": set_nodes.stats()}
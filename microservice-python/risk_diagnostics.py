@@ -1,147 +1,157 @@
-import numpy as np
 import pandas as pd
-from datetime import datetime, timedelta
 from data_fetcher import get_historical_data, compute_metrics
 from descriptive_metrics import analyze_portfolio
+from exposure_engine import compute_exposures, rolling_betas
+from risk_engine import build_value_weights, build_returns_matrix, compute_portfolio_risk, covariance_to_correlation
+from covariance_service import get_covariance
+from correlation_summary import summarize_correlation
+from tail_risk import compute_tail_risk
+from monte_carlo import symbol_seed
+from trading_calendar import session_window
 
-# -----------------------------
-# Helper: Max Drawdown
-# -----------------------------
-def compute_max_drawdown(returns_series: pd.Series):
-    cumulative = (1 + returns_series).cumprod()
-    peak = cumulative.cummax()
-    drawdown = (cumulative - peak) / peak
-    return drawdown.min()
-
-
-# -----------------------------
-# Helper: Value at Risk (VaR)
-# -----------------------------
-def compute_var(returns: pd.Series, confidence=0.95):
-    if returns.empty:
-        return None
-    return np.percentile(returns, (1 - confidence) * 100)
-
-
-# -----------------------------
-# Helper: Conditional VaR (CVaR)
-# -----------------------------
-def compute_cvar(returns: pd.Series, confidence=0.95):
-    var = compute_var(returns, confidence)
-    if var is None:
-        return None
-    return returns[returns < var].mean()
+BENCHMARK_SYMBOL = "^NSEI"  # NIFTY 50
 
 
 # -----------------------------
 # Helper: Beta vs Benchmark
 # -----------------------------
 def compute_beta(asset_returns: pd.Series, benchmark_returns: pd.Series):
-    # Convert to 1D np.array
-    asset_arr = np.asarray(asset_returns).flatten()
-    bench_arr = np.asarray(benchmark_returns).flatten()
-
-    # Align lengths
-    min_len = min(len(asset_arr), len(bench_arr))
-    asset_arr = asset_arr[-min_len:]
-    bench_arr = bench_arr[-min_len:]
-
-    # Compute covariance and variance
-    covariance = np.cov(asset_arr, bench_arr)[0][1]
-    market_var = np.var(bench_arr)
-    return covariance / market_var if market_var != 0 else None
-
+    """
+    Beta of one asset, aligned with the benchmark on the date index.
+    """
+    exposures = compute_exposures(asset_returns.to_frame(), benchmark_returns, min_observations=2)
+    beta = exposures["beta"].iloc[0]
+    return None if pd.isna(beta) else float(beta)
 
 
 # -----------------------------
 # Core: Risk Diagnostics Layer
 # -----------------------------
-# -----------------------------
-# Utility: Convert numpy floats to Python floats
-# -----------------------------
-def convert_numpy_to_python(obj):
-    """
-    Recursively convert all np.float64 or np.int64 in dict/list to native Python float/int.
-    """
-    if isinstance(obj, dict):
-        return {k: convert_numpy_to_python(v) for k, v in obj.items()}
-    elif isinstance(obj, list):
-        return [convert_numpy_to_python(i) for i in obj]
-    elif isinstance(obj, (np.float64, np.float32)):
-        return float(obj)
-    elif isinstance(obj, (np.int64, np.int32)):
-        return int(obj)
-    else:
-        return obj
-
-def compute_risk_diagnostics(holdings):
+def compute_risk_diagnostics(holdings, rolling_window=None, historical_data=None, benchmark_df=None,
+                             base_summary=None, correlation_mode="auto", top_k=5, returns=None,
+                             exposure_df=None, seed=None):
     """
     Takes holdings list and returns extended risk metrics for the full portfolio.
+    Pass rolling_window (trading days) to also return rolling betas.
+    correlation_mode: "dense" (full matrix), "topk" (top_k pairs per holding + cluster
+    blocks) or "auto" (dense for small portfolios) — see correlation_summary.
+
+    Callers that already hold the inputs (report generator, batch analysis) can pass
+    historical_data ({symbol: frame}), benchmark_df (^NSEI frame) and base_summary
+    (analyze_portfolio() output) so nothing is fetched twice. returns (the aligned return
+    matrix) and exposure_df (compute_exposures() output) depend only on the symbol set and
+    may be passed in as well (see report_pipeline).
+    seed: request seed for the simulated tail-risk methods; without one they are seeded from
+    the symbols and last bar, so the same bars always give the same figures.
     """
 
     # Base descriptive stats
-    base_summary = analyze_portfolio(holdings)
+    if base_summary is None:
+        base_summary = analyze_portfolio(holdings, historical_data)
     holding_symbols = [h["symbol"] for h in base_summary["holdings"]]
 
-    # Fetch 1Y historical data for all holdings
-    end_date = datetime.today().date()
-    start_date = end_date - timedelta(days=365)
-    price_data = pd.DataFrame()
+    # Fetch 1Y historical data for all holdings (unless supplied)
+    start_date, end_date = session_window(365)
+    if returns is None:
+        historical_data = historical_data or {}
+        historical_data = {
+            sym: historical_data[sym] if sym in historical_data
+            else get_historical_data(sym, start_date, end_date)
+            for sym in holding_symbols
+        }
 
-    for sym in holding_symbols:
-        df = get_historical_data(sym, str(start_date), str(end_date))
-        if not df.empty:
-            price_data[sym] = df.set_index("Date")["Close"].squeeze()
+        # Daily returns matrix (dates where every holding traded)
+        returns = build_returns_matrix(historical_data)
 
-    price_data.dropna(inplace=True)
-
-    if price_data.empty:
+    if returns.empty:
         return {**base_summary, "riskMetrics": {"warning": "No sufficient price data"}}
 
-    # Daily returns matrix
-    returns = price_data.pct_change().dropna()
-
-    # Portfolio-level risk measures
-    correlation_matrix = returns.corr()
-    portfolio_volatility = np.sqrt(np.dot(base_summary["volatility"], base_summary["volatility"]))
-
-    # Benchmark (NIFTY 50)
-    benchmark_df = get_historical_data("^NSEI", str(start_date), str(end_date))
+    # Portfolio-level risk measures: value weights + the shared (cached) covariance matrix
+    weights = build_value_weights(base_summary["holdings"], returns.columns)
+    cov_matrix = get_covariance(returns)
+    portfolio_risk = compute_portfolio_risk(returns, weights, confidence=0.95, cov_matrix=cov_matrix)
+    portfolio_volatility = portfolio_risk["volatility"]
+
+    # Reported correlations (matrix, diversification score) come from the sample estimate:
+    # Ledoit-Wolf shrinks them towards zero, which suits risk and optimizer inputs, not display
+    sample_cov = get_covariance(returns, "sample").reindex(index=returns.columns, columns=returns.columns)
+    correlation_matrix = pd.DataFrame(covariance_to_correlation(sample_cov.to_numpy(dtype=float)),
+                                      index=returns.columns, columns=returns.columns)
+
+    # Benchmark (NIFTY 50), indexed by date so it joins with the holdings' returns
+    if benchmark_df is None:
+        benchmark_df = get_historical_data(BENCHMARK_SYMBOL, start_date, end_date)
     if not benchmark_df.empty:
-        benchmark_close = benchmark_df["Close"]
+        benchmark_close = benchmark_df.set_index("Date")["Close"]
         if isinstance(benchmark_close, pd.DataFrame):
-            benchmark_close = benchmark_close.squeeze()
+            benchmark_close = benchmark_close.squeeze(axis=1)
         benchmark_returns = benchmark_close.pct_change().dropna()
     else:
-        benchmark_returns = pd.Series()
+        benchmark_returns = pd.Series(dtype=float)
 
+    # Betas, alphas, R² and residual volatility for all holdings in one solve
     betas = {}
-    for sym in holding_symbols:
-        if not benchmark_returns.empty and sym in returns.columns:
-            beta = compute_beta(returns[sym], benchmark_returns)
-            betas[sym] = round(beta, 3) if beta is not None else None
-
-    # Value at Risk / Conditional VaR / Max Drawdown
-    portfolio_returns = returns.mean(axis=1)
-    var_95 = compute_var(portfolio_returns, 0.95)
-    cvar_95 = compute_cvar(portfolio_returns, 0.95)
-    max_dd = compute_max_drawdown(portfolio_returns)
+    exposures = {}
+    rolling = None
+    if not benchmark_returns.empty:
+        if exposure_df is None:
+            exposure_df = compute_exposures(returns, benchmark_returns)
+        for sym, row in exposure_df.iterrows():
+            betas[sym] = round(float(row["beta"]), 3) if pd.notna(row["beta"]) else None
+            exposures[sym] = {
+                "beta": betas[sym],
+                "alpha": round(float(row["alpha"]), 6) if pd.notna(row["alpha"]) else None,
+                "rSquared": round(float(row["rSquared"]), 4) if pd.notna(row["rSquared"]) else None,
+                "residualVolatility": round(float(row["residualVolatility"]), 6)
+                if pd.notna(row["residualVolatility"]) else None,
+            }
+
+        if rolling_window:
+            rolling_df = rolling_betas(returns, benchmark_returns, window=rolling_window)
+            rolling = {
+                "window": rolling_window,
+                "dates": [d.strftime("%Y-%m-%d") for d in rolling_df.index],
+                "betas": {sym: rolling_df[sym].round(3).tolist() for sym in rolling_df.columns},
+            }
+
+    # Value at Risk / Conditional VaR / Max Drawdown of the value-weighted portfolio
+    var_95 = portfolio_risk["valueAtRisk"]
+    cvar_95 = portfolio_risk["conditionalVaR"]
+    max_dd = portfolio_risk["maxDrawdown"]
+
+    risk_contributions = {
+        sym: {
+            "weight": round(float(portfolio_risk["weights"][sym]), 4),
+            "marginal": round(float(portfolio_risk["marginalContribution"][sym]), 6),
+            "component": round(float(portfolio_risk["componentContribution"][sym]), 6),
+            "percent": round(float(portfolio_risk["percentContribution"][sym]) * 100, 2),
+        }
+        for sym in portfolio_risk["symbols"]
+    }
 
     diversification_score = (1 - correlation_matrix.abs().mean().mean()) * 100
 
     risk_metrics = {
-        "correlationMatrix": correlation_matrix.to_dict(),
+        **summarize_correlation(correlation_matrix, correlation_mode, top_k),
         "portfolioVolatility": round(float(portfolio_volatility), 6),
         "valueAtRisk95": round(float(var_95), 6) if var_95 else None,
         "conditionalVaR95": round(float(cvar_95), 6) if cvar_95 else None,
         "maxDrawdown": round(float(max_dd), 6) if max_dd else None,
         "betas": betas,
+        "exposures": exposures,
+        "riskContributions": risk_contributions,
         "diversificationScore": round(float(diversification_score), 2),
+        # Historical / parametric / Cornish-Fisher / FHS / block-bootstrap VaR and CVaR at 95/99%, 1 and 10 days
+        "tailRisk": compute_tail_risk(returns, portfolio_risk["weights"], cov_matrix=cov_matrix,
+                                      seed=symbol_seed("|".join(returns.columns), seed, salt=str(returns.index[-1]))),
     }
 
+    if rolling is not None:
+        risk_metrics["rollingBetas"] = rolling
+
     # Merge everything
     enriched_summary = {**base_summary, "riskMetrics": risk_metrics}
-    return convert_numpy_to_python(enriched_summary)
+    return enriched_summary
 
 # if __name__ == "__main__":
 #     holdings = [
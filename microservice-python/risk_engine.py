@@ -0,0 +1,132 @@
+# risk_engine.py
+import numpy as np
+import pandas as pd
+
+from tail_risk import var_cvar_from_sample
+
+
+# -----------------------------
+# Helper: Value weights
+# -----------------------------
+def build_value_weights(holdings_summary: list, symbols=None) -> pd.Series:
+    """
+    Value weights (currentValue / total) from analyze_portfolio()'s holdings list,
+    restricted to `symbols` (e.g. the columns of the return matrix) and renormalised.
+    """
+    values = pd.Series({h["symbol"]: float(h.get("currentValue") or 0.0) for h in holdings_summary})
+    if symbols is not None:
+        values = values.reindex(list(symbols)).fillna(0.0)
+
+    total = values.sum()
+    if total <= 0:
+        return pd.Series(1.0 / len(values), index=values.index) if len(values) else values
+    return values / total
+
+
+# -----------------------------
+# Helper: Correlation from covariance
+# -----------------------------
+def covariance_to_correlation(cov: np.ndarray) -> np.ndarray:
+    """Correlation matrix of a covariance matrix (zero-variance rows get 0 off the diagonal)."""
+    std = np.sqrt(np.clip(np.diag(cov), 0, None))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        corr = cov / np.outer(std, std)
+    corr[~np.isfinite(corr)] = 0.0
+    np.fill_diagonal(corr, 1.0)
+    return corr
+
+
+# -----------------------------
+# Helper: Aligned return matrix
+# -----------------------------
+def build_returns_matrix(historical_data: dict) -> pd.DataFrame:
+    """
+    Date x symbol daily returns from {symbol: get_historical_data() frame},
+    keeping only dates on which every symbol has a close.
+    """
+    closes = {}
+    for sym, df in historical_data.items():
+        if df is None or df.empty or "Close" not in df.columns:
+            continue
+        close = df.set_index("Date")["Close"] if "Date" in df.columns else df["Close"]
+        if isinstance(close, pd.DataFrame):
+            close = close.squeeze(axis=1)
+        closes[sym] = close
+
+    if not closes:
+        return pd.DataFrame()
+    return pd.DataFrame(closes).dropna().pct_change().dropna()
+
+
+# -----------------------------
+# Helper: Historical tail risk and drawdown of a return series
+# -----------------------------
+def historical_var_cvar(portfolio_returns: np.ndarray, confidence: float = 0.95):
+    return var_cvar_from_sample(portfolio_returns, confidence)
+
+
+def max_drawdown(portfolio_returns: np.ndarray):
+    if portfolio_returns.size == 0:
+        return None
+    cumulative = np.cumprod(1 + portfolio_returns)
+    peak = np.maximum.accumulate(cumulative)
+    return float(((cumulative - peak) / peak).min())
+
+
+# -----------------------------
+# Core: Covariance-based portfolio risk
+# -----------------------------
+def compute_portfolio_risk(returns: pd.DataFrame, weights, confidence: float = 0.95, cov_matrix=None):
+    """
+    Weight-aware portfolio risk from a single covariance matrix.
+
+    returns    : date x symbol daily returns
+    weights    : Series indexed by symbol (or array in column order)
+    cov_matrix : optional precomputed covariance (DataFrame or array); sample covariance otherwise
+
+    Returns a dict with the covariance, correlation, portfolio volatility, marginal /
+    component / percent risk contributions, the weighted return series, VaR, CVaR and max drawdown.
+    """
+    symbols = list(returns.columns)
+    if isinstance(weights, pd.Series):
+        w = weights.reindex(symbols).fillna(0.0).to_numpy(dtype=float)
+    else:
+        w = np.asarray(weights, dtype=float)
+
+    if cov_matrix is None:
+        cov = returns.cov().to_numpy()
+    elif isinstance(cov_matrix, pd.DataFrame):
+        cov = cov_matrix.reindex(index=symbols, columns=symbols).to_numpy(dtype=float)
+    else:
+        cov = np.asarray(cov_matrix, dtype=float)
+
+    # Volatility and risk decomposition: sigma_p = sqrt(w' S w), MRC = S w / sigma_p, CRC = w * MRC
+    sigma_w = cov @ w
+    port_var = float(w @ sigma_w)
+    port_vol = np.sqrt(port_var) if port_var > 0 else 0.0
+    marginal = sigma_w / port_vol if port_vol > 0 else np.zeros_like(w)
+    component = w * marginal
+    percent = component / port_vol if port_vol > 0 else np.zeros_like(w)
+
+    # Correlation from the same matrix
+    corr = covariance_to_correlation(cov)
+
+    # Weighted historical portfolio returns for tail risk and drawdown
+    port_returns = returns.to_numpy(dtype=float) @ w
+    var, cvar = historical_var_cvar(port_returns, confidence)
+
+    return {
+        "symbols": symbols,
+        "weights": pd.Series(w, index=symbols),
+        "covariance": pd.DataFrame(cov, index=symbols, columns=symbols),
+        "correlation": pd.DataFrame(corr, index=symbols, columns=symbols),
+        "volatility": float(port_vol),
+        "averageReturn": float(port_returns.mean()) if port_returns.size else None,
+        "marginalContribution": pd.Series(marginal, index=symbols),
+        "componentContribution": pd.Series(component, index=symbols),
+        "percentContribution": pd.Series(percent, index=symbols),
+        "portfolioReturns": pd.Series(port_returns, index=returns.index),
+        "valueAtRisk": var,
+        "conditionalVaR": cvar,
+        "maxDrawdown": max_drawdown(port_returns),
+    }
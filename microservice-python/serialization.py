@@ -0,0 +1,163 @@
+# serialization.py
+import gzip
+import json
+from datetime import date, datetime
+import numpy as np
+import pandas as pd
+from flask import Response
+
+# Fast encoders are optional: fall back to the standard library when missing
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import pyarrow as pa
+except ImportError:
+    pa = None
+
+JSON = "application/json"
+MSGPACK = "application/msgpack"
+ARROW = "application/vnd.apache.arrow.stream"
+MIN_COMPRESS_BYTES = 1024
+
+
+# ---------------------------
+# NumPy / pandas values
+# ---------------------------
+def encode_matrix(df: pd.DataFrame, decimals: int = None):
+    """
+    Square symbol x symbol matrix as {"symbols": [...], "values": [...]} with values
+    flattened row-major: values[i * n + j] is the (symbols[i], symbols[j]) cell.
+    """
+    values = df.to_numpy(dtype=float)
+    if decimals is not None:
+        values = np.round(values, decimals)
+    return {"symbols": list(df.columns), "values": values.ravel()}
+
+
+def json_default(obj):
+    """Encode the NumPy / pandas / datetime values that appear in reports."""
+    if isinstance(obj, np.generic):
+        return obj.item()
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    if isinstance(obj, pd.DataFrame):
+        return encode_matrix(obj)
+    if isinstance(obj, pd.Series):
+        return obj.to_dict()
+    if isinstance(obj, (pd.Timestamp, datetime, date)):
+        return obj.isoformat()
+    if isinstance(obj, (set, tuple)):
+        return list(obj)
+    raise TypeError(f"Type is not serializable: {type(obj).__name__}")
+
+
+# ---------------------------
+# Encoders
+# ---------------------------
+def dumps_json(obj) -> bytes:
+    """JSON bytes. NaN/inf are emitted as null by orjson."""
+    if orjson is not None:
+        return orjson.dumps(obj, default=json_default,
+                            option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS)
+    return json.dumps(obj, default=json_default).encode("utf-8")
+
+
+def dumps_msgpack(obj) -> bytes:
+    def default(value):
+        if isinstance(value, np.ndarray):
+            return value.tolist()
+        return json_default(value)
+    return msgpack.packb(obj, default=default, use_bin_type=True)
+
+
+def dumps_arrow(obj) -> bytes:
+    """
+    Arrow IPC stream with a single row and one struct column per top-level key.
+    A list of records (e.g. a batch) becomes one row per record.
+    """
+    plain = json.loads(dumps_json(obj))
+    rows = plain if isinstance(plain, list) else [plain]
+    table = pa.Table.from_pylist(rows)
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+ENCODERS = {JSON: dumps_json}
+if msgpack is not None:
+    ENCODERS[MSGPACK] = dumps_msgpack
+    ENCODERS["application/x-msgpack"] = dumps_msgpack
+if pa is not None:
+    ENCODERS[ARROW] = dumps_arrow
+
+
+# ---------------------------
+# Content negotiation
+# ---------------------------
+def negotiate_content_type(accept_header: str) -> str:
+    """Pick the highest-q supported type from Accept; JSON when nothing else matches."""
+    best, best_q = JSON, -1.0
+    for part in (accept_header or "").split(","):
+        fields = part.strip().split(";")
+        media = fields[0].strip().lower()
+        q = 1.0
+        for param in fields[1:]:
+            key, _, value = param.strip().partition("=")
+            if key == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        if media in ENCODERS and q > best_q:
+            best, best_q = media, q
+    return best
+
+
+def negotiate_encoding(accept_encoding: str):
+    tokens = {t.split(";")[0].strip().lower() for t in (accept_encoding or "").split(",")}
+    if "br" in tokens and brotli is not None:
+        return "br"
+    if "gzip" in tokens:
+        return "gzip"
+    return None
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=4)
+    return gzip.compress(body, compresslevel=5)
+
+
+def build_response(payload, status=200, request=None, headers=None) -> Response:
+    """
+    Serialize payload for the client: format by Accept (JSON, MessagePack or Arrow IPC),
+    then brotli/gzip by Accept-Encoding for bodies above MIN_COMPRESS_BYTES.
+    """
+    accept = request.headers.get("Accept") if request is not None else None
+    accept_encoding = request.headers.get("Accept-Encoding") if request is not None else None
+
+    content_type = negotiate_content_type(accept)
+    body = ENCODERS[content_type](payload)
+
+    response_headers = {"Vary": "Accept, Accept-Encoding"}
+    encoding = negotiate_encoding(accept_encoding)
+    if encoding and len(body) >= MIN_COMPRESS_BYTES:
+        body = compress(body, encoding)
+        response_headers["Content-Encoding"] = encoding
+    response_headers.update(headers or {})
+
+    return Response(body, status=status, content_type=content_type, headers=response_headers)
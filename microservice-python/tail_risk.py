@@ -0,0 +1,176 @@
+# tail_risk.py
+import numpy as np
+import pandas as pd
+from scipy.signal import lfilter
+from scipy.stats import norm
+
+TAIL_METHODS = ("historical", "parametric", "cornishFisher", "filteredHistorical", "blockBootstrap")
+DEFAULT_CONFIDENCES = (0.95, 0.99)
+DEFAULT_HORIZONS = (1, 10)
+EWMA_LAMBDA = 0.94
+SIMULATED_PATHS = 10000
+BLOCK_LENGTH = 5
+
+# Sign convention (same as the rest of the risk layer): VaR is the (1 - c) quantile of the
+# return distribution and CVaR the mean return beyond it, so both are negative for losses.
+
+
+# -----------------------------
+# Helper: VaR/CVaR of a sample (one np.partition per confidence level)
+# -----------------------------
+def var_cvar_from_sample(sample: np.ndarray, confidence: float = 0.95):
+    sample = np.asarray(sample, dtype=float)
+    sample = sample[np.isfinite(sample)]
+    if sample.size == 0:
+        return None, None
+    k = int(np.floor((1 - confidence) * (sample.size - 1)))
+    partitioned = np.partition(sample, k)
+    var = partitioned[k]
+    return float(var), float(partitioned[:k + 1].mean())
+
+
+def _horizon_returns(portfolio_returns: np.ndarray, horizon: int) -> np.ndarray:
+    """Overlapping compounded h-day returns from daily returns via a cumulative log sum."""
+    if horizon == 1:
+        return portfolio_returns
+    log_cum = np.concatenate([[0.0], np.cumsum(np.log1p(portfolio_returns))])
+    return np.expm1(log_cum[horizon:] - log_cum[:-horizon])
+
+
+def _moments(portfolio_returns: np.ndarray):
+    mu = portfolio_returns.mean()
+    sigma = portfolio_returns.std(ddof=1)
+    centered = (portfolio_returns - mu) / sigma if sigma > 0 else np.zeros_like(portfolio_returns)
+    skew = float(np.mean(centered ** 3))
+    excess_kurt = float(np.mean(centered ** 4) - 3.0)
+    return float(mu), float(sigma), skew, excess_kurt
+
+
+def _cornish_fisher_z(z, skew, excess_kurt):
+    return (z
+            + (z ** 2 - 1) * skew / 6
+            + (z ** 3 - 3 * z) * excess_kurt / 24
+            - (2 * z ** 3 - 5 * z) * skew ** 2 / 36)
+
+
+# -----------------------------
+# Methods: each returns {confidence: (var, cvar)} for one horizon
+# -----------------------------
+def historical(portfolio_returns, horizon, confidences):
+    sample = _horizon_returns(portfolio_returns, horizon)
+    return {c: var_cvar_from_sample(sample, c) for c in confidences}
+
+
+def parametric(mu, sigma, horizon, confidences):
+    """Gaussian with square-root-of-time scaling."""
+    mu_h, sigma_h = mu * horizon, sigma * np.sqrt(horizon)
+    out = {}
+    for c in confidences:
+        z = norm.ppf(1 - c)
+        out[c] = (mu_h + z * sigma_h, mu_h - sigma_h * norm.pdf(z) / (1 - c))
+    return out
+
+
+def cornish_fisher(mu, sigma, skew, excess_kurt, horizon, confidences, grid=256):
+    """
+    Gaussian quantile corrected for skew and excess kurtosis (scaled to the horizon);
+    CVaR averages the corrected quantile over the tail on a fixed probability grid.
+    """
+    mu_h, sigma_h = mu * horizon, sigma * np.sqrt(horizon)
+    skew_h, kurt_h = skew / np.sqrt(horizon), excess_kurt / horizon
+    out = {}
+    for c in confidences:
+        z = norm.ppf(1 - c)
+        var = mu_h + _cornish_fisher_z(z, skew_h, kurt_h) * sigma_h
+        tail_p = (np.arange(grid) + 0.5) / grid * (1 - c)
+        tail_q = mu_h + _cornish_fisher_z(norm.ppf(tail_p), skew_h, kurt_h) * sigma_h
+        out[c] = (float(var), float(tail_q.mean()))
+    return out
+
+
+def filtered_historical(portfolio_returns, horizon, confidences, rng, lam=EWMA_LAMBDA, paths=SIMULATED_PATHS):
+    """
+    Filtered historical simulation: standardise returns by their EWMA volatility, then
+    rescale bootstrapped residuals by the one-step-ahead volatility forecast.
+    """
+    r = portfolio_returns
+    # EWMA variance recursion var_{t+1} = lam var_t + (1 - lam) r_t^2 as a linear filter, seeded with the sample variance
+    seed_var = r.var()
+    updated = lfilter([1 - lam], [1, -lam], r ** 2, zi=[lam * seed_var])[0]
+    var_path = np.concatenate([[seed_var], updated[:-1]])
+    residuals = r / np.sqrt(np.clip(var_path, 1e-18, None))
+    sigma_next = np.sqrt(updated[-1])
+
+    draws = residuals[rng.integers(0, len(residuals), size=(paths, horizon))] * sigma_next
+    sample = np.expm1(np.log1p(draws).sum(axis=1))
+    return {c: var_cvar_from_sample(sample, c) for c in confidences}
+
+
+def block_bootstrap(portfolio_returns, horizon, confidences, rng, block=BLOCK_LENGTH, paths=SIMULATED_PATHS):
+    """Moving-block bootstrap of h-day paths, preserving short-range autocorrelation."""
+    r = portfolio_returns
+    block = max(1, min(block, len(r)))
+    n_blocks = int(np.ceil(horizon / block))
+    starts = rng.integers(0, len(r) - block + 1, size=(paths, n_blocks))
+    idx = (starts[:, :, None] + np.arange(block)).reshape(paths, -1)[:, :horizon]
+    sample = np.expm1(np.log1p(r[idx]).sum(axis=1))
+    return {c: var_cvar_from_sample(sample, c) for c in confidences}
+
+
+# -----------------------------
+# Entry point
+# -----------------------------
+def compute_tail_risk(returns: pd.DataFrame, weights, confidences=DEFAULT_CONFIDENCES, horizons=DEFAULT_HORIZONS,
+                      methods=TAIL_METHODS, cov_matrix=None, seed=None, decimals=6):
+    """
+    VaR / CVaR of the weighted portfolio for every method x horizon x confidence level.
+
+    returns    : date x symbol daily returns
+    weights    : Series by symbol or array in column order (actual holding weights)
+    cov_matrix : optional shared covariance for the parametric methods' volatility
+
+    Output: {method: {"1d": {"95": {"valueAtRisk": v, "conditionalVaR": cv}, ...}, ...}}
+    """
+    symbols = list(returns.columns)
+    if isinstance(weights, pd.Series):
+        w = weights.reindex(symbols).fillna(0.0).to_numpy(dtype=float)
+    else:
+        w = np.asarray(weights, dtype=float)
+
+    portfolio_returns = returns.to_numpy(dtype=float) @ w
+    if portfolio_returns.size < 2:
+        return {}
+
+    mu, sigma, skew, excess_kurt = _moments(portfolio_returns)
+    if cov_matrix is not None:
+        cov = cov_matrix.reindex(index=symbols, columns=symbols).to_numpy(dtype=float) \
+            if isinstance(cov_matrix, pd.DataFrame) else np.asarray(cov_matrix, dtype=float)
+        sigma = float(np.sqrt(max(w @ cov @ w, 0.0)))
+
+    rng = np.random.default_rng(seed)
+    result = {}
+    for method in methods:
+        per_horizon = {}
+        for h in horizons:
+            if method == "historical":
+                values = historical(portfolio_returns, h, confidences)
+            elif method == "parametric":
+                values = parametric(mu, sigma, h, confidences)
+            elif method == "cornishFisher":
+                values = cornish_fisher(mu, sigma, skew, excess_kurt, h, confidences)
+            elif method == "filteredHistorical":
+                values = filtered_historical(portfolio_returns, h, confidences, rng)
+            elif method == "blockBootstrap":
+                values = block_bootstrap(portfolio_returns, h, confidences, rng)
+            else:
+                raise ValueError(f"Unknown tail-risk method '{method}'. Use one of {TAIL_METHODS}.")
+
+            per_horizon[f"{h}d"] = {
+                f"{int(round(c * 100))}": {
+                    "valueAtRisk": None if var is None else round(float(var), decimals),
+                    "conditionalVaR": None if cvar is None else round(float(cvar), decimals),
+                }
+                for c, (var, cvar) in values.items()
+            }
+        result[method] = per_horizon
+    return result
@@ -0,0 +1,236 @@
+"""
+Cross-sectional backtest of the Top Picks multi-factor score.
+
+    python top_picks/factor_backtest.py --panel prices.parquet --lookback 126 --top-k 5
+    python top_picks/factor_backtest.py --period 5y --weights 0.4,0.2,0.2,0.1,0.1 --out bt.json
+
+At every rebalance date the five compute_scores() factors are recomputed for the whole
+universe from cumulative sums over the price panel (no per-date call to compute_scores),
+min-max normalised, blended with the given weights, and the top-K names are held
+equal-weighted until the next rebalance.
+"""
+import os
+import sys
+import json
+import argparse
+import numpy as np
+import pandas as pd
+
+# Allow running as a script (python top_picks/factor_backtest.py) as well as a package import
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from market_data import get_provider
+
+FACTORS = ("momentum", "sharpe", "recent", "winRate", "drawdown")
+DEFAULT_WEIGHTS = {"momentum": 0.30, "sharpe": 0.25, "recent": 0.20, "winRate": 0.15, "drawdown": 0.10}
+RISK_FREE_DAILY = 0.06 / 252
+TRADING_DAYS = 252
+
+
+# ---------------------------
+# Price panel
+# ---------------------------
+def load_price_panel(path):
+    """Wide date x symbol close prices from a .parquet or .csv file (first column = date)."""
+    if path.endswith(".parquet"):
+        panel = pd.read_parquet(path)
+    else:
+        panel = pd.read_csv(path, index_col=0)
+    panel.index = pd.to_datetime(panel.index)
+    return panel.sort_index().astype(float)
+
+
+def fetch_price_panel(symbols, period="5y"):
+    """Close prices for `symbols` from the configured market-data provider."""
+    data = get_provider().bulk_history(list(symbols), period=period, interval="1d")
+    if isinstance(data.columns, pd.MultiIndex):
+        level = "Adj Close" if "Adj Close" in data.columns.get_level_values(1) else "Close"
+        data = data.xs(level, axis=1, level=1)
+    return data.sort_index().astype(float)
+
+
+# ---------------------------
+# Factors at rebalance dates
+# ---------------------------
+def _window_sums(cum, ends, length):
+    """Sum over rows (end - length, end] for every end index, from a leading-zero cumulative sum."""
+    return cum[ends + 1] - cum[ends + 1 - length]
+
+
+def factor_scores(prices: np.ndarray, ends: np.ndarray, lookback: int, weights=None, min_coverage=0.8):
+    """
+    Composite scores (len(ends) x N) with the same definitions as compute_scores() on the
+    window prices[end - lookback + 1 : end + 1]. NaN where a symbol is not eligible.
+    """
+    weights = {**DEFAULT_WEIGHTS, **(weights or {})}
+    t, n = prices.shape
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rets = prices[1:] / prices[:-1] - 1
+    valid = np.isfinite(rets)
+    r0 = np.where(valid, rets, 0.0)
+
+    def cum(x):
+        return np.vstack([np.zeros((1, n)), np.cumsum(x, axis=0)])
+
+    # Returns inside the window are rows end-lookback+1 .. end-1 of `rets` (lookback - 1 of them)
+    count = _window_sums(cum(valid.astype(float)), ends - 1, lookback - 1)
+    total = _window_sums(cum(r0), ends - 1, lookback - 1)
+    total_sq = _window_sums(cum(r0 ** 2), ends - 1, lookback - 1)
+    wins = _window_sums(cum((r0 > 0).astype(float)), ends - 1, lookback - 1)
+
+    first = prices[ends - lookback + 1]
+    last = prices[ends]
+    recent_window = max(5, lookback // 5)
+    recent_start = prices[ends - recent_window + 1]
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        mean = total / count
+        vol = np.sqrt(np.maximum(total_sq - count * mean ** 2, 0.0) / (count - 1))
+        factors = {
+            "momentum": last / first - 1,
+            "sharpe": (mean - RISK_FREE_DAILY) / (vol + 1e-10),
+            "winRate": wins / count,
+            "recent": last / recent_start - 1,
+        }
+
+    # Max drawdown needs the path: one running-max pass over each window
+    # (compute_scores starts the cumulative curve after the first return, so the first price is skipped)
+    drawdown = np.full((len(ends), n), np.nan)
+    for i, end in enumerate(ends):
+        window = prices[end - lookback + 2:end + 1]
+        peak = np.fmax.accumulate(window, axis=0)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            dd = np.where(np.isfinite(window), window / peak - 1, np.inf).min(axis=0)
+        drawdown[i] = np.where(np.isfinite(dd), 1 + dd, np.nan)
+    factors["drawdown"] = drawdown
+
+    eligible = (np.isfinite(first) & np.isfinite(last) & (first != 0)
+                & (count >= min_coverage * (lookback - 1)))
+
+    score = np.zeros((len(ends), n))
+    for name in FACTORS:
+        values = np.where(eligible & np.isfinite(factors[name]), factors[name], np.nan)
+        with np.errstate(invalid="ignore"):
+            lo = np.nanmin(values, axis=1, keepdims=True)
+            hi = np.nanmax(values, axis=1, keepdims=True)
+            spread = hi - lo
+            normalised = np.where(spread > 0, (values - lo) / np.where(spread > 0, spread, 1), 0.5)
+        score += weights[name] * normalised
+    return np.where(eligible, score, np.nan)
+
+
+# ---------------------------
+# Backtest
+# ---------------------------
+def run_factor_backtest(panel: pd.DataFrame, lookback=126, rebalance_every=21, top_k=5, weights=None,
+                        cost_bps=10.0):
+    """
+    Walk the panel, pick the top_k scores at every rebalance date and hold them
+    equal-weighted to the next one. Returns performance, turnover and the picks.
+    """
+    prices = panel.ffill().to_numpy(dtype=float)
+    observed = panel.notna().to_numpy()
+    raw = np.where(observed, prices, np.nan)
+    symbols = np.asarray(panel.columns)
+    dates = panel.index
+
+    ends = np.arange(lookback, len(panel) - 1, rebalance_every)
+    if ends.size == 0:
+        raise ValueError(f"Panel has {len(panel)} rows; need more than lookback={lookback}.")
+    scores = factor_scores(raw, ends, lookback, weights)
+
+    # Holding-period returns for every symbol between consecutive rebalance dates
+    exits = np.append(ends[1:], len(panel) - 1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        period_returns = np.nan_to_num(prices[exits] / prices[ends] - 1, nan=0.0, posinf=0.0, neginf=0.0)
+
+    k = min(top_k, symbols.size)
+    ranked = np.where(np.isfinite(scores), scores, -np.inf)
+    picks = np.argpartition(-ranked, k - 1, axis=1)[:, :k]
+    picks = np.take_along_axis(picks, np.argsort(-np.take_along_axis(ranked, picks, axis=1), axis=1), axis=1)
+    picked_ok = np.isfinite(np.take_along_axis(ranked, picks, axis=1))
+
+    target = np.zeros_like(scores)
+    rows = np.repeat(np.arange(len(ends)), k)
+    target[rows, picks.ravel()] = picked_ok.ravel()
+    target /= np.maximum(target.sum(axis=1, keepdims=True), 1)
+
+    gross = (target * period_returns).sum(axis=1)
+    drifted = target * (1 + period_returns)
+    drifted /= np.maximum(drifted.sum(axis=1, keepdims=True), 1e-12)
+    previous = np.vstack([np.zeros((1, target.shape[1])), drifted[:-1]])
+    turnover = 0.5 * np.abs(target - previous).sum(axis=1)
+    net = gross - turnover * cost_bps / 10000
+
+    eligible_now = np.isfinite(scores)
+    universe = np.where(eligible_now, period_returns, 0).sum(axis=1) / np.maximum(eligible_now.sum(axis=1), 1)
+
+    periods_per_year = TRADING_DAYS / rebalance_every
+    equity = np.cumprod(1 + net)
+    years = len(net) / periods_per_year
+
+    def stats(series):
+        curve = np.cumprod(1 + series)
+        peak = np.maximum.accumulate(curve)
+        vol = float(series.std(ddof=1) * np.sqrt(periods_per_year)) if len(series) > 1 else None
+        ann = float(curve[-1] ** (1 / years) - 1) if years > 0 else None
+        return {
+            "totalReturn": round(float(curve[-1] - 1), 6),
+            "annualizedReturn": round(ann, 6) if ann is not None else None,
+            "annualizedVolatility": round(vol, 6) if vol else None,
+            "sharpeRatio": round(float(series.mean() * periods_per_year / vol), 4) if vol else None,
+            "maxDrawdown": round(float((curve / peak - 1).min()), 6),
+        }
+
+    return {
+        "config": {
+            "symbols": int(symbols.size), "start": str(dates[0].date()), "end": str(dates[-1].date()),
+            "lookback": lookback, "rebalanceEvery": rebalance_every, "topK": k, "costBps": cost_bps,
+            "weights": {**DEFAULT_WEIGHTS, **(weights or {})},
+        },
+        "strategy": {**stats(net), "averageTurnover": round(float(turnover[1:].mean()), 4) if len(turnover) > 1 else None,
+                     "hitRateVsUniverse": round(float((net > universe).mean()), 4)},
+        "universe": stats(universe),
+        "equityCurve": {"dates": [str(dates[e].date()) for e in exits], "values": np.round(equity, 6)},
+        "picks": [
+            {"date": str(dates[e].date()), "symbols": symbols[p[ok]].tolist(), "turnover": round(float(tv), 4)}
+            for e, p, ok, tv in zip(ends, picks, picked_ok, turnover)
+        ],
+    }
+
+
+def parse_weights(text):
+    values = [float(v) for v in text.split(",")]
+    if len(values) != len(FACTORS):
+        raise ValueError(f"Expected {len(FACTORS)} weights in the order {FACTORS}")
+    return dict(zip(FACTORS, values))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Backtest the Top Picks factor blend.")
+    parser.add_argument("--panel", help="Wide date x symbol close prices (.parquet or .csv)")
+    parser.add_argument("--symbols-file", default=os.path.normpath(os.path.join(os.path.dirname(__file__), "../utils/nse_symbols.csv")))
+    parser.add_argument("--period", default="5y", help="History to fetch when no --panel is given")
+    parser.add_argument("--lookback", type=int, default=126, help="22 / 66 / 126 match the 1M / 3M / 6M picks")
+    parser.add_argument("--rebalance-every", type=int, default=21)
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--weights", type=parse_weights, default=None, help=f"Comma-separated, order {FACTORS}")
+    parser.add_argument("--cost-bps", type=float, default=10.0)
+    parser.add_argument("--out")
+    args = parser.parse_args()
+
+    if args.panel:
+        panel = load_price_panel(args.panel)
+    else:
+        symbols = [f"{s}.NS" for s in pd.read_csv(args.symbols_file)["SYMBOL"].dropna().unique()]
+        panel = fetch_price_panel(symbols, args.period)
+
+    result = run_factor_backtest(panel, args.lookback, args.rebalance_every, args.top_k, args.weights, args.cost_bps)
+    output = json.dumps(result, indent=2, default=lambda o: o.tolist())
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(output)
+    print(json.dumps({k: result[k] for k in ("config", "strategy", "universe")}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,16 @@
-import yfinance as yf
 import pandas as pd
 import psycopg2
 import time
+import sys
 from dotenv import load_dotenv
 import os
 
+# Allow running as a script (python top_picks/top_picks.py) as well as a package import
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from market_data import get_provider
+from utils.universe import build_universe, load_universe, demote_symbols
+from price_panel import publish_panel, attach as attach_price_panel
+
 load_dotenv()
 
 DB_CONFIG = {
@@ -19,17 +25,40 @@ CHECK_FILE = os.path.join(BASE_DIR, "../utils/nse_symbols.csv")
 CHECK_FILE = os.path.normpath(CHECK_FILE)
 CSV_PATH = CHECK_FILE
 BATCH_SIZE = 150  # fetch in batches to avoid rate limit
+HISTORY_PERIOD = "1y"  # the published price panel also serves the 1Y portfolio analytics
+SIX_MONTH_BARS = 126
+BENCHMARK_SYMBOL = "^NSEI"
+
+# Liquidity prefilter applied before scoring (traded value in INR)
+MIN_TRADED_VALUE = float(os.getenv("TOP_PICKS_MIN_TRADED_VALUE", 1e7))
+MIN_PRICE = float(os.getenv("TOP_PICKS_MIN_PRICE", 10))
+LIQUIDITY_WINDOW = int(os.getenv("TOP_PICKS_LIQUIDITY_WINDOW", 66))
 
 
 def get_all_tickers():
+    """
+    Latest validated universe (expired validation entries are refreshed first);
+    falls back to the raw symbol list when no universe can be built.
+    """
+    try:
+        build_universe()
+        tickers = load_universe()
+        if tickers:
+            return tickers
+    except Exception as e:
+        print(f"[Universe Warning] Falling back to {CSV_PATH}: {e}")
     df = pd.read_csv(CSV_PATH)
     tickers = [f"{s}.NS" for s in df["SYMBOL"].dropna().unique()]
     return tickers
 
 
 def fetch_batch(tickers):
+    """
+    Close and Volume panels (date x symbol, same shape) for one batch.
+    Volume is kept as float32: it only feeds the liquidity filter.
+    """
     print(f"Fetching {len(tickers)} tickers...")
-    data = yf.download(tickers, period="6mo", interval="1d", group_by="ticker", auto_adjust=True, progress=False)
+    data = get_provider().bulk_history(tickers, period=HISTORY_PERIOD, interval="1d")
 
     print(f"  Downloaded data shape: {data.shape}")
     print(f"  Column structure: {type(data.columns)}")
@@ -37,23 +66,42 @@ def fetch_batch(tickers):
     # Handle multi-index or flat columns
     if isinstance(data.columns, pd.MultiIndex):
         print(f"  Multi-index columns. Levels: {data.columns.names}")
-        if ("Adj Close" in data.columns.get_level_values(1)):
-            data = data.xs("Adj Close", axis=1, level=1)
-        elif ("Close" in data.columns.get_level_values(1)):
-            data = data.xs("Close", axis=1, level=1)
+        fields = data.columns.get_level_values(1)
+        if ("Adj Close" in fields):
+            closes = data.xs("Adj Close", axis=1, level=1)
+        elif ("Close" in fields):
+            closes = data.xs("Close", axis=1, level=1)
         else:
             raise ValueError(f"Neither 'Adj Close' nor 'Close' found in columns: {data.columns}")
-    elif "Adj Close" in data.columns:
-        data = data["Adj Close"]
-    elif "Close" in data.columns:
-        data = data["Close"]
+        volumes = data.xs("Volume", axis=1, level=1) if "Volume" in fields else None
+    elif "Adj Close" in data.columns or "Close" in data.columns:
+        closes = data[["Adj Close" if "Adj Close" in data.columns else "Close"]]
+        closes.columns = tickers[:1]
+        volumes = data[["Volume"]].set_axis(tickers[:1], axis=1) if "Volume" in data.columns else None
     else:
         raise ValueError(f"Unexpected columns: {data.columns}")
 
-    print(f"  After extraction: {data.shape}")
-    print(f"  Non-null columns: {data.notna().any().sum()}")
+    if volumes is None:
+        print("  [Warning] No Volume in download; liquidity filter will drop this batch")
+        volumes = pd.DataFrame(index=closes.index, columns=closes.columns)
+    volumes = volumes.reindex(index=closes.index, columns=closes.columns).astype("float32")
 
-    return data
+    print(f"  After extraction: {closes.shape}")
+    print(f"  Non-null columns: {closes.notna().any().sum()}")
+
+    return closes, volumes
+
+
+def liquid_symbols(closes, volumes, window=LIQUIDITY_WINDOW, min_traded_value=MIN_TRADED_VALUE,
+                   min_price=MIN_PRICE):
+    """
+    Symbols whose median daily traded value (close x volume) over the last `window`
+    bars is at least `min_traded_value` and whose last close is at least `min_price`.
+    """
+    traded_value = (closes.tail(window) * volumes.tail(window)).median(skipna=True)
+    last_price = closes.ffill().iloc[-1] if not closes.empty else pd.Series(dtype=float)
+    mask = (traded_value >= min_traded_value) & (last_price.reindex(traded_value.index) >= min_price)
+    return traded_value.index[mask.fillna(False)].tolist()
 
 
 def compute_scores(df):
@@ -177,7 +225,7 @@ def fetch_metadata(symbols):
     meta = {}
     for sym in symbols:
         try:
-            info = yf.Ticker(sym).info
+            info = get_provider().fundamentals(sym)
             meta[sym] = {
                 "company_name": info.get("longName", "N/A"),
                 "sector": info.get("sector", "N/A")
@@ -245,27 +293,59 @@ def execute_picks():
     tickers = get_all_tickers()
     print(f"Total tickers to fetch: {len(tickers)}")
     conn = psycopg2.connect(**DB_CONFIG)
-    all_data = pd.DataFrame()
+    frames = []
+    liquid = []
+    all_nan = []
+    downloaded = 0
 
-    # Fetch in batches
+    # Fetch in batches (closes kept as float32 for the shared panel; volume only feeds the filter)
     for i in range(0, len(tickers), BATCH_SIZE):
         batch = tickers[i:i+BATCH_SIZE]
         try:
-            df = fetch_batch(batch)
-            all_data = pd.concat([all_data, df], axis=1)
-            print(f"Batch {i//BATCH_SIZE + 1}: Fetched {len(df.columns)} symbols, total so far: {len(all_data.columns)}")
+            closes, volumes = fetch_batch(batch)
+            downloaded += len(closes.columns)
+            all_nan.extend(s for s in batch if s not in closes.columns or closes[s].isna().all())
+            batch_liquid = liquid_symbols(closes, volumes)
+            liquid.extend(batch_liquid)
+            frames.append(closes.astype("float32"))
+            print(f"Batch {i//BATCH_SIZE + 1}: Fetched {len(closes.columns)} symbols, "
+                  f"{len(batch_liquid)} pass the liquidity filter")
         except Exception as e:
             print(f"Batch {i} failed: {e}")
         time.sleep(2)
 
-    print(f"\nTotal data collected: {all_data.shape[0]} rows x {all_data.shape[1]} columns")
+    all_closes = pd.concat(frames, axis=1) if frames else pd.DataFrame()
+    del frames
+
+    # Publish the universe panel for every worker process, then score from a slice of it
+    all_data = all_closes[liquid] if not all_closes.empty else all_closes
+    if not all_closes.empty:
+        try:
+            first, last = all_closes.index[0], all_closes.index[-1] + pd.Timedelta(days=1)
+            benchmark = get_provider().history(BENCHMARK_SYMBOL, str(first.date()), str(last.date()))
+            if "Close" in benchmark.columns:
+                benchmark_close = benchmark["Close"].reindex(all_closes.index).astype("float32")
+                all_closes = pd.concat([all_closes, benchmark_close.rename(BENCHMARK_SYMBOL)], axis=1)
+            publish_panel(all_closes)
+            panel = attach_price_panel()
+            if panel is not None:
+                all_data = panel.frame(liquid)
+        except Exception as e:
+            print(f"[Panel Warning] Publishing the price panel failed: {e}")
+        del all_closes
+    print(f"\nTotal data collected: {all_data.shape[0]} rows x {all_data.shape[1]} columns "
+          f"({downloaded} downloaded; min traded value {MIN_TRADED_VALUE:,.0f}, min price {MIN_PRICE:g})")
     if not all_data.empty:
         print(f"Date range: {all_data.index[0]} to {all_data.index[-1]}")
 
+    # Symbols from successful batches that came back empty / all-NaN leave the universe
+    if all_nan and downloaded:
+        demote_symbols(all_nan, reason="allNaN")
+
     # Derive sub-periods
     one_month = all_data.tail(22)
     three_month = all_data.tail(66)
-    six_month = all_data
+    six_month = all_data.tail(SIX_MONTH_BARS)
 
     print(f"\nPeriod data shapes:")
     print(f"1 Month: {one_month.shape[0]} rows x {one_month.shape[1]} columns")
@@ -0,0 +1,113 @@
+# trading_calendar.py
+"""
+NSE trading calendar: weekdays minus the exchange holidays listed in
+utils/nse_holidays.csv (NSE_HOLIDAYS_FILE overrides; refresh it from NSE's yearly
+holiday circular). Sessions run 09:15-15:30 IST.
+
+The "last completed session" is today once the close has passed on a trading day, else
+the previous trading day. Daily-bar windows and cache keys are anchored to it, so they
+only change when a new bar can exist — not at midnight, on weekends or on holidays.
+"""
+import os
+import threading
+from datetime import datetime, date, timedelta, time as dtime
+from zoneinfo import ZoneInfo
+import pandas as pd
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+HOLIDAYS_FILE = os.getenv("NSE_HOLIDAYS_FILE", os.path.join(BASE_DIR, "utils", "nse_holidays.csv"))
+
+MARKET_TZ = ZoneInfo("Asia/Kolkata")
+SESSION_OPEN = dtime(9, 15)
+SESSION_CLOSE = dtime(15, 30)
+
+_lock = threading.Lock()
+_holidays = None
+_years = frozenset()      # years with at least one listed holiday
+_warned_years = set()
+
+
+def holidays():
+    """
+    Exchange holidays as a frozenset of dates (loaded once; empty if the file is missing).
+    Warns once per year when the current year has no rows: the file has not been refreshed
+    and every weekday of that year is treated as a trading day.
+    """
+    global _holidays, _years
+    with _lock:
+        if _holidays is None:
+            try:
+                df = pd.read_csv(HOLIDAYS_FILE)
+                _holidays = frozenset(pd.to_datetime(df["DATE"]).dt.date)
+            except Exception as e:
+                print(f"[Calendar Warning] Could not load NSE holidays from {HOLIDAYS_FILE}: {e}")
+                _holidays = frozenset()
+            _years = frozenset(d.year for d in _holidays)
+        year = datetime.now(MARKET_TZ).year
+        if year not in _years and year not in _warned_years:
+            _warned_years.add(year)
+            print(f"[Calendar Warning] {HOLIDAYS_FILE} lists no holidays for {year}; "
+                  f"treating every weekday as a trading day until it is refreshed.")
+        return _holidays
+
+
+# ---------------------------
+# Days
+# ---------------------------
+def is_trading_day(day: date) -> bool:
+    return day.weekday() < 5 and day not in holidays()
+
+
+def previous_trading_day(day: date) -> date:
+    """The last trading day strictly before `day`."""
+    day -= timedelta(days=1)
+    while not is_trading_day(day):
+        day -= timedelta(days=1)
+    return day
+
+
+def next_trading_day(day: date) -> date:
+    """The first trading day strictly after `day`."""
+    day += timedelta(days=1)
+    while not is_trading_day(day):
+        day += timedelta(days=1)
+    return day
+
+
+# ---------------------------
+# Sessions
+# ---------------------------
+def market_now(now=None) -> datetime:
+    """`now` (default: the current time) in IST; naive datetimes are taken as local time."""
+    return (now or datetime.now(MARKET_TZ)).astimezone(MARKET_TZ)
+
+
+def in_session(now=None) -> bool:
+    now = market_now(now)
+    return is_trading_day(now.date()) and SESSION_OPEN <= now.time() < SESSION_CLOSE
+
+
+def last_completed_session(now=None) -> date:
+    """Date of the latest session whose daily bar is final."""
+    now = market_now(now)
+    if is_trading_day(now.date()) and now.time() >= SESSION_CLOSE:
+        return now.date()
+    return previous_trading_day(now.date())
+
+
+def session_close(day: date) -> datetime:
+    return datetime.combine(day, SESSION_CLOSE, tzinfo=MARKET_TZ)
+
+
+def covers_last_session(created_at: datetime, now=None) -> bool:
+    """True when something built at `created_at` already saw the last completed session's close."""
+    return market_now(created_at) >= session_close(last_completed_session(now))
+
+
+def session_window(days=365, now=None):
+    """
+    (start, end) date strings of a `days`-long daily-bar window ending with the last
+    completed session; end is exclusive, like the providers' history().
+    """
+    end = last_completed_session(now) + timedelta(days=1)
+    return str(end - timedelta(days=days)), str(end)
@@ -0,0 +1,231 @@
+"""
+Tradable NSE universe: which symbols are worth downloading every night.
+
+    python utils/universe.py            # validate expired entries, write a new universe version
+    python utils/universe.py --force    # revalidate everything
+
+Symbols are validated in batches through one multi-ticker history download per batch
+(a few concurrent batches under a rate limit). Results are cached per symbol with a TTL,
+and every build writes a versioned universe file plus a manifest pointing at the latest one.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+import pandas as pd
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from market_data import get_provider
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SYMBOLS_CSV = os.path.join(BASE_DIR, "utils", "nse_symbols.csv")
+UNIVERSE_DIR = os.getenv("UNIVERSE_DIR", os.path.join(BASE_DIR, "analytics_store", "universe"))
+VALID_TTL_DAYS = float(os.getenv("UNIVERSE_VALID_TTL_DAYS", 7))
+INVALID_TTL_DAYS = float(os.getenv("UNIVERSE_INVALID_TTL_DAYS", 14))
+BATCH_SIZE = int(os.getenv("UNIVERSE_BATCH_SIZE", 100))
+WORKERS = int(os.getenv("UNIVERSE_WORKERS", 4))
+MIN_BATCH_INTERVAL_SECONDS = float(os.getenv("UNIVERSE_MIN_BATCH_INTERVAL_SECONDS", 1.0))
+MIN_BARS = 5            # recent bars with a close required to count as tradable
+STALE_AFTER_DAYS = 10   # last close older than this (vs. the batch's latest date) = not trading
+
+_lock = threading.Lock()
+
+
+# ---------------------------
+# Paths / store I/O
+# ---------------------------
+def _cache_path():
+    return os.path.join(UNIVERSE_DIR, "validation_cache.json")
+
+
+def _manifest_path():
+    return os.path.join(UNIVERSE_DIR, "manifest.json")
+
+
+def _atomic_write_json(path, payload):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(payload, f, indent=1)
+    os.replace(tmp, path)
+
+
+def _read_json(path, default):
+    if not os.path.exists(path):
+        return default
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except Exception as e:
+        print(f"[Universe Warning] Could not read {path}: {e}")
+        return default
+
+
+def candidate_symbols(csv_path=SYMBOLS_CSV):
+    df = pd.read_csv(csv_path)
+    return [f"{s}.NS" for s in df["SYMBOL"].dropna().unique()]
+
+
+# ---------------------------
+# Validation
+# ---------------------------
+class _RateLimiter:
+    """At most one call start per `interval` seconds across threads."""
+
+    def __init__(self, interval):
+        self.interval = interval
+        self._next = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self):
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next)
+            self._next = start + self.interval
+        if start > now:
+            time.sleep(start - now)
+
+
+def validate_batch(symbols, limiter=None):
+    """
+    One multi-ticker download for `symbols`. Returns {symbol: (valid, reason)};
+    an empty dict when the download itself failed (results unknown, keep the cache).
+    """
+    if limiter is not None:
+        limiter.wait()
+    try:
+        data = get_provider().bulk_history(list(symbols), period="1mo", interval="1d")
+    except Exception as e:
+        print(f"[Universe Warning] Batch of {len(symbols)} failed: {e}")
+        return {}
+
+    if data is None or data.empty:
+        return {sym: (False, "noData") for sym in symbols}
+    if isinstance(data.columns, pd.MultiIndex):
+        closes = data.xs("Close", axis=1, level=1) if "Close" in data.columns.get_level_values(1) else pd.DataFrame()
+    else:
+        closes = data[["Close"]].rename(columns={"Close": symbols[0]}) if len(symbols) == 1 else pd.DataFrame()
+
+    latest = closes.index.max() if not closes.empty else None
+    results = {}
+    for sym in symbols:
+        if sym not in closes.columns:
+            results[sym] = (False, "noData")
+            continue
+        series = closes[sym].dropna()
+        if len(series) < MIN_BARS:
+            results[sym] = (False, "tooFewBars")
+        elif latest is not None and series.index[-1] < latest - pd.Timedelta(days=STALE_AFTER_DAYS):
+            results[sym] = (False, "stale")
+        else:
+            results[sym] = (True, "ok")
+    return results
+
+
+def _expired(entry, now):
+    ttl = VALID_TTL_DAYS if entry["valid"] else INVALID_TTL_DAYS
+    return now - datetime.fromisoformat(entry["checkedAt"]) > timedelta(days=ttl)
+
+
+def build_universe(symbols=None, force=False, workers=WORKERS, batch_size=BATCH_SIZE):
+    """
+    Revalidate symbols whose cache entry is missing or expired (all of them with force),
+    then write a new universe version. Returns the manifest.
+    """
+    symbols = list(dict.fromkeys(symbols or candidate_symbols()))
+    cache = _read_json(_cache_path(), {})
+    now = datetime.now()
+
+    todo = [s for s in symbols if force or s not in cache or _expired(cache[s], now)]
+    print(f"[Universe] {len(symbols)} candidates, {len(todo)} to validate.")
+
+    limiter = _RateLimiter(MIN_BATCH_INTERVAL_SECONDS)
+    batches = [todo[i:i + batch_size] for i in range(0, len(todo), batch_size)]
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        for results in pool.map(lambda b: validate_batch(b, limiter), batches):
+            checked_at = datetime.now().isoformat()
+            for sym, (valid, reason) in results.items():
+                cache[sym] = {"valid": valid, "reason": reason, "checkedAt": checked_at}
+
+    with _lock:
+        _atomic_write_json(_cache_path(), cache)
+
+    valid = [s for s in symbols if cache.get(s, {}).get("valid")]
+    if valid == load_universe():
+        return _read_json(_manifest_path(), {})
+    return write_universe(valid)
+
+
+def write_universe(symbols):
+    """Write universe_v<N>.csv and point the manifest at it."""
+    with _lock:
+        manifest = _read_json(_manifest_path(), {})
+        version = int(manifest.get("version", 0)) + 1
+        path = os.path.join(UNIVERSE_DIR, f"universe_v{version:04d}.csv")
+        os.makedirs(UNIVERSE_DIR, exist_ok=True)
+        pd.DataFrame({"symbol": symbols}).to_csv(path, index=False)
+        manifest = {
+            "version": version,
+            "file": os.path.basename(path),
+            "symbols": len(symbols),
+            "createdAt": datetime.now().isoformat(),
+        }
+        _atomic_write_json(_manifest_path(), manifest)
+    print(f"[Universe] Wrote version {version} with {len(symbols)} symbols.")
+    return manifest
+
+
+def load_universe():
+    """Symbols of the latest universe version, or None when no universe has been built."""
+    manifest = _read_json(_manifest_path(), None)
+    if not manifest:
+        return None
+    path = os.path.join(UNIVERSE_DIR, manifest["file"])
+    if not os.path.exists(path):
+        return None
+    return pd.read_csv(path)["symbol"].dropna().tolist()
+
+
+def demote_symbols(symbols, reason="allNaN"):
+    """
+    Mark symbols invalid (until INVALID_TTL_DAYS passes) and write a new universe
+    version without them. Used for symbols whose downloads come back all-NaN.
+    """
+    symbols = list(dict.fromkeys(symbols))
+    if not symbols:
+        return None
+    current = load_universe()
+    checked_at = datetime.now().isoformat()
+    with _lock:
+        cache = _read_json(_cache_path(), {})
+        for sym in symbols:
+            cache[sym] = {"valid": False, "reason": reason, "checkedAt": checked_at}
+        _atomic_write_json(_cache_path(), cache)
+    if current is None:
+        return None
+    demoted = set(symbols) & set(current)
+    if not demoted:
+        return None
+    print(f"[Universe] Demoting {len(demoted)} symbols ({reason}).")
+    return write_universe([s for s in current if s not in demoted])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the tradable NSE universe.")
+    parser.add_argument("--force", action="store_true", help="Revalidate every symbol, ignoring the cache TTL")
+    parser.add_argument("--workers", type=int, default=WORKERS)
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    manifest = build_universe(force=args.force, workers=args.workers, batch_size=args.batch_size)
+    print(json.dumps(manifest, indent=2))
+    print(f"Done in {time.perf_counter() - started:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,10 @@
-import yfinance as yf
+import os
+import sys
 import pandas as pd
-from tqdm import tqdm
-import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from market_data import get_provider
+from utils.universe import build_universe, load_universe, candidate_symbols
 
 CSV_PATH = "nse_symbols.csv"
 OUTPUT_PATH = "valid_nse_symbols.csv"
@@ -9,7 +12,7 @@ OUTPUT_PATH = "valid_nse_symbols.csv"
 
 def is_valid_ticker(symbol):
     try:
-        data = yf.Ticker(symbol).info
+        data = get_provider().fundamentals(symbol)
         # If 'regularMarketPrice' or similar key exists, it's valid
         return "regularMarketPrice" in data
     except Exception:
@@ -17,15 +20,9 @@ def is_valid_ticker(symbol):
 
 
 def main():
-    df = pd.read_csv(CSV_PATH)
-    tickers = [f"{s}.NS" for s in df["SYMBOL"].dropna().unique()]
-
-    valid = []
-    for t in tqdm(tickers, desc="Validating tickers"):
-        if is_valid_ticker(t):
-            valid.append(t)
-        time.sleep(0.2)  # to avoid rate limits
-
+    """Validate the symbol list in batches (see universe.py) and export the valid tickers."""
+    build_universe(candidate_symbols(CSV_PATH))
+    valid = load_universe() or []
     pd.DataFrame(valid, columns=["symbol"]).to_csv(OUTPUT_PATH, index=False)
     print(f"Saved {len(valid)} valid tickers to {OUTPUT_PATH}")
 